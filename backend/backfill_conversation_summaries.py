@@ -0,0 +1,32 @@
+"""
+Script to populate conversation listing fields on existing conversations
+Run with: python3 backfill_conversation_summaries.py
+
+Sets message_count, last_message_preview, pending_item_count and
+complete_item_count on conversations written before those fields were
+maintained. Safe to re-run.
+"""
+import asyncio
+
+from database import connect_to_mongo, close_mongo_connection, get_database, init_db_indexes
+from utils.conversation_store import backfill_summary_fields
+
+
+async def backfill_conversation_summaries():
+    await connect_to_mongo()
+    await init_db_indexes()
+    db = get_database()
+    
+    updated = 0
+    
+    cursor = db.conversations.find({"pending_item_count": {"$exists": False}})
+    async for conversation_doc in cursor:
+        await backfill_summary_fields(db, conversation_doc)
+        updated += 1
+    
+    print(f"✓ Backfilled listing fields on {updated} conversations")
+    
+    await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(backfill_conversation_summaries())
@@ -17,10 +17,47 @@ class Settings(BaseSettings):
     JWT_SECRET: str
     JWT_EXPIRES_IN: str = "7d"
     
+    # Authenticated principal cache (per worker; TTL bounds staleness across workers)
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 60.0
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 10000
+    
+    # Password hashing (bcrypt runs in a dedicated thread pool off the event loop)
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    
     # Google OAuth Configuration
     GOOGLE_CLIENT_ID: str = ""
     GOOGLE_CLIENT_SECRET: str = ""
     GOOGLE_REDIRECT_URI: str = "http://localhost:8000/auth/google/callback"
+    GOOGLE_JWKS_URL: str = "https://www.googleapis.com/oauth2/v3/certs"
+    GOOGLE_JWKS_MIN_REFRESH_SECONDS: float = 30.0
+    
+    # Shared outbound HTTP client
+    HTTP_CLIENT_TIMEOUT_SECONDS: float = 10.0
+    HTTP_CLIENT_MAX_CONNECTIONS: int = 50
+    HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    
+    # Metrics Configuration (Prometheus text format at /metrics)
+    METRICS_ENABLED: bool = True
+    # Directory shared by all worker processes to aggregate their metrics (empty for a single worker)
+    METRICS_MULTIPROC_DIR: str = ""
+    METRICS_MULTIPROC_WRITE_SECONDS: float = 5.0
+    
+    # MongoDB command monitoring (X-DB-Ops / X-DB-Time headers are added in development)
+    DB_SLOW_OP_THRESHOLD_MS: float = 100.0
+    
+    # Request tracing (waterfalls at /debug/traces in development)
+    TRACING_ENABLED: bool = True
+    # Requests at least this slow (or failing with 5xx) are always kept
+    TRACE_SLOW_THRESHOLD_MS: float = 1000.0
+    # Fraction of the remaining requests kept
+    TRACE_SAMPLE_RATE: float = 0.05
+    # Traces kept per buffer (slow, sampled)
+    TRACE_BUFFER_SIZE: int = 100
+    TRACE_MAX_SPANS: int = 500
+    # Append retained traces to this file as OTLP/JSON lines (empty disables)
+    TRACE_EXPORT_PATH: str = ""
+    TRACE_SERVICE_NAME: str = "tadaa-backend"
     
     # CORS Configuration
     CORS_ORIGINS: Union[List[str], str] = "http://localhost:5173,http://localhost:3000"
@@ -32,6 +69,93 @@ class Settings(BaseSettings):
     
     # Claude AI Configuration
     ANTHROPIC_API_KEY: str = ""
+    ANTHROPIC_TIMEOUT_SECONDS: float = 60.0
+    ANTHROPIC_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    ANTHROPIC_MAX_CONNECTIONS: int = 100
+    ANTHROPIC_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    ANTHROPIC_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    # Retries of 429/5xx responses, scheduled by the gateway (the SDK itself does not retry)
+    ANTHROPIC_MAX_RETRIES: int = 2
+    # Point the SDK at a local stand-in server, e.g. for rate-limit testing
+    ANTHROPIC_BASE_URL: str = ""
+    
+    # Rate Limiting Configuration (requests per window, 0 disables a quota)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"  # memory | mongo
+    RATE_LIMIT_WINDOW_SECONDS: float = 60.0
+    # Use the first X-Forwarded-For address as the client IP (only behind a trusted proxy)
+    RATE_LIMIT_TRUST_FORWARDED_FOR: bool = False
+    RATE_LIMIT_AUTH_PER_IP: int = 10
+    RATE_LIMIT_AUTH_TOTAL: int = 0
+    RATE_LIMIT_LLM_PER_IP: int = 20
+    RATE_LIMIT_LLM_PER_USER: int = 30
+    RATE_LIMIT_LLM_TOTAL: int = 0
+    RATE_LIMIT_AI_PER_IP: int = 120
+    RATE_LIMIT_AI_PER_USER: int = 240
+    RATE_LIMIT_AI_TOTAL: int = 0
+    
+    # LLM Scheduler Configuration (per-minute budgets, 0 disables a budget)
+    LLM_REQUESTS_PER_MINUTE: int = 50
+    LLM_INPUT_TOKENS_PER_MINUTE: int = 40000
+    LLM_OUTPUT_TOKENS_PER_MINUTE: int = 8000
+    LLM_INTERACTIVE_QUEUE_TIMEOUT_SECONDS: float = 15.0
+    LLM_BACKGROUND_QUEUE_TIMEOUT_SECONDS: float = 120.0
+    
+    # LLM Usage Ledger (per-call token records plus daily per-user/per-conversation rollups)
+    LLM_USAGE_LEDGER_ENABLED: bool = True
+    LLM_USAGE_LEDGER_FLUSH_SECONDS: float = 1.0
+    # Flush early once this many entries are queued
+    LLM_USAGE_LEDGER_MAX_BATCH: int = 500
+    # Oldest queued entries are dropped beyond this while Mongo is unreachable
+    LLM_USAGE_LEDGER_MAX_PENDING: int = 10000
+    # Most recent entries read for the tokens-per-turn report
+    LLM_USAGE_REPORT_MAX_ENTRIES: int = 50000
+    # Daily token budgets (input, output and cache tokens per UTC day, 0 disables a budget)
+    LLM_DAILY_TOKEN_BUDGET_PER_USER: int = 0
+    LLM_DAILY_TOKEN_BUDGET_PER_CONVERSATION: int = 0
+    # How long a worker reuses persisted daily totals before re-reading them
+    LLM_BUDGET_CACHE_TTL_SECONDS: float = 5.0
+    
+    # Response cache for /api/ai/chat (opt-in)
+    CHAT_RESPONSE_CACHE_ENABLED: bool = False
+    CHAT_RESPONSE_CACHE_TTL_SECONDS: float = 3600.0
+    CHAT_RESPONSE_CACHE_MAX_ENTRIES: int = 1000
+    
+    # Conversation Storage Configuration
+    CONVERSATION_STORAGE_MODE: str = "embedded"  # embedded | bucketed
+    MESSAGE_BUCKET_SIZE: int = 50
+    # Merge-and-retry attempts when a concurrent writer bumped the conversation version
+    CONVERSATION_WRITE_MAX_RETRIES: int = 3
+    # Queue chat turn writes and flush them in batches (a crash loses up to one interval of turns)
+    CONVERSATION_WRITE_BEHIND_ENABLED: bool = False
+    CONVERSATION_WRITE_BEHIND_INTERVAL_SECONDS: float = 0.1
+    # Flush early once this many conversations are queued
+    CONVERSATION_WRITE_BEHIND_MAX_BATCH: int = 500
+    # Flushes a write rejected by Mongo (other than a version conflict) is retried before it is dropped
+    CONVERSATION_WRITE_BEHIND_MAX_ATTEMPTS: int = 5
+    
+    # Run bulk item saves in a multi-document transaction (requires a replica set)
+    SAVE_ITEMS_USE_TRANSACTION: bool = False
+    
+    # Conversation Listing Configuration
+    CONVERSATION_PAGE_SIZE: int = 20
+    CONVERSATION_PAGE_SIZE_MAX: int = 100
+    
+    # Item Resolver Configuration
+    ITEM_INDEX_CACHE_TTL_SECONDS: float = 300.0
+    ITEM_INDEX_CACHE_MAX_ENTRIES: int = 1000
+    ITEM_RESOLVER_AMBIGUITY_MARGIN: float = 0.1
+    ITEM_RESOLVER_MAX_CANDIDATES: int = 5
+    
+    # Extraction Context Window Configuration
+    EXTRACTION_HISTORY_TURNS: int = 6
+    EXTRACTION_CONTEXT_TOKEN_BUDGET: int = 6000
+    EXTRACTION_SUMMARY_MODEL: str = "claude-3-5-haiku-20241022"
+    EXTRACTION_SUMMARY_MAX_TOKENS: int = 512
+    # Answer trivial slot-filling turns locally without calling Claude
+    EXTRACTION_FAST_PATH_ENABLED: bool = True
+    # Longest a chat turn waits for earlier turns on the same conversation
+    CONVERSATION_TURN_TIMEOUT_SECONDS: float = 120.0
     
     @field_validator('CORS_ORIGINS', mode='before')
     @classmethod
@@ -7,6 +7,8 @@ import logging
 from typing import Optional
 
 from config import settings
+from db_indexes import ensure_indexes, start_index_build, stop_index_build
+from utils.db_monitor import MongoCommandListener
 
 logger = logging.getLogger(__name__)
 
@@ -23,9 +25,11 @@ async def connect_to_mongo() -> None:
     
     try:
         logger.info("Connecting to MongoDB Atlas...")
+        # The listener times every command and attributes it to the current request
         mongodb_client = AsyncIOMotorClient(
             settings.MONGODB_URI,
-            serverSelectionTimeoutMS=5000
+            serverSelectionTimeoutMS=5000,
+            event_listeners=[MongoCommandListener()]
         )
         
         # Test the connection
@@ -51,6 +55,8 @@ async def close_mongo_connection() -> None:
     """
     global mongodb_client
     
+    await stop_index_build()
+    
     if mongodb_client:
         logger.info("Closing MongoDB connection...")
         mongodb_client.close()
@@ -89,15 +95,32 @@ def get_database():
     return mongodb_database
 
 
-async def init_db_indexes():
+def get_client() -> AsyncIOMotorClient:
     """
-    Initialize database indexes for collections
+    Get the MongoDB client (for sessions and transactions)
+    
+    Returns:
+        AsyncIOMotorClient: The client instance
+    """
+    if mongodb_client is None:
+        raise RuntimeError("Database not initialized. Call connect_to_mongo() first.")
+    return mongodb_client
+
+
+async def init_db_indexes(background: bool = False):
+    """
+    Create missing indexes from the declarative spec in db_indexes.INDEX_SPECS
+    
+    Args:
+        background: Return immediately and build in a background task
+            (used at application startup); scripts wait for completion
     """
     db = get_database()
     
-    # Create unique index on email field for users collection
-    await db.users.create_index("email", unique=True)
-    logger.info("Database indexes created successfully")
+    if background:
+        start_index_build(db)
+        return
+    await ensure_indexes(db)
 
 
 def get_users_collection():
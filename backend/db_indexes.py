@@ -0,0 +1,211 @@
+"""
+Declarative MongoDB index specification and startup verification
+
+INDEX_SPECS lists every index the application's queries rely on, per
+collection. At startup the existing indexes are compared with the spec and
+only missing ones are built, in a background task, so a cold boot against a
+database that already has its indexes costs one `listIndexes` per
+collection. Indexes that exist with different options, and indexes that are
+not in the spec, are reported as drift rather than changed.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Index options compared against the server when checking for drift
+COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+
+class IndexSpec:
+    """One index the application expects to exist"""
+
+    def __init__(self, keys: List[Tuple[str, int]], **options: Any):
+        self.keys = keys
+        self.options = options
+        self.name = options.get("name") or "_".join(f"{field}_{direction}" for field, direction in keys)
+
+    def matches(self, existing: Dict[str, Any]) -> bool:
+        """
+        Check whether an index reported by `list_indexes` has the same keys and options
+
+        Args:
+            existing: Index document from the server
+
+        Returns:
+            bool: True if the existing index satisfies this spec
+        """
+        if list(existing["key"].items()) != self.keys:
+            return False
+        for option in COMPARED_OPTIONS:
+            if existing.get(option) != self.options.get(option):
+                # unique/sparse default to False and may be omitted by the server
+                if option in ("unique", "sparse") and not existing.get(option) and not self.options.get(option):
+                    continue
+                return False
+        return True
+
+    def describe(self) -> Dict[str, Any]:
+        return {"name": self.name, "keys": [list(key) for key in self.keys], "options": self.options}
+
+
+INDEX_SPECS: Dict[str, List[IndexSpec]] = {
+    "users": [
+        IndexSpec([("email", 1)], unique=True),
+        # OAuth sign-in looks users up by Google subject; email users have no google_id
+        IndexSpec(
+            [("google_id", 1)],
+            unique=True,
+            partialFilterExpression={"google_id": {"$type": "string"}}
+        ),
+    ],
+    "conversations": [
+        # Keyset pagination for the conversation listing
+        IndexSpec([("updated_at", -1), ("_id", -1)]),
+    ],
+    "conversation_messages": [
+        # Bucketed conversation messages are always read by (conversation_id, bucket)
+        IndexSpec([("conversation_id", 1), ("bucket", 1)], unique=True),
+    ],
+    "chat_response_cache": [
+        # Each cached response expires at its own expires_at
+        IndexSpec([("expires_at", 1)], expireAfterSeconds=0),
+    ],
+    "rate_limits": [
+        # Shared rate limit buckets are dropped once idle
+        IndexSpec([("expires_at", 1)], expireAfterSeconds=0),
+    ],
+    "llm_usage": [
+        # Tokens-per-turn report scans a recent time window
+        IndexSpec([("ts", -1)]),
+    ],
+    "llm_usage_daily": [
+        # Heaviest users and conversations of the day
+        IndexSpec([("scope", 1), ("day", 1), ("total_tokens", -1)]),
+    ],
+    "errands": [IndexSpec([("user_id", 1)])],
+    "bills": [IndexSpec([("user_id", 1)])],
+    "appointments": [IndexSpec([("user_id", 1)])],
+    "reminders": [IndexSpec([("user_id", 1)])],
+    "payment_methods": [IndexSpec([("user_id", 1)])],
+}
+
+# Result of the most recent verification, served by /diagnostics/indexes
+_report: Dict[str, Any] = {"state": "not_started", "started_at": None, "finished_at": None, "collections": {}}
+_build_task: Optional["asyncio.Task"] = None
+
+
+async def _verify_collection(db, collection_name: str, specs: List[IndexSpec]) -> Dict[str, Any]:
+    existing = {index["name"]: index async for index in db[collection_name].list_indexes()}
+
+    statuses = []
+    missing = []
+    for spec in specs:
+        current = existing.get(spec.name)
+        if current is None:
+            missing.append(spec)
+            statuses.append({**spec.describe(), "status": "missing"})
+        elif spec.matches(current):
+            statuses.append({**spec.describe(), "status": "ok"})
+        else:
+            statuses.append({
+                **spec.describe(),
+                "status": "conflict",
+                "existing": {"keys": [list(key) for key in current["key"].items()],
+                             **{option: current[option] for option in COMPARED_OPTIONS if option in current}}
+            })
+
+    spec_names = {spec.name for spec in specs}
+    unmanaged = sorted(name for name in existing if name != "_id_" and name not in spec_names)
+
+    collection_report = {"indexes": statuses, "unmanaged": unmanaged}
+    _report["collections"][collection_name] = collection_report
+
+    for spec in missing:
+        status = next(entry for entry in statuses if entry["name"] == spec.name)
+        status["status"] = "building"
+        try:
+            await db[collection_name].create_index(spec.keys, name=spec.name, **spec.options)
+            status["status"] = "created"
+            logger.info(f"Created index {collection_name}.{spec.name}")
+        except OperationFailure as e:
+            status["status"] = "failed"
+            status["error"] = str(e)
+            logger.error(f"Failed to create index {collection_name}.{spec.name}: {e}")
+
+    for entry in statuses:
+        if entry["status"] == "conflict":
+            logger.warning(f"Index {collection_name}.{entry['name']} differs from spec: {entry['existing']}")
+    if unmanaged:
+        logger.warning(f"Indexes on {collection_name} not in spec: {', '.join(unmanaged)}")
+
+    return collection_report
+
+
+async def ensure_indexes(db) -> Dict[str, Any]:
+    """
+    Create missing indexes and record drift against INDEX_SPECS
+
+    Args:
+        db: Database instance
+
+    Returns:
+        dict: Verification report with per-index status and unmanaged indexes
+    """
+    _report.update(state="running", started_at=datetime.utcnow(), finished_at=None, collections={})
+    try:
+        for collection_name, specs in INDEX_SPECS.items():
+            await _verify_collection(db, collection_name, specs)
+        _report["state"] = "complete"
+        logger.info("Database indexes verified")
+    except Exception as e:
+        _report["state"] = "failed"
+        _report["error"] = str(e)
+        logger.error(f"Index verification failed: {e}")
+    finally:
+        _report["finished_at"] = datetime.utcnow()
+    return _report
+
+
+def start_index_build(db) -> None:
+    """
+    Verify and build indexes in a background task so startup does not wait
+
+    Args:
+        db: Database instance
+    """
+    global _build_task
+    if _build_task is not None and not _build_task.done():
+        return
+    _report["state"] = "pending"
+    _build_task = asyncio.create_task(ensure_indexes(db))
+
+
+async def stop_index_build() -> None:
+    """
+    Cancel an index verification that is still running at shutdown
+
+    Index builds already submitted continue on the server.
+    """
+    global _build_task
+    if _build_task is not None and not _build_task.done():
+        _build_task.cancel()
+        try:
+            await _build_task
+        except asyncio.CancelledError:
+            pass
+    _build_task = None
+
+
+def get_index_report() -> Dict[str, Any]:
+    """
+    Get the most recent index verification report
+
+    Returns:
+        dict: State, timestamps and per-collection index status
+    """
+    return _report
@@ -0,0 +1,84 @@
+"""
+Shared outbound HTTP client
+
+One pooled, keep-alive httpx.AsyncClient for calls to third-party services
+(such as Google's signing keys), created and closed by main.lifespan so
+requests reuse warm connections instead of opening a TLS session each time.
+
+Libraries that open and close their own httpx client per call (authlib's
+OAuth client) are given a SharedTransport, which sends through the same
+connection pool and leaves it open when their client is closed.
+"""
+import logging
+from typing import Optional
+
+import httpx
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Global client instance and its connection pool, created in main.lifespan
+http_client: Optional[httpx.AsyncClient] = None
+_transport: Optional[httpx.AsyncHTTPTransport] = None
+
+
+class SharedTransport(httpx.AsyncBaseTransport):
+    """Transport for short-lived httpx clients that borrows the shared connection pool"""
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if _transport is None:
+            raise RuntimeError("HTTP client not initialized. Call init_http_client() first.")
+        return await _transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        # The pool belongs to the app lifespan, not to the borrowing client
+        pass
+
+
+async def init_http_client() -> None:
+    """
+    Create the shared HTTP client
+    """
+    global http_client, _transport
+
+    _transport = httpx.AsyncHTTPTransport(
+        limits=httpx.Limits(
+            max_connections=settings.HTTP_CLIENT_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS,
+        ),
+    )
+    http_client = httpx.AsyncClient(
+        transport=_transport,
+        timeout=httpx.Timeout(settings.HTTP_CLIENT_TIMEOUT_SECONDS),
+    )
+    logger.info("HTTP client initialized")
+
+
+async def close_http_client() -> None:
+    """
+    Close the shared HTTP client
+    """
+    global http_client, _transport
+
+    if http_client:
+        logger.info("Closing HTTP client...")
+        await http_client.aclose()
+        http_client = None
+        _transport = None
+        logger.info("HTTP client closed")
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Get the shared HTTP client
+
+    Returns:
+        httpx.AsyncClient: The client instance
+
+    Raises:
+        RuntimeError: If the client has not been initialized
+    """
+    if http_client is None:
+        raise RuntimeError("HTTP client not initialized. Call init_http_client() first.")
+    return http_client
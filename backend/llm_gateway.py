@@ -0,0 +1,345 @@
+"""
+Shared, non-blocking gateway to the Claude API
+
+Calls are admitted by the LLMScheduler and retried here on 429/5xx
+responses, honouring the API's retry-after, instead of in the SDK. Callers
+pass a UsageAttribution so each call is checked against its daily token
+budgets before admission and recorded in the usage ledger.
+"""
+import asyncio
+import itertools
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+import anthropic
+import httpx
+from fastapi import HTTPException
+
+from config import settings
+from llm_scheduler import LLMCapacityError, LLMScheduler, Priority, Reservation, estimate_input_tokens
+from usage_ledger import UsageAttribution, check_budget, record_call
+from utils.metrics import LLM_REQUEST_SECONDS, LLM_TIME_TO_FIRST_TOKEN_SECONDS, record_llm_usage
+from utils.tracing import KIND_CLIENT, span
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on backoff when the API gives no retry-after
+MAX_BACKOFF_SECONDS = 8.0
+
+
+def _retry_after(error: Exception, attempt: int) -> Optional[float]:
+    """
+    Seconds to wait before retrying a failed call, or None if it should not be retried
+
+    Args:
+        error: Exception raised by the SDK
+        attempt: Number of the attempt that failed (0-based)
+
+    Returns:
+        float: Delay from the response's retry-after headers, or jittered
+            exponential backoff
+    """
+    if isinstance(error, anthropic.APIStatusError):
+        if error.status_code != 429 and error.status_code < 500:
+            return None
+        headers = error.response.headers
+        try:
+            if "retry-after-ms" in headers:
+                return float(headers["retry-after-ms"]) / 1000
+            if "retry-after" in headers:
+                return float(headers["retry-after"])
+        except ValueError:
+            pass
+    elif not isinstance(error, anthropic.APIConnectionError):
+        return None
+    return random.uniform(0.5, 1.0) * min(MAX_BACKOFF_SECONDS, 0.5 * 2 ** attempt)
+
+
+def _is_rate_limit(error: Exception) -> bool:
+    # 429 is our limit, 529 means the API as a whole is overloaded
+    return isinstance(error, anthropic.APIStatusError) and error.status_code in (429, 529)
+
+
+class _TimedStream:
+    """Message stream proxy recording time to the first text delta"""
+
+    def __init__(self, stream: Any, started: float, model: str, trace_span: Any):
+        self._stream = stream
+        self._started = started
+        self._model = model
+        self._span = trace_span
+
+    @property
+    async def text_stream(self) -> AsyncIterator[str]:
+        first = True
+        async for text in self._stream.text_stream:
+            if first:
+                first = False
+                elapsed = time.perf_counter() - self._started
+                LLM_TIME_TO_FIRST_TOKEN_SECONDS.observe(elapsed, self._model)
+                self._span.set(time_to_first_token_ms=round(elapsed * 1000, 2))
+            yield text
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._stream, name)
+
+
+class LLMGateway:
+    """
+    Wraps a single AsyncAnthropic client backed by a pooled, keep-alive
+    HTTP transport and tracks in-flight calls for worker sizing.
+    
+    Every call takes a `priority` lane; interactive calls wait at most
+    LLM_INTERACTIVE_QUEUE_TIMEOUT_SECONDS for admission, background calls
+    LLM_BACKGROUND_QUEUE_TIMEOUT_SECONDS, including time spent backing off.
+    """
+
+    def __init__(self, api_key: str):
+        self._http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.ANTHROPIC_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.ANTHROPIC_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.ANTHROPIC_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+            timeout=httpx.Timeout(
+                settings.ANTHROPIC_TIMEOUT_SECONDS,
+                connect=settings.ANTHROPIC_CONNECT_TIMEOUT_SECONDS,
+            ),
+        )
+        self.client = anthropic.AsyncAnthropic(
+            api_key=api_key,
+            base_url=settings.ANTHROPIC_BASE_URL or None,
+            http_client=self._http_client,
+            # Retries go through the scheduler so they respect the shared budget
+            max_retries=0,
+        )
+        self.scheduler = LLMScheduler(
+            requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE,
+            input_tokens_per_minute=settings.LLM_INPUT_TOKENS_PER_MINUTE,
+            output_tokens_per_minute=settings.LLM_OUTPUT_TOKENS_PER_MINUTE,
+        )
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.total_calls = 0
+        self.total_errors = 0
+        self.total_latency = 0.0
+
+    def _call_started(self) -> float:
+        self.in_flight += 1
+        self.total_calls += 1
+        if self.in_flight > self.peak_in_flight:
+            self.peak_in_flight = self.in_flight
+        return time.perf_counter()
+
+    def _call_finished(self, started: float, failed: bool, model: str, call: str) -> None:
+        elapsed = time.perf_counter() - started
+        self.in_flight -= 1
+        self.total_latency += elapsed
+        if failed:
+            self.total_errors += 1
+        LLM_REQUEST_SECONDS.observe(elapsed, model, call, "error" if failed else "ok")
+
+    async def _admit(self, priority: Priority, kwargs: Dict[str, Any], deadline: float) -> Reservation:
+        with span("llm.admit", priority=priority.name.lower()):
+            return await self.scheduler.acquire(
+                priority,
+                input_tokens=estimate_input_tokens(kwargs),
+                output_tokens=kwargs.get("max_tokens", 0),
+                timeout=deadline - time.monotonic(),
+            )
+
+    async def _backoff(self, error: Exception, attempt: int, deadline: float) -> None:
+        """
+        Wait before retrying a failed call, or re-raise if it cannot be retried
+
+        Raises:
+            Exception: `error` if it is not retryable or retries are exhausted
+            LLMCapacityError: If the retry would start after the deadline
+        """
+        delay = _retry_after(error, attempt)
+        if delay is None or attempt >= settings.ANTHROPIC_MAX_RETRIES:
+            if _is_rate_limit(error):
+                self.scheduler.pause(delay or 0.0)
+                raise LLMCapacityError(delay or 1.0)
+            raise error
+        if _is_rate_limit(error):
+            self.scheduler.pause(delay)
+        if time.monotonic() + delay >= deadline:
+            raise LLMCapacityError(delay)
+        self.scheduler.record_retry()
+        logger.info(f"Retrying Claude API call in {delay:.2f}s after: {error}")
+        await asyncio.sleep(delay)
+
+    def _deadline(self, priority: Priority) -> float:
+        if priority == Priority.INTERACTIVE:
+            return time.monotonic() + settings.LLM_INTERACTIVE_QUEUE_TIMEOUT_SECONDS
+        return time.monotonic() + settings.LLM_BACKGROUND_QUEUE_TIMEOUT_SECONDS
+
+    async def create_message(
+        self,
+        priority: Priority = Priority.INTERACTIVE,
+        attribution: Optional[UsageAttribution] = None,
+        **kwargs: Any
+    ):
+        """
+        Send a request to the Messages API without blocking the event loop
+
+        Args:
+            priority: Scheduling lane for this call
+            attribution: Route, user and conversation the call is billed to
+            **kwargs: Arguments forwarded to `messages.create`
+
+        Returns:
+            Message: The Claude API response
+
+        Raises:
+            LLMBudgetExceededError: If the user or conversation has used its daily token budget
+            LLMCapacityError: If the call could not be sent before its deadline
+        """
+        await check_budget(attribution)
+        deadline = self._deadline(priority)
+        for attempt in itertools.count():
+            reservation = await self._admit(priority, kwargs, deadline)
+            started = self._call_started()
+            failed = True
+            try:
+                with span("llm.create", KIND_CLIENT, model=kwargs.get("model", ""), attempt=attempt) as call_span:
+                    response = await self.client.messages.create(**kwargs)
+                    call_span.set(input_tokens=response.usage.input_tokens, output_tokens=response.usage.output_tokens)
+                failed = False
+                self.scheduler.settle(reservation, response.usage)
+                record_llm_usage(kwargs.get("model", ""), response.usage)
+                record_call(attribution, kwargs.get("model", ""), "create", response.usage, time.perf_counter() - started)
+                return response
+            except anthropic.APIError as e:
+                error = e
+            finally:
+                self.scheduler.settle(reservation, None)
+                self._call_finished(started, failed, kwargs.get("model", ""), "create")
+            await self._backoff(error, attempt, deadline)
+
+    @asynccontextmanager
+    async def stream_message(
+        self,
+        priority: Priority = Priority.INTERACTIVE,
+        attribution: Optional[UsageAttribution] = None,
+        **kwargs: Any
+    ) -> AsyncIterator[Any]:
+        """
+        Open a streaming request to the Messages API
+
+        Only failures to open the stream are retried; once text has been
+        yielded errors propagate to the caller.
+
+        Args:
+            priority: Scheduling lane for this call
+            attribution: Route, user and conversation the call is billed to
+            **kwargs: Arguments forwarded to `messages.stream`
+
+        Yields:
+            AsyncMessageStream: Stream exposing `text_stream` and `get_final_message()`
+
+        Raises:
+            LLMBudgetExceededError: If the user or conversation has used its daily token budget
+            LLMCapacityError: If the call could not be sent before its deadline
+        """
+        await check_budget(attribution)
+        deadline = self._deadline(priority)
+        for attempt in itertools.count():
+            reservation = await self._admit(priority, kwargs, deadline)
+            started = self._call_started()
+            failed = True
+            opened = False
+            try:
+                with span("llm.stream", KIND_CLIENT, model=kwargs.get("model", ""), attempt=attempt) as call_span:
+                    async with self.client.messages.stream(**kwargs) as stream:
+                        opened = True
+                        yield _TimedStream(stream, started, kwargs.get("model", ""), call_span)
+                    usage = getattr(getattr(stream, "current_message_snapshot", None), "usage", None)
+                    if usage is not None:
+                        call_span.set(input_tokens=usage.input_tokens, output_tokens=usage.output_tokens)
+                failed = False
+                self.scheduler.settle(reservation, usage)
+                record_llm_usage(kwargs.get("model", ""), usage)
+                record_call(attribution, kwargs.get("model", ""), "stream", usage, time.perf_counter() - started)
+                return
+            except anthropic.APIError as e:
+                if opened:
+                    raise
+                error = e
+            finally:
+                self.scheduler.settle(reservation, None)
+                self._call_finished(started, failed, kwargs.get("model", ""), "stream")
+            await self._backoff(error, attempt, deadline)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Snapshot of gateway call counters
+
+        Returns:
+            dict: In-flight, peak, total, error and latency figures
+        """
+        completed = self.total_calls - self.in_flight
+        return {
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "total_calls": self.total_calls,
+            "total_errors": self.total_errors,
+            "avg_latency_ms": round(self.total_latency / completed * 1000, 2) if completed else 0.0,
+        }
+
+    async def close(self) -> None:
+        """Close the underlying HTTP connection pool"""
+        await self.client.close()
+
+
+# Global gateway instance, created in main.lifespan
+llm_gateway: Optional[LLMGateway] = None
+
+
+async def init_llm_gateway() -> None:
+    """
+    Create the shared LLM gateway
+    """
+    global llm_gateway
+
+    if not settings.ANTHROPIC_API_KEY:
+        logger.warning("ANTHROPIC_API_KEY not configured - AI endpoints will be unavailable")
+        return
+
+    llm_gateway = LLMGateway(settings.ANTHROPIC_API_KEY)
+    logger.info("LLM gateway initialized")
+
+
+async def close_llm_gateway() -> None:
+    """
+    Close the shared LLM gateway
+    """
+    global llm_gateway
+
+    if llm_gateway:
+        logger.info("Closing LLM gateway...")
+        await llm_gateway.close()
+        llm_gateway = None
+        logger.info("LLM gateway closed")
+
+
+def get_llm_gateway() -> LLMGateway:
+    """
+    Get the shared LLM gateway
+
+    Returns:
+        LLMGateway: The gateway instance
+
+    Raises:
+        HTTPException: If the Claude API key is not configured
+    """
+    if llm_gateway is None:
+        raise HTTPException(
+            status_code=500,
+            detail="ANTHROPIC_API_KEY not configured"
+        )
+    return llm_gateway
@@ -0,0 +1,313 @@
+"""
+Rate-limit-aware admission control for Claude API calls
+
+Every call waits for a slot from the LLMScheduler before it is sent. Slots
+are granted from token buckets that mirror the API's per-minute limits
+(requests, input tokens, output tokens), strictly by priority lane and in
+arrival order within a lane, so interactive chat is never stuck behind
+background summaries. A call that cannot be admitted before its deadline
+fails fast with a 503 and a Retry-After estimate instead of piling onto an
+already rate-limited API.
+
+Token costs are not known until the response arrives, so a call reserves
+an estimate of its input tokens and its full max_tokens of output up front
+and settles the difference against the reported usage afterwards. A 429 or
+529 from the API pauses all admissions for the response's retry-after.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import math
+import time
+from enum import IntEnum
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Scheduling lanes; lower values are admitted first"""
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+class LLMCapacityError(HTTPException):
+    """Raised when a call cannot be sent within its deadline"""
+
+    def __init__(self, retry_after: float, detail: str = "The AI assistant is busy right now. Please try again shortly."):
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(status_code=503, detail=detail, headers={"Retry-After": str(self.retry_after)})
+
+
+def estimate_input_tokens(request: Dict[str, Any]) -> int:
+    """
+    Rough input token count of a Messages API request (~4 characters per token)
+
+    Args:
+        request: Messages API arguments
+
+    Returns:
+        int: Estimated input tokens
+    """
+    payload = json.dumps([request.get("system"), request.get("messages")], default=str)
+    return len(payload) // 4 + 1
+
+
+class TokenBucket:
+    """Per-minute budget refilled continuously; a limit of 0 disables it"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.capacity <= 0
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` (capped at capacity) is available"""
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        shortfall = min(amount, self.capacity) - self.level
+        return shortfall / self.rate if shortfall > 0 else 0.0
+
+    def take(self, amount: float, now: float) -> None:
+        if not self.unlimited:
+            self._refill(now)
+            self.level -= amount
+
+    def give_back(self, amount: float, now: float) -> None:
+        """Return (or, if negative, charge) tokens after reconciling actual usage"""
+        if not self.unlimited:
+            self._refill(now)
+            self.level = min(self.capacity, self.level + amount)
+
+
+class Reservation:
+    """Budget held by one admitted call until it is settled"""
+    __slots__ = ("input_tokens", "output_tokens", "settled")
+
+    def __init__(self, input_tokens: int, output_tokens: int):
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.settled = False
+
+
+class LLMScheduler:
+    """
+    Priority queue in front of the Claude API with token-bucket admission
+
+    Args:
+        requests_per_minute: Request budget (0 for unlimited)
+        input_tokens_per_minute: Input token budget (0 for unlimited)
+        output_tokens_per_minute: Output token budget (0 for unlimited)
+    """
+
+    def __init__(self, requests_per_minute: int, input_tokens_per_minute: int, output_tokens_per_minute: int):
+        self.requests = TokenBucket(requests_per_minute)
+        self.input_tokens = TokenBucket(input_tokens_per_minute)
+        self.output_tokens = TokenBucket(output_tokens_per_minute)
+        self.paused_until = 0.0
+
+        # Heap of [priority, sequence, input_tokens, output_tokens]
+        self._queue: List[List[Any]] = []
+        self._sequence = itertools.count()
+        self._changed: Optional[asyncio.Event] = None
+
+        self._stats: Dict[str, Any] = {
+            "admitted": 0,
+            "rejected": 0,
+            "rate_limited": 0,
+            "retries": 0,
+            "peak_queue_depth": 0,
+            "total_wait": 0.0,
+            "max_wait": 0.0,
+        }
+        self._lane_stats = {lane: {"admitted": 0, "total_wait": 0.0} for lane in Priority}
+
+    def _notify(self) -> None:
+        # Wake every waiter so the new queue head can re-check its budget
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = None
+
+    def _changed_event(self) -> asyncio.Event:
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        return self._changed
+
+    def _admission_delay(self, entry: List[Any], now: float) -> float:
+        return max(
+            self.paused_until - now,
+            self.requests.wait_time(1, now),
+            self.input_tokens.wait_time(entry[2], now),
+            self.output_tokens.wait_time(entry[3], now),
+        )
+
+    def _projected_delay(self, entry: List[Any], now: float) -> float:
+        """Lower bound on the wait of a queued call: the head's delay plus one request interval per call ahead"""
+        delay = self._admission_delay(self._queue[0], now)
+        if self.requests.unlimited:
+            return delay
+        ahead = sum(1 for other in self._queue if other[:2] < entry[:2])
+        return delay + (ahead - 1) / self.requests.rate
+
+    async def acquire(self, priority: Priority, input_tokens: int, output_tokens: int, timeout: float) -> Reservation:
+        """
+        Wait for budget to send one call
+
+        Args:
+            priority: Scheduling lane
+            input_tokens: Estimated input tokens
+            output_tokens: Output tokens to reserve (the request's max_tokens)
+            timeout: Longest time to wait for admission
+
+        Returns:
+            Reservation: Budget to settle once the call's usage is known
+
+        Raises:
+            LLMCapacityError: If the call cannot be admitted within `timeout`
+        """
+        started = time.monotonic()
+        deadline = started + timeout
+        entry = [int(priority), next(self._sequence), input_tokens, output_tokens]
+        heapq.heappush(self._queue, entry)
+        self._stats["peak_queue_depth"] = max(self._stats["peak_queue_depth"], len(self._queue))
+
+        try:
+            while True:
+                now = time.monotonic()
+                delay: Optional[float] = None
+                if self._queue[0] is entry:
+                    delay = self._admission_delay(entry, now)
+                    if delay <= 0:
+                        heapq.heappop(self._queue)
+                        self.requests.take(1, now)
+                        self.input_tokens.take(input_tokens, now)
+                        self.output_tokens.take(output_tokens, now)
+                        self._record_admission(priority, now - started)
+                        return Reservation(input_tokens, output_tokens)
+                else:
+                    projected = self._projected_delay(entry, now)
+                    if projected > deadline - now:
+                        raise self._reject(projected)
+
+                remaining = deadline - now
+                if delay is not None and delay > remaining:
+                    # Budget will not be available in time; fail now with an accurate estimate
+                    raise self._reject(delay)
+                if remaining <= 0:
+                    raise self._reject(self._admission_delay(self._queue[0], now))
+
+                try:
+                    await asyncio.wait_for(self._changed_event().wait(), min(delay or remaining, remaining))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if entry in self._queue:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+            self._notify()
+
+    def _record_admission(self, priority: Priority, waited: float) -> None:
+        self._stats["admitted"] += 1
+        self._stats["total_wait"] += waited
+        self._stats["max_wait"] = max(self._stats["max_wait"], waited)
+        self._lane_stats[priority]["admitted"] += 1
+        self._lane_stats[priority]["total_wait"] += waited
+
+    def _reject(self, retry_after: float) -> LLMCapacityError:
+        self._stats["rejected"] += 1
+        return LLMCapacityError(retry_after)
+
+    def settle(self, reservation: Reservation, usage: Any) -> None:
+        """
+        Reconcile a reservation with the tokens the call actually used
+
+        Args:
+            reservation: Reservation returned by `acquire`
+            usage: Response usage, or None to release the output reservation
+                of a call that produced nothing
+        """
+        if reservation.settled:
+            return
+        reservation.settled = True
+        now = time.monotonic()
+
+        if usage is None:
+            self.output_tokens.give_back(reservation.output_tokens, now)
+        else:
+            used_input = (getattr(usage, "input_tokens", 0) or 0) + (getattr(usage, "cache_creation_input_tokens", 0) or 0)
+            self.input_tokens.give_back(reservation.input_tokens - used_input, now)
+            self.output_tokens.give_back(reservation.output_tokens - (getattr(usage, "output_tokens", 0) or 0), now)
+        self._notify()
+
+    def pause(self, seconds: float) -> None:
+        """
+        Stop admitting calls after the API reported a rate limit
+
+        Args:
+            seconds: The response's retry-after
+        """
+        self._stats["rate_limited"] += 1
+        until = time.monotonic() + seconds
+        if until > self.paused_until:
+            self.paused_until = until
+            logger.warning(f"Claude API rate limited; pausing requests for {seconds:.1f}s")
+
+    def record_retry(self) -> None:
+        self._stats["retries"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Snapshot of queue and budget state
+
+        Returns:
+            dict: Queue depth per lane, wait times, rejections, rate limits
+                and remaining budget per bucket
+        """
+        now = time.monotonic()
+        depth = {lane.name.lower(): 0 for lane in Priority}
+        for entry in self._queue:
+            depth[Priority(entry[0]).name.lower()] += 1
+
+        admitted = self._stats["admitted"]
+        buckets = {}
+        for name, bucket in (("requests", self.requests), ("input_tokens", self.input_tokens), ("output_tokens", self.output_tokens)):
+            bucket.wait_time(0, now)
+            buckets[name] = None if bucket.unlimited else {
+                "per_minute": int(bucket.capacity),
+                "available": int(bucket.level),
+            }
+
+        return {
+            "queue_depth": depth,
+            "peak_queue_depth": self._stats["peak_queue_depth"],
+            "admitted": admitted,
+            "rejected": self._stats["rejected"],
+            "rate_limited": self._stats["rate_limited"],
+            "retries": self._stats["retries"],
+            "avg_wait_ms": round(self._stats["total_wait"] / admitted * 1000, 2) if admitted else 0.0,
+            "max_wait_ms": round(self._stats["max_wait"] * 1000, 2),
+            "lanes": {
+                lane.name.lower(): {
+                    "admitted": lane_stats["admitted"],
+                    "avg_wait_ms": round(lane_stats["total_wait"] / lane_stats["admitted"] * 1000, 2)
+                    if lane_stats["admitted"] else 0.0,
+                }
+                for lane, lane_stats in self._lane_stats.items()
+            },
+            "paused_for_seconds": round(max(self.paused_until - now, 0.0), 2),
+            "budgets": buckets,
+        }
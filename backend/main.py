@@ -9,7 +9,16 @@ import logging
 
 from config import settings
 from database import connect_to_mongo, close_mongo_connection, init_db_indexes
-from routers import health, auth, ai, ai_extraction
+from http_client import init_http_client, close_http_client
+from llm_gateway import init_llm_gateway, close_llm_gateway
+from utils.auth import shutdown_password_hasher
+from utils.db_monitor import DBOpsMiddleware
+from utils.metrics import MetricsMiddleware, start_metrics_writer, stop_metrics_writer
+from utils.rate_limit import RateLimitMiddleware
+from utils.tracing import TracingMiddleware
+from usage_ledger import start_usage_ledger, stop_usage_ledger
+from write_behind import start_write_behind, stop_write_behind
+from routers import health, auth, ai, ai_extraction, diagnostics, metrics, debug
 
 # Configure logging
 logging.basicConfig(
@@ -27,13 +36,25 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting Tadaa Personal Concierge Backend...")
     await connect_to_mongo()
-    await init_db_indexes()
+    await init_db_indexes(background=True)
+    await init_http_client()
+    await init_llm_gateway()
+    await start_write_behind()
+    await start_usage_ledger()
+    await start_metrics_writer()
     logger.info("Application startup complete")
     
     yield
     
     # Shutdown
     logger.info("Shutting down Tadaa Personal Concierge Backend...")
+    await stop_metrics_writer()
+    await close_llm_gateway()
+    shutdown_password_hasher()
+    await close_http_client()
+    # Drain queued conversation writes and usage records while Mongo is still connected
+    await stop_write_behind()
+    await stop_usage_ledger()
     await close_mongo_connection()
     logger.info("Application shutdown complete")
 
@@ -46,6 +67,9 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Reject over-quota clients before routing; added before CORS so 429s still carry CORS headers
+app.add_middleware(RateLimitMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -56,11 +80,23 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# Tally MongoDB commands per request (X-DB-Ops / X-DB-Time headers in development)
+app.add_middleware(DBOpsMiddleware)
+
+# Outside the other middleware, so latency includes them and rejected requests are counted
+app.add_middleware(MetricsMiddleware)
+
+# Outermost: one trace per request, with spans from every layer below
+app.add_middleware(TracingMiddleware)
+
 # Include routers
 app.include_router(health.router)
 app.include_router(auth.router)
 app.include_router(ai.router)
 app.include_router(ai_extraction.router)
+app.include_router(diagnostics.router)
+app.include_router(metrics.router)
+app.include_router(debug.router)
 
 # Root endpoint
 @app.get("/")
@@ -0,0 +1,39 @@
+"""
+Script to move embedded conversation messages into bucketed storage
+Run with: python3 migrate_conversation_messages.py
+
+Safe to re-run: already migrated conversations are skipped and a
+conversation that receives new messages mid-migration is left embedded
+and picked up on the next run (or lazily on its next chat turn when
+CONVERSATION_STORAGE_MODE=bucketed).
+"""
+import asyncio
+
+from database import connect_to_mongo, close_mongo_connection, get_database, init_db_indexes
+from utils.conversation_store import migrate_to_buckets
+
+
+async def migrate_conversation_messages():
+    await connect_to_mongo()
+    await init_db_indexes()
+    db = get_database()
+    
+    migrated = 0
+    skipped = 0
+    
+    cursor = db.conversations.find({"storage": {"$ne": "bucketed"}})
+    async for conversation_doc in cursor:
+        if await migrate_to_buckets(db, conversation_doc):
+            migrated += 1
+        else:
+            skipped += 1
+    
+    print(f"✓ Migrated {migrated} conversations to bucketed message storage")
+    if skipped:
+        print(f"  Skipped {skipped} conversations that changed during migration - re-run to retry")
+    print("\nSet CONVERSATION_STORAGE_MODE=bucketed in .env to store new conversations in buckets.")
+    
+    await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(migrate_conversation_messages())
@@ -1,7 +1,7 @@
 """
 Conversation and Extraction models for MongoDB
 """
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr, model_validator
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from enum import Enum
@@ -13,6 +13,10 @@ class ItemType(str, Enum):
     SCHEDULE = "schedule"
     PAYMENT = "payment"
 
+class MessageStorage(str, Enum):
+    EMBEDDED = "embedded"
+    BUCKETED = "bucketed"
+
 class ExtractionStatus(str, Enum):
     EXTRACTING = "extracting"
     INCOMPLETE = "incomplete"
@@ -39,11 +43,54 @@ class ExtractedItem(BaseModel):
 class Conversation(BaseModel):
     """Conversation document for MongoDB"""
     user_id: str = Field(..., description="User ID who owns this conversation")
-    messages: List[Message] = Field(default_factory=list, description="Conversation messages")
+    messages: List[Message] = Field(default_factory=list, description="Conversation messages (only the loaded tail for bucketed storage)")
+    message_count: int = Field(default=0, description="Total number of messages in the conversation")
+    storage: MessageStorage = Field(default=MessageStorage.EMBEDDED, description="Where messages are stored")
     extracted_items: List[ExtractedItem] = Field(default_factory=list, description="Items extracted from conversation")
+    active_items: Dict[str, str] = Field(default_factory=dict, description="ID of the unsaved item being built, keyed by item type")
+    last_message_preview: Optional[str] = Field(None, description="Truncated content of the latest message")
+    pending_item_count: int = Field(default=0, description="Extracted items not yet saved")
+    complete_item_count: int = Field(default=0, description="Extracted items complete and ready to save")
+    summary: Optional[str] = Field(None, description="Rolling summary of messages older than the verbatim window")
+    summarized_count: int = Field(default=0, description="Number of leading messages folded into the summary")
+    version: int = Field(default=0, description="Incremented by every write; writes are conditional on the version they read")
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     
+    _items_by_id: Optional[Dict[str, ExtractedItem]] = PrivateAttr(default=None)
+    
+    @model_validator(mode="after")
+    def _backfill_derived_fields(self):
+        """Derive message_count and active_items for documents stored before they existed"""
+        if self.message_count < len(self.messages):
+            self.message_count = len(self.messages)
+        for item in self.extracted_items:
+            if item.status != ExtractionStatus.SAVED and item.item_type and item.item_type.value not in self.active_items:
+                self.active_items[item.item_type.value] = item.id
+        return self
+    
+    @property
+    def messages_offset(self) -> int:
+        """Index of the first loaded message within the whole conversation"""
+        return self.message_count - len(self.messages)
+    
+    def get_item(self, item_id: str) -> Optional[ExtractedItem]:
+        """Look up an extracted item by ID"""
+        if self._items_by_id is None:
+            self._items_by_id = {item.id: item for item in self.extracted_items}
+        return self._items_by_id.get(item_id)
+    
+    def add_item(self, item: ExtractedItem) -> None:
+        """Append an extracted item and keep the ID index current"""
+        self.extracted_items.append(item)
+        if self._items_by_id is not None:
+            self._items_by_id[item.id] = item
+    
+    def open_item(self, item_type: Optional[str]) -> Optional[ExtractedItem]:
+        """Get the unsaved item currently being built for an item type"""
+        item_id = self.active_items.get(item_type) if item_type else None
+        return self.get_item(item_id) if item_id else None
+    
     class Config:
         json_schema_extra = {
             "example": {
@@ -76,4 +123,20 @@ class ConversationResponse(Conversation):
     id: str = Field(..., alias="_id")
     
     class Config:
-        populate_by_name = True
\ No newline at end of file
+        populate_by_name = True
+
+class ConversationSummary(BaseModel):
+    """Lightweight conversation listing entry, read without touching messages"""
+    id: str
+    user_id: str
+    message_count: int = 0
+    last_message_preview: Optional[str] = None
+    pending_item_count: int = 0
+    complete_item_count: int = 0
+    created_at: datetime
+    updated_at: datetime
+
+class ConversationListResponse(BaseModel):
+    """Page of conversation summaries with a keyset cursor for the next page"""
+    conversations: List[ConversationSummary]
+    next_cursor: Optional[str] = None
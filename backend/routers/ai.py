@@ -2,29 +2,20 @@
 AI Chat Router - Claude AI Integration
 Handles chat interactions with Claude AI for task management
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException
 from pydantic import BaseModel
 from typing import List, Optional, Union, Dict, Any
 import anthropic
-import os
-from dotenv import load_dotenv
-
-router = APIRouter(prefix="/api/ai", tags=["ai"])
-
-# Initialize Anthropic client
-anthropic_client = None
-load_dotenv()
-def get_anthropic_client():
-    global anthropic_client
-    if anthropic_client is None:
-        api_key = os.getenv("ANTHROPIC_API_KEY")
-        if not api_key:
-            raise HTTPException(
-                status_code=500,
-                detail="ANTHROPIC_API_KEY not configured"
-            )
-        anthropic_client = anthropic.Anthropic(api_key=api_key)
-    return anthropic_client
+from config import settings
+from llm_gateway import get_llm_gateway
+from llm_scheduler import LLMCapacityError
+from usage_ledger import LLMBudgetExceededError, UsageAttribution
+from utils.prompt_registry import CHAT_PROMPT, record_usage
+from utils.response_cache import cache_key, get_cached_response, record_bypass, store_response
+from utils.sse import format_sse, sse_response
+from utils.tracing import TracedRoute
+
+router = APIRouter(prefix="/api/ai", tags=["ai"], route_class=TracedRoute)
 
 
 class ChatMessage(BaseModel):
@@ -35,6 +26,7 @@ class ChatMessage(BaseModel):
 class ChatRequest(BaseModel):
     messages: List[ChatMessage]
     context: Optional[dict] = None
+    no_cache: bool = False  # skip the response cache lookup for this request
 
 
 class ChatResponse(BaseModel):
@@ -48,135 +40,96 @@ async def chat_options():
     return {}
 
 
+def _build_claude_request(request: ChatRequest) -> Dict[str, Any]:
+    """
+    Build Messages API arguments for a chat request
+
+    Args:
+        request: Incoming chat request
+
+    Returns:
+        dict: Keyword arguments for the LLM gateway
+    """
+    # Convert messages to Claude format
+    claude_messages = []
+    for msg in request.messages:
+        if msg.role in ["user", "assistant"]:
+            claude_messages.append({
+                "role": msg.role,
+                "content": msg.content if isinstance(msg.content, str) else msg.content.get("message", "")
+            })
+    
+    claude_request = {
+        "model": "claude-sonnet-4-5-20250929",  # Updated to Sonnet 4.5
+        "max_tokens": 1024,
+        "messages": claude_messages
+    }
+    
+    # The assistant persona only applies when dashboard context is supplied
+    if request.context:
+        claude_request["system"] = CHAT_PROMPT.blocks
+    
+    return claude_request
+
+
+class _CachePolicy:
+    """Response cache decision for one chat request"""
+
+    def __init__(self, request: ChatRequest, claude_request: Dict[str, Any], cache_control: Optional[str]):
+        directives = {part.strip().lower() for part in (cache_control or "").split(",")}
+        enabled = settings.CHAT_RESPONSE_CACHE_ENABLED
+        self.read = enabled and not request.no_cache and not directives & {"no-cache", "no-store"}
+        self.write = enabled and "no-store" not in directives
+        self.key = None
+        if enabled:
+            prompt_key = CHAT_PROMPT.key if "system" in claude_request else None
+            self.key = cache_key(claude_request, prompt_key, request.context)
+            if not self.read:
+                record_bypass()
+
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat_with_claude(
-    request: ChatRequest
+    request: ChatRequest,
+    cache_control: Optional[str] = Header(None)
 ):
     """
     Send a message to Claude AI and get a response
     No authentication required for demo purposes
+    
+    When CHAT_RESPONSE_CACHE_ENABLED is set, identical requests are answered
+    from the response cache. Send `no_cache: true` or `Cache-Control:
+    no-cache` to force a fresh answer, or `no-store` to also skip caching it.
     """
     try:
-        client = get_anthropic_client()
+        claude_request = _build_claude_request(request)
+        cache = _CachePolicy(request, claude_request, cache_control)
         
-        # Build context information
-        context_info = ""
-        if request.context:
-            bills = request.context.get("bills", [])
-            errands = request.context.get("errands", [])
-            appointments = request.context.get("appointments", [])
-            
-            context_info = r"""
-                                You are Tadaa AI Assistant, a helpful personal concierge with a special ability to extract structured information from conversations.
-                                Your primary role is to help users manage their personal life by:
-                                1. Having natural, friendly conversations
-                                2. Automatically detecting when users mention tasks, reminders, bills, schedules, or payment details
-                                3. Extracting relevant information into structured JSON format
-                                4. Asking for missing required fields in a conversational way
-                                ## Extraction Categories:
-                                ### TASK
-                                Required fields: type (home-maintenance|cleaning|gardening|groceries|delivery|pharmacy), description, priority (urgent|normal)
-                                Optional fields: preferredDate, notes
-                                ### REMINDER
-                                Required fields: title, reminderDate, reminderTime
-                                Optional fields: notes, recurrence
-                                ### BILL
-                                Required fields: name, amount, dueDate, category (utilities|telco-internet|insurance|subscriptions|credit-loans|general)
-                                Optional fields: recurrence (one-time|monthly|yearly), reminderDays, autoPayEnabled
-                                ### SCHEDULE (Appointment)
-                                Required fields: title, date, time, location
-                                Optional fields: type (personal|family|medical), notes, recurrence
-                                ### PAYMENT
-                                Required fields: type (card|paynow|bank), nickname
-                                For card: cardBrand, cardLast4, cardExpiryMonth, cardExpiryYear, cardHolderName
-                                For paynow: payNowMobile
-                                For bank: bankName, bankAccountLast4, bankAccountHolderName
-                                ## Response Format:
-                                You MUST respond with valid JSON in this exact format:
-                                {
-                                "message": "Your conversational response to the user",
-                                "extraction": {
-                                    "detected": true/false,
-                                    "item_type": "task|reminder|bill|schedule|payment|null",
-                                    "extracted_data": {
-                                    // Fields you've extracted so far
-                                    },
-                                    "missing_fields": ["field1", "field2"],
-                                    "status": "extracting|incomplete|complete",
-                                    "confidence": 0.0-1.0
-                                }
-                                }
-                                ## Conversation Guidelines:
-                                1. Be warm, friendly, and conversational
-                                2. When you detect an item, acknowledge it naturally: "I can help you with that!"
-                                3. Extract information as the user provides it
-                                4. Ask for ONE missing field at a time in a natural way
-                                5. Once all required fields are collected, set status to "complete"
-                                6. Provide helpful suggestions and context
-                                ## Examples:
-                                User: "I need to pay my electricity bill of $150 by next Friday"
-                                Response:
-                                {
-                                "message": "I can help you track that electricity bill! I've noted it's $150 and due next Friday. What category would this fall under? (utilities, telco-internet, insurance, subscriptions, credit-loans, or general)",
-                                "extraction": {
-                                    "detected": true,
-                                    "item_type": "bill",
-                                    "extracted_data": {
-                                    "name": "Electricity Bill",
-                                    "amount": 150,
-                                    "dueDate": "2024-01-19"
-                                    },
-                                    "missing_fields": ["category"],
-                                    "status": "incomplete",
-                                    "confidence": 0.9
-                                }
-                                }
-                                User: "utilities"
-                                Response:
-                                {
-                                "message": "Perfect! I've saved your electricity bill. It's $150, due next Friday, and categorized as utilities. Would you like to set up reminders or enable auto-pay?",
-                                "extraction": {
-                                    "detected": true,
-                                    "item_type": "bill",
-                                    "extracted_data": {
-                                    "name": "Electricity Bill",
-                                    "amount": 150,
-                                    "dueDate": "2024-01-19",
-                                    "category": "utilities"
-                                    },
-                                    "missing_fields": [],
-                                    "status": "complete",
-                                    "confidence": 1.0
-                                }
-                                }
-                                Remember: Always respond with valid JSON. Be conversational but structured.
-                                """
+        if cache.read:
+            cached_text = await get_cached_response(cache.key)
+            if cached_text is not None:
+                return ChatResponse(message=cached_text, role="assistant")
         
-        # Convert messages to Claude format
-        claude_messages = []
-        for msg in request.messages:
-            if msg.role in ["user", "assistant"]:
-                claude_messages.append({
-                    "role": msg.role,
-                    "content": msg.content if isinstance(msg.content, str) else msg.content.get("message", "")
-                })
+        gateway = get_llm_gateway()
         
         # Call Claude API
-        response = client.messages.create(
-            model="claude-sonnet-4-5-20250929",  # Updated to Sonnet 4.5
-            max_tokens=1024,
-            system=context_info,
-            messages=claude_messages
-        )
+        response = await gateway.create_message(attribution=UsageAttribution("chat"), **claude_request)
         
         # Extract response text
         response_text = response.content[0].text
+        if "system" in claude_request:
+            record_usage(CHAT_PROMPT, response.usage)
+        
+        if cache.write and response_text:
+            await store_response(cache.key, response_text)
         
         return ChatResponse(
             message=response_text,
             role="assistant"
         )
         
+    except HTTPException:
+        raise
     except anthropic.APIError as e:
         raise HTTPException(
             status_code=500,
@@ -186,4 +139,54 @@ async def chat_with_claude(
         raise HTTPException(
             status_code=500,
             detail=f"Error processing chat: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+@router.post("/chat/stream")
+async def stream_chat_with_claude(
+    request: ChatRequest,
+    cache_control: Optional[str] = Header(None)
+):
+    """
+    Stream Claude's response as Server-Sent Events
+    Emits `delta` events with assistant text as it is generated, then a
+    closing `done` event carrying the full ChatResponse
+    No authentication required for demo purposes
+    
+    A cached response is sent as a single `delta` followed by `done`.
+    """
+    claude_request = _build_claude_request(request)
+    cache = _CachePolicy(request, claude_request, cache_control)
+    
+    async def event_stream():
+        try:
+            if cache.read:
+                cached_text = await get_cached_response(cache.key)
+                if cached_text is not None:
+                    yield format_sse("delta", {"text": cached_text})
+                    yield format_sse("done", ChatResponse(message=cached_text, role="assistant").dict())
+                    return
+            
+            gateway = get_llm_gateway()
+            async with gateway.stream_message(attribution=UsageAttribution("chat.stream"), **claude_request) as stream:
+                async for text in stream.text_stream:
+                    yield format_sse("delta", {"text": text})
+                final_message = await stream.get_final_message()
+            
+            response_text = final_message.content[0].text if final_message.content else ""
+            if "system" in claude_request:
+                record_usage(CHAT_PROMPT, final_message.usage)
+            if cache.write and response_text:
+                await store_response(cache.key, response_text)
+            yield format_sse("done", ChatResponse(message=response_text, role="assistant").dict())
+        except (LLMCapacityError, LLMBudgetExceededError) as e:
+            yield format_sse("error", {"detail": e.detail, "retry_after": e.retry_after})
+        except HTTPException as e:
+            # Claude is not configured
+            yield format_sse("error", {"detail": e.detail})
+        except anthropic.APIError as e:
+            yield format_sse("error", {"detail": f"Claude API error: {str(e)}"})
+        except Exception as e:
+            yield format_sse("error", {"detail": f"Error processing chat: {str(e)}"})
+    
+    return sse_response(event_stream())
@@ -2,261 +2,43 @@
 AI Extraction Router - Enhanced Claude AI with Information Extraction
 Handles conversational AI with automatic extraction of tasks, reminders, bills, schedules, and payments
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 import anthropic
-import os
 import json
 from datetime import datetime
-from bson import ObjectId
 from models.conversation import (
-    Conversation, Message, ExtractedItem, ItemType,
-    ExtractionStatus, ConversationResponse
+    Conversation, Message, ItemType,
+    ExtractionStatus, ConversationResponse, ConversationListResponse,
+    ConversationSummary
+)
+from bson import ObjectId
+from database import get_client, get_database
+from config import settings
+from llm_gateway import get_llm_gateway
+from llm_scheduler import LLMCapacityError
+from usage_ledger import LLMBudgetExceededError, UsageAttribution
+from utils.conversation_store import (
+    ConversationConflictError, ConversationUpdate, load_conversation,
+    find_extracted_item, find_extracted_items, mark_item_saved, mark_items_saved,
+    list_conversation_summaries
 )
-from database import get_database
+from utils.conversation_turns import ConversationTurn, join_inflight
+from utils.context_window import build_context, refresh_summary
+from utils.fast_path import try_fast_path
+from utils.item_resolver import (
+    ITEM_COLLECTIONS, delete_user_item, insert_item, insert_items, invalidate_user_index, resolve_item
+)
+from utils.json_stream import EnvelopeStreamParser
+from utils.prompt_registry import EXTRACTION_PROMPT, record_usage
+from utils.sse import format_sse, sse_response
+from utils.tracing import TracedRoute, span
+from write_behind import flush_conversation, flush_pending, pending_conversation, persist_turn
 
-router = APIRouter(prefix="/api/ai/extract", tags=["ai-extraction"])
+router = APIRouter(prefix="/api/ai/extract", tags=["ai-extraction"], route_class=TracedRoute)
 
-# Initialize Anthropic client
-anthropic_client = None
-
-def get_anthropic_client():
-    global anthropic_client
-    if anthropic_client is None:
-        api_key = os.getenv("ANTHROPIC_API_KEY")
-        if not api_key:
-            raise HTTPException(
-                status_code=500,
-                detail="ANTHROPIC_API_KEY not configured"
-            )
-        anthropic_client = anthropic.Anthropic(api_key=api_key)
-    return anthropic_client
-
-# System prompt for extraction persona
-EXTRACTION_SYSTEM_PROMPT = """You are Tadaa AI Assistant, a helpful personal concierge with a special ability to extract structured information from conversations.
-
-Your primary role is to help users manage their personal life by:
-1. Having natural, friendly conversations
-2. Automatically detecting when users mention tasks, reminders, bills, schedules, or payment details
-3. Extracting relevant information into structured JSON format
-4. Asking for missing required fields in a conversational way
-5. Helping users delete/remove items with proper confirmation
-
-## Extraction Categories:
-
-### TASK
-Required fields: type (home-maintenance|cleaning|gardening|groceries|delivery|pharmacy|others), description, priority (urgent|normal)
-Optional fields: preferredDate, notes
-
-**Note:** Use "others" type for tasks that don't fit the specific categories, such as buying gifts, personal shopping, or miscellaneous errands.
-
-### REMINDER
-Required fields: title, reminderDate, reminderTime
-Optional fields: notes, recurrence
-
-### BILL
-Required fields: name, amount, dueDate, category (utilities|telco-internet|insurance|subscriptions|credit-loans|general)
-Optional fields: recurrence (one-time|monthly|yearly), reminderDays, autoPayEnabled
-
-### SCHEDULE (Appointment)
-Required fields: title, date, time, location
-Optional fields: type (personal|family|medical), notes, recurrence
-
-**IMPORTANT DATE AND TIME HANDLING:**
-
-**Year Clarification:**
-- When a user provides a date without explicitly stating the year, you MUST clarify which year they mean
-- Ask: "Just to confirm, is this appointment for [month day], [current year] or [next year]?"
-- This is especially important for dates that could be in either the current or next year
-- Only mark date as complete once the year is confirmed
-- Current date context: Use the current date to make intelligent assumptions, but ALWAYS confirm
-
-**Time Clarification:**
-- When a user provides a time without AM/PM (e.g., "3pm", "3:00", "3 o'clock"), you MUST clarify if it's AM or PM
-- Ask: "Just to confirm, is that [time] in the morning (AM) or afternoon/evening (PM)?"
-- Only mark time as complete once AM/PM is confirmed
-- Convert to 24-hour format for storage: "3:00 PM" → "15:00", "9:00 AM" → "09:00"
-- If user says "morning" or "afternoon/evening", infer AM/PM accordingly
-
-### PAYMENT
-Required fields: type (card|paynow|bank), nickname
-For card: cardBrand, cardLast4, cardExpiryMonth, cardExpiryYear, cardHolderName
-For paynow: payNowMobile
-For bank: bankName, bankAccountLast4, bankAccountHolderName
-
-## DELETION HANDLING:
-
-When a user wants to delete/remove an item (task, reminder, bill, schedule, or payment):
-
-1. **Detect deletion intent**: Look for keywords like "delete", "remove", "cancel", "get rid of"
-2. **Clarify the item**: If the user doesn't specify which item, ask them to clarify
-   - Example: "Which [item type] would you like to delete? Please provide the name or description."
-3. **Confirm before deletion**: ALWAYS confirm with the user before proceeding
-   - Example: "Just to confirm, you want to delete the [item name/description]? This action cannot be undone."
-4. **Wait for explicit confirmation**: Only proceed after user confirms with "yes", "confirm", "delete it", etc.
-5. **Use deletion response format**: When ready to delete, use the deletion response format below
-
-## Response Format:
-
-You MUST respond with valid JSON in this exact format:
-
-### For Extraction (Creating/Updating Items):
-{
-  "message": "Your conversational response to the user",
-  "extraction": {
-    "detected": true/false,
-    "item_type": "task|reminder|bill|schedule|payment|null",
-    "extracted_data": {
-      // Fields you've extracted so far
-    },
-    "missing_fields": ["field1", "field2"],
-    "status": "extracting|incomplete|complete",
-    "confidence": 0.0-1.0
-  }
-}
-
-### For Deletion:
-{
-  "message": "Your conversational response to the user",
-  "deletion": {
-    "detected": true,
-    "item_type": "task|reminder|bill|schedule|payment",
-    "item_identifier": "name or description of the item to delete",
-    "status": "clarifying|confirming|confirmed",
-    "confidence": 0.0-1.0
-  }
-}
-
-**Deletion Status Values:**
-- "clarifying": Need to clarify which item to delete
-- "confirming": Asking user to confirm deletion
-- "confirmed": User has confirmed, ready to delete
-
-## Conversation Guidelines:
-
-1. Be warm, friendly, and conversational
-2. When you detect an item, acknowledge it naturally: "I can help you with that!"
-3. Extract information as the user provides it
-4. Ask for ONE missing field at a time in a natural way
-5. Once all required fields are collected, set status to "complete"
-6. Provide helpful suggestions and context
-
-## Examples:
-
-User: "I need to pay my electricity bill of $150 by next Friday"
-Response:
-{
-  "message": "I can help you track that electricity bill! I've noted it's $150 and due next Friday. What category would this fall under? (utilities, telco-internet, insurance, subscriptions, credit-loans, or general)",
-  "extraction": {
-    "detected": true,
-    "item_type": "bill",
-    "extracted_data": {
-      "name": "Electricity Bill",
-      "amount": 150,
-      "dueDate": "2024-01-19"
-    },
-    "missing_fields": ["category"],
-    "status": "incomplete",
-    "confidence": 0.9
-  }
-}
-
-User: "utilities"
-Response:
-{
-  "message": "Perfect! I've saved your electricity bill. It's $150, due next Friday, and categorized as utilities. Would you like to set up reminders or enable auto-pay?",
-  "extraction": {
-    "detected": true,
-    "item_type": "bill",
-    "extracted_data": {
-      "name": "Electricity Bill",
-      "amount": 150,
-      "dueDate": "2024-01-19",
-      "category": "utilities"
-    },
-    "missing_fields": [],
-    "status": "complete",
-    "confidence": 1.0
-  }
-}
-
-User: "I have a doctor's appointment on January 15th at 3"
-Response:
-{
-  "message": "I'll help you schedule that doctor's appointment! Just to confirm, is this for January 15th, 2025? And is the appointment at 3:00 in the morning (AM) or afternoon (PM)?",
-  "extraction": {
-    "detected": true,
-    "item_type": "schedule",
-    "extracted_data": {
-      "title": "Doctor's Appointment"
-    },
-    "missing_fields": ["date", "time", "location"],
-    "status": "incomplete",
-    "confidence": 0.8
-  }
-}
-
-User: "Yes 2025, and it's in the afternoon"
-Response:
-{
-  "message": "Perfect! January 15th, 2025 at 3:00 PM. Where is this appointment located?",
-  "extraction": {
-    "detected": true,
-    "item_type": "schedule",
-    "extracted_data": {
-      "title": "Doctor's Appointment",
-      "date": "2025-01-15",
-      "time": "15:00"
-    },
-    "missing_fields": ["location"],
-    "status": "incomplete",
-    "confidence": 0.9
-  }
-}
-
-## Deletion Examples:
-
-User: "Delete my electricity bill"
-Response:
-{
-  "message": "I found your Electricity Bill. Just to confirm, you want to delete the Electricity Bill that's due on [date] for $[amount]? This action cannot be undone.",
-  "deletion": {
-    "detected": true,
-    "item_type": "bill",
-    "item_identifier": "Electricity Bill",
-    "status": "confirming",
-    "confidence": 0.9
-  }
-}
-
-User: "Yes, delete it"
-Response:
-{
-  "message": "I've deleted your Electricity Bill. It has been removed from your bills list.",
-  "deletion": {
-    "detected": true,
-    "item_type": "bill",
-    "item_identifier": "Electricity Bill",
-    "status": "confirmed",
-    "confidence": 1.0
-  }
-}
-
-User: "Remove my appointment"
-Response:
-{
-  "message": "Which appointment would you like to remove? Please tell me the name or date of the appointment.",
-  "deletion": {
-    "detected": true,
-    "item_type": "schedule",
-    "item_identifier": "",
-    "status": "clarifying",
-    "confidence": 0.7
-  }
-}
-
-Remember: Always respond with valid JSON. Be conversational but structured. ALWAYS confirm before deleting."""
 
 class ChatRequest(BaseModel):
     message: str
@@ -283,132 +65,244 @@ class ChatResponse(BaseModel):
     extraction: Optional[ExtractionResponse] = None
     deletion: Optional[DeletionResponse] = None
 
+async def _load_conversation(db, conversation_id: Optional[str], user_id: str) -> Conversation:
+    """
+    Load an existing conversation or start a new one
+
+    Args:
+        db: Database instance
+        conversation_id: Existing conversation ID, if any
+        user_id: Owner of a newly created conversation
+
+    Returns:
+        Conversation: The conversation to continue
+
+    Raises:
+        HTTPException: If the conversation ID does not exist
+    """
+    if conversation_id:
+        # A queued write means Mongo is behind; continue from the in-memory state
+        conversation = pending_conversation(conversation_id)
+        if conversation is not None:
+            return conversation
+        # Only the messages that can fall inside the context window are needed
+        conversation = await load_conversation(
+            db, conversation_id, tail=settings.EXTRACTION_HISTORY_TURNS * 2
+        )
+        if conversation is None:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        return conversation
+    return Conversation(user_id=user_id)
+
+
+def _build_claude_request(conversation: Conversation) -> Tuple[Dict[str, Any], bool]:
+    """
+    Build Messages API arguments from the bounded conversation context
+
+    Args:
+        conversation: Conversation including the latest user message
+
+    Returns:
+        tuple: Keyword arguments for the LLM gateway, and whether the
+            rolling summary should be refreshed after this turn
+    """
+    state_text, claude_messages, needs_summary = build_context(conversation)
+    
+    return {
+        "model": "claude-3-5-sonnet-20241022",
+        "max_tokens": 2048,
+        "system": EXTRACTION_PROMPT.build(state_text),
+        "messages": claude_messages
+    }, needs_summary
+
+
+def _apply_model_response(
+    conversation: Conversation,
+    update: ConversationUpdate,
+    response_text: str
+) -> Tuple[str, Optional[ExtractionResponse], Optional[DeletionResponse]]:
+    """
+    Parse Claude's JSON envelope and apply it to the conversation
+
+    Args:
+        conversation: Conversation to update in place
+        update: Turn changes to record for persistence
+        response_text: Raw assistant text
+
+    Returns:
+        tuple: Assistant message, extraction response and deletion response
+    """
+    try:
+        # Try to parse as JSON
+        with span("json.parse_model_response", bytes=len(response_text)):
+            response_json = json.loads(response_text)
+        assistant_message = response_json.get("message", response_text)
+        extraction_data = response_json.get("extraction")
+        deletion_data = response_json.get("deletion")
+    except json.JSONDecodeError:
+        # Fallback if not JSON
+        assistant_message = response_text
+        extraction_data = None
+        deletion_data = None
+    
+    return _apply_envelope(conversation, update, assistant_message, extraction_data, deletion_data)
+
+
+def _apply_envelope(
+    conversation: Conversation,
+    update: ConversationUpdate,
+    assistant_message: str,
+    extraction_data: Optional[Dict[str, Any]],
+    deletion_data: Optional[Dict[str, Any]]
+) -> Tuple[str, Optional[ExtractionResponse], Optional[DeletionResponse]]:
+    """
+    Apply a parsed response envelope (from Claude or the fast path) to the conversation
+
+    Args:
+        conversation: Conversation to update in place
+        update: Turn changes to record for persistence
+        assistant_message: Assistant reply text
+        extraction_data: The envelope's extraction object, if any
+        deletion_data: The envelope's deletion object, if any
+
+    Returns:
+        tuple: Assistant message, extraction response and deletion response
+    """
+    # Add assistant message
+    assistant_msg = Message(role="assistant", content=assistant_message)
+    update.add_message(conversation, assistant_msg)
+    
+    # Handle extraction
+    extraction_response = None
+    deletion_response = None
+    
+    if extraction_data and extraction_data.get("detected"):
+        # Create or update the open item for this item type
+        extracted_item = update.record_extraction(
+            conversation,
+            item_type=extraction_data.get("item_type"),
+            status=ExtractionStatus(extraction_data.get("status", "extracting")),
+            extracted_data=extraction_data.get("extracted_data", {}),
+            missing_fields=extraction_data.get("missing_fields", [])
+        )
+        
+        extraction_response = ExtractionResponse(
+            detected=True,
+            item_type=extracted_item.item_type,
+            extracted_data=extracted_item.extracted_data,
+            missing_fields=extracted_item.missing_fields,
+            status=extracted_item.status,
+            confidence=extraction_data.get("confidence", 0.0)
+        )
+    
+    # Handle deletion
+    if deletion_data and deletion_data.get("detected"):
+        deletion_response = DeletionResponse(
+            detected=True,
+            item_type=deletion_data.get("item_type"),
+            item_identifier=deletion_data.get("item_identifier", ""),
+            status=deletion_data.get("status", "clarifying"),
+            confidence=deletion_data.get("confidence", 0.0)
+        )
+    
+    return assistant_message, extraction_response, deletion_response
+
+
+def _turn_abandoned() -> HTTPException:
+    return HTTPException(
+        status_code=409,
+        detail="The original request for this message did not complete. Please try again."
+    )
+
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat_with_extraction(
-    request: ChatRequest
+    request: ChatRequest,
+    background_tasks: BackgroundTasks
 ):
     """
     Chat with AI assistant that automatically extracts structured information
     No authentication required for demo purposes
+    
+    Turns on the same conversation are processed one at a time, and a
+    duplicate of a message that is already being processed shares its
+    response instead of calling Claude again.
+    """
+    if not request.conversation_id:
+        return await _run_chat_turn(request, background_tasks)
+    
+    # Double submit: wait for the identical turn and return its response
+    shared_response = await join_inflight(request.conversation_id, request.message)
+    if shared_response is not None:
+        return shared_response
+    
+    turn = ConversationTurn(request.conversation_id, request.message)
+    await turn.acquire()
+    try:
+        response = await _run_chat_turn(request, background_tasks)
+        turn.finish(response)
+        return response
+    except Exception as e:
+        turn.finish(error=e)
+        raise
+    finally:
+        turn.finish(error=_turn_abandoned())
+
+
+async def _run_chat_turn(request: ChatRequest, background_tasks: BackgroundTasks) -> ChatResponse:
+    """
+    Process one extraction chat turn and persist it
+
+    Args:
+        request: Incoming chat request
+        background_tasks: Request background tasks (summary refresh)
+
+    Returns:
+        ChatResponse: Assistant reply with extraction/deletion payloads
     """
     try:
         db = get_database()
-        client = get_anthropic_client()
         
         # Use a default user_id for unauthenticated sessions
         user_id = "anonymous"
         
         # Get or create conversation
-        if request.conversation_id:
-            conversation_doc = await db.conversations.find_one({
-                "_id": ObjectId(request.conversation_id)
-            })
-            if not conversation_doc:
-                raise HTTPException(status_code=404, detail="Conversation not found")
-            conversation = Conversation(**conversation_doc)
-        else:
-            conversation = Conversation(user_id=user_id)
+        conversation = await _load_conversation(db, request.conversation_id, user_id)
         
         # Add user message
+        update = ConversationUpdate()
         user_message = Message(role="user", content=request.message)
-        conversation.messages.append(user_message)
-        
-        # Build conversation history for Claude
-        claude_messages = []
-        for msg in conversation.messages:
-            claude_messages.append({
-                "role": msg.role,
-                "content": msg.content
-            })
+        update.add_message(conversation, user_message)
         
         # Call Claude API with extraction prompt
-        response = client.messages.create(
-            model="claude-3-5-sonnet-20241022",
-            max_tokens=2048,
-            system=EXTRACTION_SYSTEM_PROMPT,
-            messages=claude_messages
-        )
-        
-        # Parse Claude's response
-        response_text = response.content[0].text
-        
-        try:
-            # Try to parse as JSON
-            response_json = json.loads(response_text)
-            assistant_message = response_json.get("message", response_text)
-            extraction_data = response_json.get("extraction")
-            deletion_data = response_json.get("deletion")
-        except json.JSONDecodeError:
-            # Fallback if not JSON
-            assistant_message = response_text
-            extraction_data = None
-            deletion_data = None
-        
-        # Add assistant message
-        assistant_msg = Message(role="assistant", content=assistant_message)
-        conversation.messages.append(assistant_msg)
+        claude_request, needs_summary = _build_claude_request(conversation)
+        fast_response = try_fast_path(conversation, request.message) if settings.EXTRACTION_FAST_PATH_ENABLED else None
         
-        # Handle extraction
-        extraction_response = None
-        deletion_response = None
-        
-        if extraction_data and extraction_data.get("detected"):
-            # Create or update extracted item
-            item_id = f"item_{datetime.utcnow().timestamp()}"
-            
-            extracted_item = ExtractedItem(
-                id=item_id,
-                item_type=extraction_data.get("item_type"),
-                status=ExtractionStatus(extraction_data.get("status", "extracting")),
-                extracted_data=extraction_data.get("extracted_data", {}),
-                missing_fields=extraction_data.get("missing_fields", []),
-                updated_at=datetime.utcnow()
+        if fast_response:
+            # Trivial slot fill answered locally
+            assistant_message, extraction_response, deletion_response = _apply_envelope(
+                conversation, update, fast_response["message"], fast_response["extraction"], None
             )
-            
-            # Update or add to conversation
-            existing_item_index = None
-            for i, item in enumerate(conversation.extracted_items):
-                if item.status != ExtractionStatus.SAVED and item.item_type == extracted_item.item_type:
-                    existing_item_index = i
-                    break
-            
-            if existing_item_index is not None:
-                conversation.extracted_items[existing_item_index] = extracted_item
-            else:
-                conversation.extracted_items.append(extracted_item)
-            
-            extraction_response = ExtractionResponse(
-                detected=True,
-                item_type=extracted_item.item_type,
-                extracted_data=extracted_item.extracted_data,
-                missing_fields=extracted_item.missing_fields,
-                status=extracted_item.status,
-                confidence=extraction_data.get("confidence", 0.0)
+        else:
+            gateway = get_llm_gateway()
+            response = await gateway.create_message(
+                attribution=UsageAttribution("extraction.chat", user_id, request.conversation_id),
+                **claude_request
             )
-        
-        # Handle deletion
-        if deletion_data and deletion_data.get("detected"):
-            deletion_response = DeletionResponse(
-                detected=True,
-                item_type=deletion_data.get("item_type"),
-                item_identifier=deletion_data.get("item_identifier", ""),
-                status=deletion_data.get("status", "clarifying"),
-                confidence=deletion_data.get("confidence", 0.0)
+            
+            # Parse Claude's response
+            response_text = response.content[0].text
+            record_usage(EXTRACTION_PROMPT, response.usage)
+            assistant_message, extraction_response, deletion_response = _apply_model_response(
+                conversation, update, response_text
             )
         
         # Save conversation
-        conversation.updated_at = datetime.utcnow()
-        conversation_dict = conversation.dict()
+        conv_id = await persist_turn(db, conversation, request.conversation_id, update)
         
-        if request.conversation_id:
-            await db.conversations.update_one(
-                {"_id": ObjectId(request.conversation_id)},
-                {"$set": conversation_dict}
-            )
-            conv_id = request.conversation_id
-        else:
-            result = await db.conversations.insert_one(conversation_dict)
-            conv_id = str(result.inserted_id)
+        # Compact older turns after the response has been sent
+        if needs_summary:
+            background_tasks.add_task(refresh_summary, conv_id)
         
         return ChatResponse(
             message=assistant_message,
@@ -417,6 +311,13 @@ async def chat_with_extraction(
             deletion=deletion_response
         )
         
+    except ConversationConflictError:
+        raise HTTPException(
+            status_code=409,
+            detail="This conversation was changed by another request. Please try again."
+        )
+    except HTTPException:
+        raise
     except anthropic.APIError as e:
         raise HTTPException(
             status_code=500,
@@ -428,20 +329,155 @@ async def chat_with_extraction(
             detail=f"Error processing chat: {str(e)}"
         )
 
-@router.get("/conversations", response_model=List[ConversationResponse])
-async def get_conversations():
-    """Get all conversations (no authentication required)"""
+@router.post("/chat/stream")
+async def stream_chat_with_extraction(
+    request: ChatRequest,
+    background_tasks: BackgroundTasks
+):
+    """
+    Stream the extraction chat as Server-Sent Events
+    Emits `delta` events with the assistant's message text as it is generated
+    and a `field` event for each extracted_data key/value as soon as it closes,
+    then a closing `done` event carrying the full ChatResponse (including the
+    extraction/deletion payload) once the conversation has been saved
+    No authentication required for demo purposes
+    
+    A duplicate of a message already being processed on this conversation
+    receives the first turn's reply as a single `delta` plus `done`.
+    """
+    db = get_database()
+    
+    # Use a default user_id for unauthenticated sessions
+    user_id = "anonymous"
+    
+    turn = None
+    if request.conversation_id:
+        shared_response = await join_inflight(request.conversation_id, request.message)
+        if shared_response is not None:
+            return sse_response(_replay_response(shared_response))
+        turn = ConversationTurn(request.conversation_id, request.message)
+        await turn.acquire()
+        # Released by event_stream; this is a safety net if streaming never starts
+        background_tasks.add_task(turn.finish, error=_turn_abandoned())
+    
+    # Resolve the conversation before streaming so lookup errors keep their status code.
+    # An error here ends the request before background tasks run, so release the turn now
+    try:
+        conversation = await _load_conversation(db, request.conversation_id, user_id)
+        update = ConversationUpdate()
+        update.add_message(conversation, Message(role="user", content=request.message))
+        claude_request, needs_summary = _build_claude_request(conversation)
+        fast_response = try_fast_path(conversation, request.message) if settings.EXTRACTION_FAST_PATH_ENABLED else None
+    except BaseException as e:
+        if turn:
+            turn.finish(error=e if isinstance(e, Exception) else _turn_abandoned())
+        raise
+    
+    async def event_stream():
+        try:
+            if fast_response:
+                # Trivial slot fill answered locally, sent as one delta
+                yield format_sse("delta", {"text": fast_response["message"]})
+                assistant_message, extraction_response, deletion_response = _apply_envelope(
+                    conversation, update, fast_response["message"], fast_response["extraction"], None
+                )
+            else:
+                gateway = get_llm_gateway()
+                parser = EnvelopeStreamParser()
+                attribution = UsageAttribution("extraction.chat.stream", user_id, request.conversation_id)
+                async with gateway.stream_message(attribution=attribution, **claude_request) as stream:
+                    async for text in stream.text_stream:
+                        for event, data in parser.feed(text):
+                            if event == "message_delta":
+                                yield format_sse("delta", {"text": data})
+                            else:
+                                yield format_sse("field", data)
+                    final_message = await stream.get_final_message()
+                
+                response_text = final_message.content[0].text if final_message.content else ""
+                record_usage(EXTRACTION_PROMPT, final_message.usage)
+                assistant_message, extraction_response, deletion_response = _apply_model_response(
+                    conversation, update, response_text
+                )
+            conv_id = await persist_turn(db, conversation, request.conversation_id, update)
+            if needs_summary:
+                background_tasks.add_task(refresh_summary, conv_id)
+            
+            chat_response = ChatResponse(
+                message=assistant_message,
+                conversation_id=conv_id,
+                extraction=extraction_response,
+                deletion=deletion_response
+            )
+            if turn:
+                turn.finish(chat_response)
+            yield format_sse("done", chat_response.dict())
+        except ConversationConflictError:
+            detail = "This conversation was changed by another request. Please try again."
+            if turn:
+                turn.finish(error=HTTPException(status_code=409, detail=detail))
+            yield format_sse("error", {"detail": detail})
+        except (LLMCapacityError, LLMBudgetExceededError) as e:
+            if turn:
+                turn.finish(error=e)
+            yield format_sse("error", {"detail": e.detail, "retry_after": e.retry_after})
+        except HTTPException as e:
+            # Claude is not configured
+            if turn:
+                turn.finish(error=e)
+            yield format_sse("error", {"detail": e.detail})
+        except anthropic.APIError as e:
+            detail = f"Claude API error: {str(e)}"
+            if turn:
+                turn.finish(error=HTTPException(status_code=500, detail=detail))
+            yield format_sse("error", {"detail": detail})
+        except Exception as e:
+            detail = f"Error processing chat: {str(e)}"
+            if turn:
+                turn.finish(error=HTTPException(status_code=500, detail=detail))
+            yield format_sse("error", {"detail": detail})
+        finally:
+            if turn:
+                turn.finish(error=_turn_abandoned())
+    
+    return sse_response(event_stream())
+
+
+async def _replay_response(response: ChatResponse):
+    """Send an already computed turn as a stream"""
+    yield format_sse("delta", {"text": response.message})
+    yield format_sse("done", response.dict())
+
+@router.get("/conversations", response_model=ConversationListResponse)
+async def get_conversations(
+    limit: int = Query(settings.CONVERSATION_PAGE_SIZE, ge=1, le=settings.CONVERSATION_PAGE_SIZE_MAX),
+    cursor: Optional[str] = None
+):
+    """
+    List conversation summaries, most recently updated first (no authentication required)
+
+    Only listing fields are read, never messages. Pass `next_cursor` from the
+    previous page as `cursor` to fetch the next one.
+    """
     try:
         db = get_database()
-        conversations = await db.conversations.find({}).sort("updated_at", -1).to_list(100)
-        
-        return [ConversationResponse(id=str(conv["_id"]), **conv) for conv in conversations]
+        await flush_pending()
+        conversations, next_cursor = await list_conversation_summaries(db, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error fetching conversations: {str(e)}"
         )
 
+    return ConversationListResponse(
+        conversations=[
+            ConversationSummary(id=str(conv.pop("_id")), **conv) for conv in conversations
+        ],
+        next_cursor=next_cursor
+    )
+
 @router.get("/conversations/{conversation_id}", response_model=ConversationResponse)
 async def get_conversation(
     conversation_id: str
@@ -449,14 +485,14 @@ async def get_conversation(
     """Get a specific conversation (no authentication required)"""
     try:
         db = get_database()
-        conversation = await db.conversations.find_one({
-            "_id": ObjectId(conversation_id)
-        })
+        await flush_conversation(conversation_id)
+        conversation = await load_conversation(db, conversation_id)
         
-        if not conversation:
+        if conversation is None:
             raise HTTPException(status_code=404, detail="Conversation not found")
         
-        return ConversationResponse(id=str(conversation["_id"]), **conversation)
+        with span("pydantic.ConversationResponse"):
+            return ConversationResponse(id=conversation_id, **conversation.dict())
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -474,22 +510,13 @@ async def save_extracted_item(
     """
     try:
         db = get_database()
-        conversation = await db.conversations.find_one({
-            "_id": ObjectId(conversation_id)
-        })
         
-        if not conversation:
-            raise HTTPException(status_code=404, detail="Conversation not found")
-        
-        # Find the extracted item
-        extracted_item = None
-        for item in conversation.get("extracted_items", []):
-            if item["id"] == item_id:
-                extracted_item = item
-                break
+        await flush_conversation(conversation_id)
+        # Fetch only the requested item, matched by ID on the server
+        extracted_item, active_items, version = await find_extracted_item(db, conversation_id, item_id)
         
         if not extracted_item:
-            raise HTTPException(status_code=404, detail="Extracted item not found")
+            raise HTTPException(status_code=404, detail="Conversation or extracted item not found")
         
         if extracted_item["status"] != "complete":
             raise HTTPException(
@@ -498,55 +525,180 @@ async def save_extracted_item(
             )
         
         # Save to appropriate collection based on item_type
-        item_data = extracted_item["extracted_data"].copy()
-        item_data["user_id"] = "anonymous"
-        item_data["created_at"] = datetime.utcnow()
-        item_data["updated_at"] = datetime.utcnow()
-        
-        collection_map = {
-            "task": "errands",
-            "reminder": "reminders",
-            "bill": "bills",
-            "schedule": "appointments",
-            "payment": "payment_methods"
-        }
+        item_data = _item_document(extracted_item, "anonymous")
         
-        collection_name = collection_map.get(extracted_item["item_type"])
+        collection_name = ITEM_COLLECTIONS.get(extracted_item["item_type"])
         if not collection_name:
             raise HTTPException(status_code=400, detail="Invalid item type")
         
-        # Insert into appropriate collection
-        result = await db[collection_name].insert_one(item_data)
+        # Insert into appropriate collection with its search keys
+        inserted_id = await insert_item(db, collection_name, item_data)
         
-        # Update extracted item status
-        await db.conversations.update_one(
-            {
-                "_id": ObjectId(conversation_id),
-                "extracted_items.id": item_id
-            },
-            {
-                "$set": {
-                    "extracted_items.$.status": "saved",
-                    "extracted_items.$.saved_at": datetime.utcnow()
-                }
-            }
-        )
+        # Update extracted item status; undo the insert if another request saved it first
+        if not await mark_item_saved(db, conversation_id, extracted_item, active_items, version):
+            await delete_user_item(db, collection_name, item_data["user_id"], str(inserted_id))
+            raise HTTPException(status_code=409, detail="This item has already been saved")
         
         return {
             "success": True,
-            "item_id": str(result.inserted_id),
+            "item_id": str(inserted_id),
             "collection": collection_name
         }
         
+    except HTTPException:
+        raise
+    except ConversationConflictError:
+        raise HTTPException(
+            status_code=409,
+            detail="This conversation was changed by another request. Please try again."
+        )
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error saving item: {str(e)}"
         )
 
+class SaveItemsRequest(BaseModel):
+    item_ids: Optional[List[str]] = None  # defaults to every complete, unsaved item
+
+
+def _item_document(extracted_item: Dict[str, Any], user_id: str) -> Dict[str, Any]:
+    """Build the document stored in an item collection from an extracted item"""
+    now = datetime.utcnow()
+    item_data = extracted_item["extracted_data"].copy()
+    item_data["user_id"] = user_id
+    item_data["created_at"] = now
+    item_data["updated_at"] = now
+    return item_data
+
+
+async def _save_items(db, conversation_id: str, item_ids: Optional[List[str]], user_id: str, session=None) -> Dict[str, Any]:
+    """
+    Insert completed items into their collections and mark them saved
+
+    Items are grouped by target collection and inserted with one
+    `insert_many` each; all statuses are then flipped in one conversation
+    update. Items another request saved meanwhile have their inserts
+    removed and are reported as skipped.
+
+    Args:
+        db: Database instance
+        conversation_id: Conversation ID
+        item_ids: Items to save, or None for every complete, unsaved item
+        user_id: Owner of the saved items
+        session: Optional client session (for transactions)
+
+    Returns:
+        dict: Saved items (extracted item ID, new item ID, collection) and
+            skipped extracted item IDs
+
+    Raises:
+        HTTPException: 404 for unknown conversations or items, 400 for
+            incomplete items or unknown item types
+    """
+    items, active_items, version = await find_extracted_items(db, conversation_id, session=session)
+    if items is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    
+    skipped: List[str] = []
+    if item_ids is None:
+        selected = [item for item in items if item["status"] == ExtractionStatus.COMPLETE.value]
+    else:
+        by_id = {item["id"]: item for item in items}
+        missing = [item_id for item_id in item_ids if item_id not in by_id]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Extracted items not found: {', '.join(missing)}")
+        skipped = [item_id for item_id in item_ids if by_id[item_id]["status"] == ExtractionStatus.SAVED.value]
+        selected = [by_id[item_id] for item_id in dict.fromkeys(item_ids) if item_id not in skipped]
+        incomplete = [item["id"] for item in selected if item["status"] != ExtractionStatus.COMPLETE.value]
+        if incomplete:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Cannot save incomplete items: {', '.join(incomplete)}. Please provide all required fields first."
+            )
+    
+    # Group by target collection so each collection gets a single insert_many
+    by_collection: Dict[str, List[Dict[str, Any]]] = {}
+    for item in selected:
+        collection_name = ITEM_COLLECTIONS.get(item["item_type"])
+        if not collection_name:
+            raise HTTPException(status_code=400, detail="Invalid item type")
+        by_collection.setdefault(collection_name, []).append(item)
+    
+    inserted: Dict[str, Tuple[str, ObjectId]] = {}
+    for collection_name, collection_items in by_collection.items():
+        inserted_ids = await insert_items(
+            db, collection_name, [_item_document(item, user_id) for item in collection_items], session=session
+        )
+        for item, inserted_id in zip(collection_items, inserted_ids):
+            inserted[item["id"]] = (collection_name, inserted_id)
+    
+    marked = set(await mark_items_saved(db, conversation_id, selected, active_items, version, session=session)) if selected else set()
+    
+    # Undo inserts for items that another request saved first
+    lost = [item["id"] for item in selected if item["id"] not in marked]
+    for collection_name in {inserted[item_id][0] for item_id in lost}:
+        await db[collection_name].delete_many(
+            {"_id": {"$in": [inserted[item_id][1] for item_id in lost if inserted[item_id][0] == collection_name]}},
+            session=session
+        )
+        invalidate_user_index(collection_name, user_id)
+    
+    return {
+        "saved": [
+            {"extracted_item_id": item_id, "item_id": str(inserted[item_id][1]), "collection": inserted[item_id][0]}
+            for item_id in inserted if item_id in marked
+        ],
+        "skipped": skipped + lost
+    }
+
+
+@router.post("/conversations/{conversation_id}/save-items")
+async def save_extracted_items(
+    conversation_id: str,
+    request: SaveItemsRequest
+):
+    """
+    Save several extracted items to their collections at once
+    No authentication required for demo purposes
+    
+    Saves the listed items, or every complete unsaved item when `item_ids`
+    is omitted. Items already saved are reported in `skipped`. With
+    SAVE_ITEMS_USE_TRANSACTION the inserts and the status update commit
+    atomically.
+    """
+    try:
+        db = get_database()
+        user_id = "anonymous"
+        await flush_conversation(conversation_id)
+        
+        if settings.SAVE_ITEMS_USE_TRANSACTION:
+            async with await get_client().start_session() as session:
+                result = await session.with_transaction(
+                    lambda session: _save_items(db, conversation_id, request.item_ids, user_id, session=session)
+                )
+        else:
+            result = await _save_items(db, conversation_id, request.item_ids, user_id)
+        
+        return {"success": True, **result}
+        
+    except HTTPException:
+        raise
+    except ConversationConflictError:
+        raise HTTPException(
+            status_code=409,
+            detail="This conversation was changed by another request. Please try again."
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error saving items: {str(e)}"
+        )
+
 class DeleteItemRequest(BaseModel):
     item_type: ItemType
     item_identifier: str
+    item_id: Optional[str] = None  # set when the user picked one of several candidates
 
 @router.post("/delete-item")
 async def delete_item(
@@ -556,58 +708,52 @@ async def delete_item(
     Delete an item (task, reminder, bill, schedule, or payment) from the database
     This endpoint is called after AI confirms deletion with the user
     No authentication required for demo purposes
+    
+    If several items match the identifier about equally well nothing is
+    deleted and a 409 lists the candidates; resend with `item_id` to choose.
     """
     try:
         db = get_database()
+        user_id = "anonymous"
         
-        collection_map = {
-            "task": "errands",
-            "reminder": "reminders",
-            "bill": "bills",
-            "schedule": "appointments",
-            "payment": "payment_methods"
-        }
-        
-        collection_name = collection_map.get(request.item_type)
+        collection_name = ITEM_COLLECTIONS.get(request.item_type)
         if not collection_name:
             raise HTTPException(status_code=400, detail="Invalid item type")
         
-        # Search for the item by name/description
-        # For anonymous user, we search across all items
-        query = {
-            "user_id": "anonymous",
-            "$or": [
-                {"name": {"$regex": request.item_identifier, "$options": "i"}},
-                {"title": {"$regex": request.item_identifier, "$options": "i"}},
-                {"description": {"$regex": request.item_identifier, "$options": "i"}},
-                {"nickname": {"$regex": request.item_identifier, "$options": "i"}}
-            ]
-        }
-        
-        # Find the item
-        item = await db[collection_name].find_one(query)
-        
-        if not item:
+        item_id = request.item_id
+        if not item_id:
+            resolved = await resolve_item(db, collection_name, user_id, request.item_identifier)
+            
+            if resolved.status == "ambiguous":
+                labels = ", ".join(candidate["label"] for candidate in resolved.candidates)
+                return JSONResponse(
+                    status_code=409,
+                    content={
+                        "detail": f"Several {request.item_type.value}s match '{request.item_identifier}': {labels}. Which one should be deleted?",
+                        "candidates": resolved.candidates
+                    }
+                )
+            item_id = resolved.item_id
+        
+        if not item_id:
             raise HTTPException(
                 status_code=404,
-                detail=f"Could not find {request.item_type} matching '{request.item_identifier}'"
+                detail=f"Could not find {request.item_type.value} matching '{request.item_identifier}'"
             )
         
         # Delete the item
-        result = await db[collection_name].delete_one({"_id": item["_id"]})
-        
-        if result.deleted_count == 0:
+        if not await delete_user_item(db, collection_name, user_id, item_id):
             raise HTTPException(
-                status_code=500,
-                detail="Failed to delete item"
+                status_code=404,
+                detail=f"Could not find {request.item_type.value} matching '{request.item_identifier}'"
             )
         
         return {
             "success": True,
             "item_type": request.item_type,
-            "item_id": str(item["_id"]),
+            "item_id": item_id,
             "collection": collection_name,
-            "message": f"Successfully deleted {request.item_type}"
+            "message": f"Successfully deleted {request.item_type.value}"
         }
         
     except HTTPException:
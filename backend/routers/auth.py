@@ -6,19 +6,22 @@ from fastapi.responses import RedirectResponse
 from datetime import datetime
 from bson import ObjectId
 from authlib.integrations.starlette_client import OAuth
-import httpx
 
 from models.user import UserCreate, UserResponse, UserLogin, Token, GoogleUserCreate
 from utils.auth import (
-    hash_password,
+    hash_password_async,
     create_access_token,
     authenticate_user,
-    get_current_user
+    get_current_user,
+    invalidate_principal
 )
+from utils.google_tokens import GoogleTokenError, verify_google_id_token
+from utils.tracing import TracedRoute
 from database import get_users_collection
 from config import settings
+from http_client import SharedTransport
 
-router = APIRouter(prefix="/auth", tags=["Authentication"])
+router = APIRouter(prefix="/auth", tags=["Authentication"], route_class=TracedRoute)
 
 # Initialize OAuth
 oauth = OAuth()
@@ -28,7 +31,10 @@ oauth.register(
     client_secret=settings.GOOGLE_CLIENT_SECRET,
     server_metadata_url='https://accounts.google.com/.well-known/openid-configuration',
     client_kwargs={
-        'scope': 'openid email profile'
+        'scope': 'openid email profile',
+        # Discovery and token exchange reuse the lifespan-owned connection pool
+        'transport': SharedTransport(),
+        'timeout': settings.HTTP_CLIENT_TIMEOUT_SECONDS
     }
 )
 
@@ -62,7 +68,7 @@ async def register(user_data: UserCreate):
         "firstName": user_data.firstName,
         "lastName": user_data.lastName,
         "email": user_data.email,
-        "hashed_password": hash_password(user_data.password),
+        "hashed_password": await hash_password_async(user_data.password),
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow()
     }
@@ -200,6 +206,7 @@ async def google_callback(request: Request):
                         }
                     }
                 )
+                invalidate_principal(str(existing_user["_id"]))
             user_id = str(existing_user["_id"])
         else:
             # Create new user - split name into firstName and lastName
@@ -261,26 +268,14 @@ async def google_token_login(request: Request):
             detail="id_token is required"
         )
     try:
-        # Verify the Google ID token
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://oauth2.googleapis.com/tokeninfo?id_token={id_token}"
+        # Verify the Google ID token locally against Google's signing keys
+        try:
+            user_info = await verify_google_id_token(id_token)
+        except GoogleTokenError as e:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail=f"Invalid Google token: {str(e)}"
             )
-            
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Invalid Google token"
-                )
-            
-            user_info = response.json()
-            
-            # Verify the token is for our app
-            if user_info.get('aud') != settings.GOOGLE_CLIENT_ID:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Token not issued for this application"
-                )
         
         users_collection = get_users_collection()
         
@@ -306,6 +301,7 @@ async def google_token_login(request: Request):
                         }
                     }
                 )
+                invalidate_principal(str(existing_user["_id"]))
             user_id = str(existing_user["_id"])
         else:
             # Create new user - split name into firstName and lastName
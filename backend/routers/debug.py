@@ -0,0 +1,151 @@
+"""
+Debug endpoints: request trace waterfalls (development only)
+"""
+from html import escape
+from typing import Dict, List
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import HTMLResponse, JSONResponse
+
+from config import settings
+from utils.tracing import Trace, find_trace, recent_traces, to_otlp, tracing_stats
+
+router = APIRouter(prefix="/debug", tags=["Debug"])
+
+# Bar colour by span name prefix
+SPAN_COLOURS = {
+    "mongodb": "#4caf50",
+    "llm": "#9c27b0",
+    "auth": "#ff9800",
+    "pydantic": "#2196f3",
+    "json": "#00bcd4",
+    "endpoint": "#607d8b",
+}
+
+PAGE_STYLE = """
+body { font: 13px -apple-system, sans-serif; margin: 20px; color: #222; }
+table { border-collapse: collapse; width: 100%; }
+td, th { padding: 2px 6px; text-align: left; white-space: nowrap; }
+tr:hover { background: #f3f3f3; }
+.bar-cell { width: 60%; position: relative; }
+.bar { position: absolute; top: 4px; height: 12px; min-width: 1px; border-radius: 2px; }
+.name { overflow: hidden; text-overflow: ellipsis; max-width: 420px; }
+.attrs { color: #777; font-size: 11px; }
+.slow { color: #c62828; font-weight: bold; }
+"""
+
+
+def _require_development() -> None:
+    if not settings.is_development:
+        raise HTTPException(status_code=404, detail="Not found")
+
+
+def _page(title: str, body: str) -> HTMLResponse:
+    return HTMLResponse(
+        f"<!doctype html><html><head><title>{escape(title)}</title><style>{PAGE_STYLE}</style></head>"
+        f"<body>{body}</body></html>"
+    )
+
+
+def _depths(trace: Trace) -> Dict[str, int]:
+    parents = {span.span_id: span.parent_id for span in trace.spans}
+    depths: Dict[str, int] = {}
+    for span_id in parents:
+        depth, parent = 0, parents[span_id]
+        while parent is not None and parent in parents and depth < 50:
+            depth, parent = depth + 1, parents[parent]
+        depths[span_id] = depth
+    return depths
+
+
+def _waterfall(trace: Trace) -> str:
+    total = max(trace.duration, 1e-9)
+    depths = _depths(trace)
+    rows: List[str] = []
+    for span in sorted(trace.spans, key=lambda span: span.start):
+        end = span.end if span.end is not None else span.start
+        offset = (span.start - trace.root.start) / total * 100
+        width = (end - span.start) / total * 100
+        colour = SPAN_COLOURS.get(span.name.split(".")[0].split(" ")[0], "#9e9e9e")
+        attrs = ", ".join(f"{key}={value}" for key, value in span.attributes.items())
+        rows.append(
+            "<tr>"
+            f"<td class='name' style='padding-left:{6 + depths[span.span_id] * 14}px'>{escape(span.name)}"
+            f"<div class='attrs'>{escape(attrs)}</div></td>"
+            f"<td>{(end - span.start) * 1000:.2f} ms</td>"
+            f"<td class='bar-cell'><div class='bar' style='left:{offset:.2f}%;width:{width:.2f}%;"
+            f"background:{colour}'></div></td>"
+            "</tr>"
+        )
+    dropped = f"<p>{trace.dropped_spans} spans dropped (TRACE_MAX_SPANS)</p>" if trace.dropped_spans else ""
+    return f"<table><tr><th>Span</th><th>Duration</th><th>Timeline</th></tr>{''.join(rows)}</table>{dropped}"
+
+
+@router.get(
+    "/traces",
+    response_class=HTMLResponse,
+    summary="Recent Request Traces",
+    description="List retained traces (slow, failed and sampled requests), newest first"
+)
+async def list_traces():
+    """
+    Render the retained traces as a table linking to their waterfalls
+    """
+    _require_development()
+    stats = tracing_stats()
+    rows = []
+    for trace in recent_traces():
+        slow = trace.duration * 1000 >= settings.TRACE_SLOW_THRESHOLD_MS
+        rows.append(
+            "<tr>"
+            f"<td><a href='/debug/traces/{trace.trace_id}'>{escape(trace.name)}</a></td>"
+            f"<td>{trace.status}</td>"
+            f"<td class='{'slow' if slow else ''}'>{trace.duration * 1000:.1f} ms</td>"
+            f"<td>{len(trace.spans)}</td>"
+            "</tr>"
+        )
+    body = (
+        "<h2>Recent traces</h2>"
+        f"<p>{stats['recorded']} recorded, {stats['buffered_slow']} slow or failed and "
+        f"{stats['buffered_sampled']} sampled retained. <a href='/debug/traces.otlp.json'>Download OTLP/JSON</a></p>"
+        f"<table><tr><th>Request</th><th>Status</th><th>Duration</th><th>Spans</th></tr>{''.join(rows)}</table>"
+    )
+    return _page("Recent traces", body)
+
+
+@router.get(
+    "/traces.otlp.json",
+    summary="Export Traces",
+    description="Download all retained traces as an OTLP/JSON ExportTraceServiceRequest"
+)
+async def export_traces():
+    """
+    Export retained traces for offline analysis in OpenTelemetry tooling
+    """
+    _require_development()
+    return JSONResponse(
+        to_otlp(recent_traces()),
+        headers={"Content-Disposition": "attachment; filename=traces.otlp.json"}
+    )
+
+
+@router.get(
+    "/traces/{trace_id}",
+    response_class=HTMLResponse,
+    summary="Trace Waterfall",
+    description="Render one trace as a span waterfall"
+)
+async def show_trace(trace_id: str):
+    """
+    Render one retained trace as a waterfall of its spans
+    """
+    _require_development()
+    trace = find_trace(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found or evicted")
+    body = (
+        f"<p><a href='/debug/traces'>&larr; All traces</a></p>"
+        f"<h2>{escape(trace.name)} &mdash; {trace.status}, {trace.duration * 1000:.1f} ms</h2>"
+        f"{_waterfall(trace)}"
+    )
+    return _page(trace.name, body)
@@ -0,0 +1,289 @@
+"""
+Diagnostics endpoints for capacity planning and operational visibility
+"""
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel
+from typing import Any, Dict
+
+import llm_gateway
+from config import settings
+from db_indexes import get_index_report
+from utils.auth import password_hash_stats
+from utils.cache import get_cache_stats
+from utils.conversation_store import conversation_write_stats
+from utils.conversation_turns import conversation_turn_stats
+from utils.db_monitor import db_ops_stats
+from utils.fast_path import fast_path_stats
+from utils.prompt_registry import get_usage_stats
+from utils.rate_limit import rate_limit_stats
+from utils.response_cache import response_cache_stats
+from usage_ledger import tokens_per_turn
+from write_behind import write_behind_stats
+
+router = APIRouter(prefix="/diagnostics", tags=["Diagnostics"])
+
+
+def _require_development() -> None:
+    if not settings.is_development:
+        raise HTTPException(status_code=404, detail="Not found")
+
+
+class PromptUsageStats(BaseModel):
+    """Token usage for one prompt version"""
+    calls: int
+    input_tokens: int
+    output_tokens: int
+    cache_read_input_tokens: int
+    cache_creation_input_tokens: int
+    cache_read_share: float
+
+
+class LLMGatewayStats(BaseModel):
+    """LLM gateway call counters"""
+    configured: bool
+    in_flight: int = 0
+    peak_in_flight: int = 0
+    total_calls: int = 0
+    total_errors: int = 0
+    avg_latency_ms: float = 0.0
+
+
+class PasswordHashStats(BaseModel):
+    """Password hashing pool counters"""
+    workers: int
+    bcrypt_rounds: int
+    in_flight: int
+    queue_depth: int
+    peak_queue_depth: int
+    total_hashes: int
+    avg_hash_ms: float
+
+
+@router.get(
+    "/llm",
+    response_model=LLMGatewayStats,
+    summary="LLM Gateway Stats",
+    description="Report in-flight and completed Claude API calls for this worker"
+)
+async def llm_stats() -> LLMGatewayStats:
+    """
+    Report LLM gateway counters for this worker process
+
+    Returns:
+        LLMGatewayStats: In-flight and cumulative call counters
+    """
+    gateway = llm_gateway.llm_gateway
+    if gateway is None:
+        return LLMGatewayStats(configured=False)
+    return LLMGatewayStats(configured=True, **gateway.stats())
+
+
+@router.get(
+    "/prompts",
+    response_model=Dict[str, PromptUsageStats],
+    summary="Prompt Cache Usage",
+    description="Report input, output and prompt-cache read/write tokens per system prompt version"
+)
+async def prompt_usage() -> Dict[str, PromptUsageStats]:
+    """
+    Report token usage per system prompt version for this worker process
+
+    Returns:
+        dict: Usage counters keyed by "name@version"
+    """
+    return {key: PromptUsageStats(**stats) for key, stats in get_usage_stats().items()}
+
+
+@router.get(
+    "/indexes",
+    summary="Database Index Status",
+    description="Report the startup index verification: missing, created, conflicting and unmanaged indexes"
+)
+async def index_status() -> Dict[str, Any]:
+    """
+    Report index drift against the declarative spec for this worker process
+
+    Returns:
+        dict: Verification state and per-collection index status
+    """
+    return get_index_report()
+
+
+@router.get(
+    "/caches",
+    summary="In-Process Cache Stats",
+    description="Report size, hit rate and evictions for each in-process cache in this worker"
+)
+async def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Report counters for every in-process cache in this worker process
+
+    Returns:
+        dict: Cache counters keyed by cache name
+    """
+    return get_cache_stats()
+
+
+@router.get(
+    "/password-hashing",
+    response_model=PasswordHashStats,
+    summary="Password Hashing Pool Stats",
+    description="Report bcrypt pool size, in-flight and queued hashes for this worker"
+)
+async def password_hashing_stats() -> PasswordHashStats:
+    """
+    Report password hashing pool counters for this worker process
+
+    Returns:
+        PasswordHashStats: Pool size, queue depth and average hash time
+    """
+    return PasswordHashStats(**password_hash_stats())
+
+
+@router.get(
+    "/response-cache",
+    summary="Chat Response Cache Stats",
+    description="Report memory and Mongo tier hits, misses, stores and bypasses for the /api/ai/chat response cache"
+)
+async def response_cache() -> Dict[str, Any]:
+    """
+    Report chat response cache counters for this worker process
+
+    Returns:
+        dict: Per-tier hits, misses, stores, bypasses and hit rate
+    """
+    return response_cache_stats()
+
+
+@router.get(
+    "/fast-path",
+    summary="Extraction Fast-Path Stats",
+    description="Report how many extraction turns were answered by the local slot filler instead of Claude"
+)
+async def fast_path() -> Dict[str, Any]:
+    """
+    Report extraction fast-path counters for this worker process
+
+    Returns:
+        dict: Turns seen, eligible turns, local answers and hit rate
+    """
+    return fast_path_stats()
+
+
+@router.get(
+    "/conversation-turns",
+    summary="Conversation Turn Coordination Stats",
+    description="Report serialised and coalesced extraction chat turns for this worker"
+)
+async def conversation_turns() -> Dict[str, Any]:
+    """
+    Report per-conversation serialisation and single-flight counters
+
+    Returns:
+        dict: Turns, waits, coalesced duplicates and lock timeouts
+    """
+    return conversation_turn_stats()
+
+
+@router.get(
+    "/conversation-writes",
+    summary="Conversation Write Conflict Stats",
+    description="Report optimistic-concurrency conflicts on conversation writes for this worker"
+)
+async def conversation_writes() -> Dict[str, Any]:
+    """
+    Report versioned conversation write counters
+
+    Returns:
+        dict: Writes, version conflicts, merged retries and exhausted retries
+    """
+    return conversation_write_stats()
+
+
+@router.get(
+    "/db-ops",
+    summary="MongoDB Commands per Route",
+    description="Report average MongoDB commands and DB time per request for each route, to spot N+1 query patterns"
+)
+async def db_ops() -> Dict[str, Any]:
+    """
+    Report Mongo commands attributed to each route
+
+    Returns:
+        dict: Slow-op count and per-route command averages and breakdown
+    """
+    return db_ops_stats()
+
+
+@router.get(
+    "/write-behind",
+    summary="Conversation Write-Behind Queue Stats",
+    description="Report queue depth, coalescing and flush latency of batched conversation writes for this worker"
+)
+async def write_behind_queue() -> Dict[str, Any]:
+    """
+    Report write-behind queue counters
+
+    Returns:
+        dict: Queue depth, coalesced turns, flushes, flush latency,
+            conflicts and errors
+    """
+    return write_behind_stats()
+
+
+@router.get(
+    "/llm-usage",
+    summary="LLM Token Usage per Turn",
+    description="Report p50/p95 tokens and latency per Claude call by route from the usage ledger, and today's heaviest users and conversations (development only)"
+)
+async def llm_usage(
+    hours: float = Query(24.0, gt=0, le=24 * 30, description="Look-back window in hours")
+) -> Dict[str, Any]:
+    """
+    Report token usage percentiles from the ledger shared by all workers
+
+    Only available in development since it names users and conversations.
+    Calls from the last LLM_USAGE_LEDGER_FLUSH_SECONDS may not be included yet.
+
+    Args:
+        hours: Look-back window
+
+    Returns:
+        dict: Per-route call counts and token/latency percentiles, top users
+            and conversations by today's tokens, budgets and ledger counters
+    """
+    _require_development()
+    return await tokens_per_turn(hours)
+
+
+@router.get(
+    "/llm-scheduler",
+    summary="LLM Scheduler Stats",
+    description="Report queue depth, admission wait times and remaining rate-limit budget for this worker"
+)
+async def llm_scheduler_stats() -> Dict[str, Any]:
+    """
+    Report LLM scheduler queue and budget state for this worker process
+
+    Returns:
+        dict: Scheduler stats, or `configured: false` without an API key
+    """
+    gateway = llm_gateway.llm_gateway
+    if gateway is None:
+        return {"configured": False}
+    return {"configured": True, **gateway.scheduler.stats()}
+
+
+@router.get(
+    "/rate-limits",
+    summary="Rate Limit Stats",
+    description="Report rate limit quotas and rejections for this worker"
+)
+async def rate_limits() -> Dict[str, Any]:
+    """
+    Report request rate limiting counters
+
+    Returns:
+        dict: Backend, quotas, allowed requests and rejections per route class and scope
+    """
+    return rate_limit_stats()
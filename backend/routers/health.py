@@ -6,8 +6,9 @@ from datetime import datetime, timezone
 from pydantic import BaseModel
 
 from database import ping_database
+from utils.tracing import TracedRoute
 
-router = APIRouter(tags=["Health"])
+router = APIRouter(tags=["Health"], route_class=TracedRoute)
 
 
 class HealthResponse(BaseModel):
@@ -0,0 +1,34 @@
+"""
+Prometheus metrics endpoint
+"""
+import asyncio
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import Response
+
+from config import settings
+from utils.metrics import CONTENT_TYPE, collect_all, render
+
+router = APIRouter(tags=["Metrics"])
+
+
+@router.get(
+    "/metrics",
+    summary="Prometheus Metrics",
+    description="Request, Claude, MongoDB and password hashing metrics in Prometheus text format"
+)
+async def metrics() -> Response:
+    """
+    Render all collectors, summed across workers when METRICS_MULTIPROC_DIR is set
+
+    Returns:
+        Response: Prometheus text exposition
+    """
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    if settings.METRICS_MULTIPROC_DIR:
+        # Reading other workers' snapshots is file I/O; keep it off the event loop
+        snapshot = await asyncio.to_thread(collect_all)
+    else:
+        snapshot = collect_all()
+    return Response(content=render(snapshot), media_type=CONTENT_TYPE)
@@ -0,0 +1,122 @@
+"""
+Concurrency stress test for versioned conversation writes
+Run this against a local mongod to check that concurrent workers never lose messages
+
+Usage: python test_conversation_concurrency.py [workers] [turns_per_worker]
+"""
+import asyncio
+import multiprocessing
+import sys
+import time
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from config import settings
+from models.conversation import Conversation, ExtractionStatus, Message
+from utils.conversation_store import (
+    ConversationConflictError, ConversationUpdate, conversation_write_stats,
+    load_conversation, save_conversation
+)
+
+DATABASE_NAME = "tadaa_concurrency_test"
+
+
+async def _run_worker(worker: int, conversation_id: str, turns: int) -> dict:
+    client = AsyncIOMotorClient(settings.MONGODB_URI)
+    db = client[DATABASE_NAME]
+    failed = 0
+
+    for turn in range(turns):
+        conversation = await load_conversation(db, conversation_id, tail=0)
+        update = ConversationUpdate()
+        update.add_message(conversation, Message(role="user", content=f"w{worker}-t{turn}-user"))
+        # Widen the race window the way a Claude call would
+        await asyncio.sleep(0.001)
+        update.add_message(conversation, Message(role="assistant", content=f"w{worker}-t{turn}-assistant"))
+        update.record_extraction(
+            conversation,
+            item_type="task",
+            status=ExtractionStatus.INCOMPLETE,
+            extracted_data={f"w{worker}": turn},
+            missing_fields=["dueDate"]
+        )
+        try:
+            await save_conversation(db, conversation, conversation_id, update)
+        except ConversationConflictError:
+            failed += 1
+
+    client.close()
+    return {"failed": failed, **conversation_write_stats()}
+
+
+def _worker(worker: int, conversation_id: str, turns: int, results) -> None:
+    results.put((worker, asyncio.run(_run_worker(worker, conversation_id, turns))))
+
+
+async def _create_conversation() -> str:
+    client = AsyncIOMotorClient(settings.MONGODB_URI)
+    db = client[DATABASE_NAME]
+    await db.conversations.drop()
+    await db.conversation_messages.drop()
+    conversation_id = await save_conversation(db, Conversation(user_id="stress-test"), None, ConversationUpdate())
+    client.close()
+    return conversation_id
+
+
+async def _read_conversation(conversation_id: str) -> Conversation:
+    client = AsyncIOMotorClient(settings.MONGODB_URI)
+    conversation = await load_conversation(client[DATABASE_NAME], conversation_id)
+    client.close()
+    return conversation
+
+
+def test_conversation_concurrency(workers: int = 8, turns: int = 25) -> None:
+    """Run concurrent writers against one conversation and check every message landed"""
+    print("=" * 60)
+    print(f"Testing concurrent conversation writes ({workers} workers x {turns} turns)")
+    print("=" * 60)
+
+    conversation_id = asyncio.run(_create_conversation())
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=_worker, args=(worker, conversation_id, turns, results))
+        for worker in range(workers)
+    ]
+
+    started = time.monotonic()
+    for process in processes:
+        process.start()
+    worker_stats = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    elapsed = time.monotonic() - started
+
+    failed = sum(stats["failed"] for _, stats in worker_stats)
+    conflicts = sum(stats["conflicts"] for _, stats in worker_stats)
+    merged = sum(stats["merged"] for _, stats in worker_stats)
+    print(f"\nFinished in {elapsed:.2f}s: {conflicts} conflicts, {merged} merged writes, {failed} gave up")
+
+    conversation = asyncio.run(_read_conversation(conversation_id))
+    contents = [message.content for message in conversation.messages]
+    expected = 2 * (workers * turns - failed)
+
+    assert len(contents) == expected, f"Expected {expected} messages, found {len(contents)}"
+    assert conversation.message_count == expected, \
+        f"Expected message_count {expected}, found {conversation.message_count}"
+    assert len(set(contents)) == len(contents), "Duplicate messages found"
+    for worker in range(workers):
+        # Turns are written in order, so a worker's messages must keep their order
+        own = [content for content in contents if content.startswith(f"w{worker}-")]
+        assert own == sorted(own, key=lambda content: (int(content.split("-")[1][1:]), content.endswith("assistant"))), \
+            f"Messages of worker {worker} are out of order"
+    assert conversation.version == workers * turns - failed, \
+        f"Expected version {workers * turns - failed}, found {conversation.version}"
+    open_items = [item for item in conversation.extracted_items if item.status != ExtractionStatus.SAVED]
+    assert len(open_items) == 1, f"Expected a single open task, found {len(open_items)}"
+
+    print("\n✅ SUCCESS! No lost or duplicated messages")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    test_conversation_concurrency(*args)
@@ -0,0 +1,61 @@
+"""
+Test script for the rule-based extraction slot filler
+Checks that AM/PM confirmations are only answered locally when the
+assistant proposed exactly one time
+
+Usage: python test_fast_path.py
+"""
+from typing import Optional
+
+from models.conversation import Conversation, ExtractedItem, ExtractionStatus, ItemType, Message
+from utils.fast_path import try_fast_path
+
+
+def _confirm_meridiem(assistant_text: str, answer: str) -> Optional[dict]:
+    conversation = Conversation(user_id="fast-path-test")
+    conversation.add_item(ExtractedItem(
+        id="item-1",
+        item_type=ItemType.SCHEDULE,
+        status=ExtractionStatus.INCOMPLETE,
+        extracted_data={"title": "Dentist", "date": "2026-10-20", "type": "medical"},
+        missing_fields=["time"]
+    ))
+    conversation.messages.append(Message(role="assistant", content=assistant_text))
+    conversation.messages.append(Message(role="user", content=answer))
+    return try_fast_path(conversation, answer)
+
+
+def test_single_proposed_time_is_confirmed() -> None:
+    """A lone proposed time plus AM/PM is filled without the model"""
+    response = _confirm_meridiem("Is that at 3 o'clock in the afternoon or morning?", "pm")
+    assert response is not None
+    assert response["extraction"]["extracted_data"]["time"] == "15:00"
+    assert response["extraction"]["status"] == ExtractionStatus.COMPLETE.value
+
+
+def test_alternative_bare_hours_go_to_the_model() -> None:
+    """'At 3 or 4?' proposes two hours, so 'pm' cannot pick one"""
+    assert _confirm_meridiem("At 3 or 4?", "pm") is None
+
+
+def test_alternative_meridiem_time_goes_to_the_model() -> None:
+    """A '3pm' alongside 'at 4:30' is a second candidate, not noise"""
+    assert _confirm_meridiem("Want to meet at 3pm? I can also do 4:30", "pm") is None
+
+
+def test_proposed_date_is_not_a_time_candidate() -> None:
+    """The day of a proposed date does not make the time ambiguous"""
+    response = _confirm_meridiem("So October 20 at 9:30, morning or evening?", "morning")
+    assert response is not None
+    assert response["extraction"]["extracted_data"]["time"] == "09:30"
+
+
+if __name__ == "__main__":
+    for test in (
+        test_single_proposed_time_is_confirmed,
+        test_alternative_bare_hours_go_to_the_model,
+        test_alternative_meridiem_time_goes_to_the_model,
+        test_proposed_date_is_not_a_time_candidate,
+    ):
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,207 @@
+"""
+Test script for the LLM scheduler's rate limiting and Retry-After handling
+Starts a local stand-in for the Messages API that answers every Nth request
+with a 429 and drives the gateway with interactive and background calls,
+then checks lane ordering, Retry-After backoff, deadline rejections and the
+scheduler's queue and wait metrics
+
+Usage: python test_llm_scheduler.py [interactive_calls] [background_calls]
+"""
+import asyncio
+import sys
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from config import settings
+from llm_scheduler import LLMCapacityError, LLMScheduler, Priority
+
+STAND_IN_PORT = 8100
+RATE_LIMIT_EVERY = 4
+RETRY_AFTER_SECONDS = 1
+
+stand_in = FastAPI()
+stand_in_requests = {"total": 0, "rate_limited": 0}
+# (prompt, arrival time, status) of every request the stand-in received
+stand_in_log: list = []
+
+
+@stand_in.post("/v1/messages")
+async def messages(request: Request):
+    """Answer like the Messages API, rate limiting every RATE_LIMIT_EVERY-th request (once per prompt)"""
+    body = await request.json()
+    prompt = body["messages"][-1]["content"]
+    stand_in_requests["total"] += 1
+    already_limited = any(other == prompt and status == 429 for other, _, status in stand_in_log)
+    if stand_in_requests["total"] % RATE_LIMIT_EVERY == 0 and not already_limited:
+        stand_in_requests["rate_limited"] += 1
+        stand_in_log.append((prompt, time.monotonic(), 429))
+        return JSONResponse(
+            status_code=429,
+            headers={"retry-after": str(RETRY_AFTER_SECONDS)},
+            content={"type": "error", "error": {"type": "rate_limit_error", "message": "Rate limited"}}
+        )
+    stand_in_log.append((prompt, time.monotonic(), 200))
+    await asyncio.sleep(0.05)
+    return {
+        "id": f"msg_{stand_in_requests['total']}",
+        "type": "message",
+        "role": "assistant",
+        "model": body["model"],
+        "content": [{"type": "text", "text": "ok"}],
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": {"input_tokens": 20, "output_tokens": 5}
+    }
+
+
+def _start_stand_in() -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(stand_in, port=STAND_IN_PORT, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def _call(gateway, priority: Priority, n: int, results: list) -> None:
+    started = time.monotonic()
+    try:
+        await gateway.create_message(
+            priority=priority,
+            model="claude-3-5-haiku-20241022",
+            max_tokens=64,
+            messages=[{"role": "user", "content": f"{priority.name.lower()} call {n}"}]
+        )
+        outcome = "ok"
+    except LLMCapacityError as e:
+        outcome = f"503 (retry after {e.retry_after}s)"
+    results.append((priority.name.lower(), n, outcome, time.monotonic() - started))
+
+
+async def _run(interactive: int, background: int) -> tuple:
+    from llm_gateway import LLMGateway
+
+    gateway = LLMGateway("stand-in-key")
+    results: list = []
+    try:
+        await asyncio.gather(
+            *[_call(gateway, Priority.BACKGROUND, n, results) for n in range(background)],
+            *[_call(gateway, Priority.INTERACTIVE, n, results) for n in range(interactive)]
+        )
+    finally:
+        await gateway.close()
+
+    for lane, n, outcome, elapsed in results:
+        print(f"  {lane:<11} #{n:<3} {outcome:<24} {elapsed:6.2f}s")
+    print(f"\nStand-in served {stand_in_requests['total']} requests, {stand_in_requests['rate_limited']} rate limited")
+    print(f"Scheduler: {gateway.scheduler.stats()}")
+    return results, gateway.scheduler.stats()
+
+
+def test_llm_scheduler(interactive: int = 20, background: int = 20) -> None:
+    """Drive the gateway against the stand-in server and check Retry-After is honoured"""
+    print("=" * 60)
+    print("Testing LLM scheduler against a rate-limiting stand-in server")
+    print("=" * 60)
+
+    saved = (settings.ANTHROPIC_BASE_URL, settings.LLM_REQUESTS_PER_MINUTE)
+    settings.ANTHROPIC_BASE_URL = f"http://127.0.0.1:{STAND_IN_PORT}"
+    # Room for every call and its retries, so only the stand-in's 429s slow them down
+    settings.LLM_REQUESTS_PER_MINUTE = 2 * (interactive + background)
+    stand_in_requests.update(total=0, rate_limited=0)
+    stand_in_log.clear()
+    server = _start_stand_in()
+    try:
+        results, stats = asyncio.run(_run(interactive, background))
+    finally:
+        server.should_exit = True
+        settings.ANTHROPIC_BASE_URL, settings.LLM_REQUESTS_PER_MINUTE = saved
+
+    assert [outcome for _, _, outcome, _ in results] == ["ok"] * (interactive + background)
+    assert stand_in_requests["rate_limited"] > 0
+    assert stats["rate_limited"] == stand_in_requests["rate_limited"]
+    assert stats["retries"] == stand_in_requests["rate_limited"]
+
+    # A rate-limited call is not sent again before its retry-after has passed
+    for prompt, rejected_at, status in stand_in_log:
+        if status != 429:
+            continue
+        retried_at = min(at for other, at, _ in stand_in_log if other == prompt and at > rejected_at)
+        assert retried_at - rejected_at >= RETRY_AFTER_SECONDS - 0.05, \
+            f"'{prompt}' retried after {retried_at - rejected_at:.2f}s"
+
+    assert stats["admitted"] == stand_in_requests["total"]
+    assert stats["lanes"]["interactive"]["admitted"] + stats["lanes"]["background"]["admitted"] == stats["admitted"]
+    assert stats["queue_depth"] == {"interactive": 0, "background": 0}
+    assert stats["peak_queue_depth"] >= 1
+    assert stats["rejected"] == 0
+
+
+async def _admission_order() -> tuple:
+    scheduler = LLMScheduler(requests_per_minute=600, input_tokens_per_minute=0, output_tokens_per_minute=0)
+    # Spend the burst so every call has to queue for the next request slot
+    scheduler.requests.level = 0
+    order: list = []
+
+    async def call(priority: Priority) -> None:
+        await scheduler.acquire(priority, input_tokens=1, output_tokens=1, timeout=5)
+        order.append(priority)
+
+    # Background work is queued first; interactive calls must still go ahead of it
+    tasks = [asyncio.create_task(call(Priority.BACKGROUND)) for _ in range(3)]
+    await asyncio.sleep(0)
+    tasks += [asyncio.create_task(call(Priority.INTERACTIVE)) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    queued = scheduler.stats()["queue_depth"]
+    await asyncio.gather(*tasks)
+    return order, queued, scheduler.stats()
+
+
+def test_interactive_admitted_before_background() -> None:
+    """Queued interactive calls are admitted ahead of earlier background calls"""
+    order, queued, stats = asyncio.run(_admission_order())
+
+    assert order == [Priority.INTERACTIVE] * 3 + [Priority.BACKGROUND] * 3
+    assert queued == {"interactive": 3, "background": 3}
+    assert stats["queue_depth"] == {"interactive": 0, "background": 0}
+    assert stats["peak_queue_depth"] == 6
+    assert stats["lanes"]["interactive"]["admitted"] == 3
+    assert stats["lanes"]["background"]["admitted"] == 3
+    assert stats["lanes"]["background"]["avg_wait_ms"] > stats["lanes"]["interactive"]["avg_wait_ms"] > 0
+    assert stats["max_wait_ms"] >= stats["avg_wait_ms"] > 0
+
+
+async def _admit_after_deadline() -> tuple:
+    scheduler = LLMScheduler(requests_per_minute=60, input_tokens_per_minute=0, output_tokens_per_minute=0)
+    scheduler.requests.level = 0
+    started = time.monotonic()
+    try:
+        await scheduler.acquire(Priority.INTERACTIVE, input_tokens=1, output_tokens=1, timeout=0.2)
+    except LLMCapacityError as e:
+        return e, time.monotonic() - started, scheduler.stats()
+    return None, time.monotonic() - started, scheduler.stats()
+
+
+def test_capacity_error_after_deadline() -> None:
+    """A call that cannot get a slot before its deadline fails fast with a 503"""
+    error, elapsed, stats = asyncio.run(_admit_after_deadline())
+
+    assert isinstance(error, LLMCapacityError)
+    assert error.status_code == 503
+    assert error.retry_after >= 1
+    assert error.headers["Retry-After"] == str(error.retry_after)
+    # The next slot is a second away, beyond the deadline, so it is rejected without waiting
+    assert elapsed < 0.2
+    assert stats["rejected"] == 1
+    assert stats["admitted"] == 0
+    assert stats["queue_depth"] == {"interactive": 0, "background": 0}
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    test_interactive_admitted_before_background()
+    test_capacity_error_after_deadline()
+    test_llm_scheduler(*args)
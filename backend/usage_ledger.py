@@ -0,0 +1,491 @@
+"""
+LLM token-usage ledger and daily budgets
+
+Every successful Claude call made through the LLM gateway is recorded with
+its route, user, conversation, model, token counts (including prompt-cache
+reads and writes) and latency:
+
+- Ledger entries are queued and written to `llm_usage` with one
+  `insert_many` every LLM_USAGE_LEDGER_FLUSH_SECONDS, so recording costs the
+  call nothing.
+- Daily per-user and per-conversation rollups in `llm_usage_daily` are
+  maintained incrementally: increments queued for the same rollup are summed
+  and applied with one `$inc` upsert per rollup and flush. Each flush's
+  increments carry a batch ID recorded on the rollups they were applied to,
+  so a batch whose outcome is unknown (timeout, reconnect) is retried
+  without counting twice.
+- With LLM_DAILY_TOKEN_BUDGET_PER_USER / _PER_CONVERSATION set, the gateway
+  calls `check_budget` before admitting a call and rejects it once the
+  day's (UTC) total reaches the budget. Totals are the persisted rollup,
+  cached per worker for LLM_BUDGET_CACHE_TTL_SECONDS, plus this worker's
+  unflushed increments, so other workers' usage is seen within that TTL.
+
+The first turn of a new conversation has no conversation ID when Claude is
+called, so it is attributed to its user and route only. Unauthenticated
+extraction calls have no user and count only towards their conversation.
+A crash loses at most one flush interval of entries.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from config import settings
+from database import get_database
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Token counts taken from `response.usage`
+TOKEN_FIELDS = ("input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens")
+
+# Duplicate key: an entry of a retried batch that was already inserted
+DUPLICATE_KEY_ERROR = 11000
+
+# Batch IDs kept per rollup so a retried batch can tell where it was already applied
+ROLLUP_BATCHES_KEPT = 32
+
+# Placeholder owner of unauthenticated extraction conversations; not a real user
+ANONYMOUS_USER_ID = "anonymous"
+
+
+class UsageAttribution:
+    """Who and what an LLM call is billed to"""
+    __slots__ = ("route", "user_id", "conversation_id")
+
+    def __init__(self, route: str, user_id: Optional[str] = None, conversation_id: Optional[str] = None):
+        """
+        Args:
+            route: Calling route or job, e.g. "extraction.chat"
+            user_id: User the call is made for, if any (the anonymous
+                placeholder counts as none, so unauthenticated callers do not
+                share one per-user budget)
+            conversation_id: Conversation the call belongs to, if any
+        """
+        self.route = route
+        self.user_id = None if user_id == ANONYMOUS_USER_ID else user_id
+        self.conversation_id = conversation_id
+
+    def rollup_keys(self, day: str) -> List[str]:
+        """Daily rollup document IDs this call counts towards"""
+        keys = []
+        if self.user_id:
+            keys.append(_rollup_id("user", self.user_id, day))
+        if self.conversation_id:
+            keys.append(_rollup_id("conversation", self.conversation_id, day))
+        return keys
+
+
+class LLMBudgetExceededError(HTTPException):
+    """Raised when a user or conversation has used its daily token budget"""
+
+    def __init__(self, scope: str, retry_after: float):
+        self.retry_after = max(1, int(retry_after))
+        super().__init__(
+            status_code=429,
+            detail=f"Daily AI usage limit reached for this {scope}. Please try again tomorrow.",
+            headers={"Retry-After": str(self.retry_after)}
+        )
+
+
+def _rollup_id(scope: str, key: str, day: str) -> str:
+    return f"{scope}:{key}:{day}"
+
+
+def _today() -> str:
+    return datetime.utcnow().strftime("%Y-%m-%d")
+
+
+def _seconds_until_tomorrow() -> float:
+    now = datetime.utcnow()
+    tomorrow = datetime(now.year, now.month, now.day) + timedelta(days=1)
+    return (tomorrow - now).total_seconds()
+
+
+_entries: List[Dict[str, Any]] = []
+# Rollup ID -> summed increments not yet written
+_rollups: Dict[str, Dict[str, Any]] = {}
+# Batch ID -> increments taken for a flush; still counted by budget checks until the write lands
+_flushing_rollups: Dict[str, Dict[str, Dict[str, Any]]] = {}
+# Batch ID -> rollup increments of a failed write, retried unchanged under the same ID
+_unconfirmed_rollups: Dict[str, Dict[str, Dict[str, Any]]] = {}
+_flush_lock: Optional[asyncio.Lock] = None
+_flush_task: Optional["asyncio.Task"] = None
+_wakeup: Optional[asyncio.Event] = None
+
+# Persisted rollup totals read for budget checks
+_persisted_totals = TTLCache("llm_budget_totals", maxsize=10000, ttl=settings.LLM_BUDGET_CACHE_TTL_SECONDS)
+
+_stats: Dict[str, Any] = {
+    "recorded": 0,
+    "flushes": 0,
+    "written": 0,
+    "rollup_updates": 0,
+    "errors": 0,
+    "dropped": 0,
+    "budget_checks": 0,
+    "budget_rejections": 0,
+    "total_flush_seconds": 0.0,
+}
+
+
+def _lock() -> asyncio.Lock:
+    global _flush_lock
+    if _flush_lock is None:
+        _flush_lock = asyncio.Lock()
+    return _flush_lock
+
+
+def record_call(attribution: Optional[UsageAttribution], model: str, call: str, usage: Any, latency: float) -> None:
+    """
+    Queue a ledger entry and rollup increments for a completed call
+
+    Args:
+        attribution: Route, user and conversation of the call (None records
+            it under route "unattributed")
+        model: Requested model
+        call: "create" or "stream"
+        usage: `usage` of the Claude response (None is ignored)
+        latency: Call duration in seconds
+    """
+    if usage is None or not settings.LLM_USAGE_LEDGER_ENABLED:
+        return
+    attribution = attribution or UsageAttribution("unattributed")
+    tokens = {field: getattr(usage, field, 0) or 0 for field in TOKEN_FIELDS}
+    tokens["total_tokens"] = sum(tokens.values())
+    now = datetime.utcnow()
+
+    if len(_entries) >= settings.LLM_USAGE_LEDGER_MAX_PENDING:
+        # Mongo has been unreachable for a while; keep the rollups, shed the detail
+        _entries.pop(0)
+        _stats["dropped"] += 1
+    _entries.append({
+        "ts": now,
+        "route": attribution.route,
+        "user_id": attribution.user_id,
+        "conversation_id": attribution.conversation_id,
+        "model": model,
+        "call": call,
+        **tokens,
+        "latency_ms": round(latency * 1000, 1),
+    })
+
+    day = now.strftime("%Y-%m-%d")
+    for rollup_id in attribution.rollup_keys(day):
+        increments = _rollups.get(rollup_id)
+        if increments is None:
+            increments = _rollups[rollup_id] = {"calls": 0, **{field: 0 for field in tokens}}
+        increments["calls"] += 1
+        for field, count in tokens.items():
+            increments[field] += count
+    _stats["recorded"] += 1
+
+    if len(_entries) >= settings.LLM_USAGE_LEDGER_MAX_BATCH and _wakeup is not None:
+        _wakeup.set()
+
+
+async def check_budget(attribution: Optional[UsageAttribution]) -> None:
+    """
+    Reject a call whose user or conversation has used its daily token budget
+
+    Args:
+        attribution: Route, user and conversation of the call
+
+    Raises:
+        LLMBudgetExceededError: If either daily budget is used up
+    """
+    if attribution is None or not settings.LLM_USAGE_LEDGER_ENABLED:
+        return
+    day = _today()
+    budgets = []
+    if attribution.user_id and settings.LLM_DAILY_TOKEN_BUDGET_PER_USER:
+        budgets.append(("user", _rollup_id("user", attribution.user_id, day), settings.LLM_DAILY_TOKEN_BUDGET_PER_USER))
+    if attribution.conversation_id and settings.LLM_DAILY_TOKEN_BUDGET_PER_CONVERSATION:
+        budgets.append((
+            "conversation",
+            _rollup_id("conversation", attribution.conversation_id, day),
+            settings.LLM_DAILY_TOKEN_BUDGET_PER_CONVERSATION
+        ))
+    if not budgets:
+        return
+
+    _stats["budget_checks"] += 1
+    totals = await _persisted([rollup_id for _, rollup_id, _ in budgets])
+    for scope, rollup_id, budget in budgets:
+        used = totals.get(rollup_id, 0) + sum(
+            queued.get(rollup_id, {}).get("total_tokens", 0)
+            for queued in (_rollups, *_flushing_rollups.values(), *_unconfirmed_rollups.values())
+        )
+        if used >= budget:
+            _stats["budget_rejections"] += 1
+            logger.info(f"LLM call on {attribution.route} rejected: {rollup_id} used {used} of {budget} tokens")
+            raise LLMBudgetExceededError(scope, _seconds_until_tomorrow())
+
+
+async def _persisted(rollup_ids: List[str]) -> Dict[str, int]:
+    totals = {}
+    missing = []
+    for rollup_id in rollup_ids:
+        cached = _persisted_totals.get(rollup_id)
+        if cached is None:
+            missing.append(rollup_id)
+        else:
+            totals[rollup_id] = cached
+    if missing:
+        db = get_database()
+        found = {
+            doc["_id"]: doc.get("total_tokens", 0)
+            async for doc in db.llm_usage_daily.find({"_id": {"$in": missing}}, {"total_tokens": 1})
+        }
+        for rollup_id in missing:
+            totals[rollup_id] = found.get(rollup_id, 0)
+            _persisted_totals.set(rollup_id, totals[rollup_id])
+    return totals
+
+
+async def flush_usage() -> None:
+    """Write queued ledger entries and rollup increments; a failed write stays queued"""
+    async with _lock():
+        if not _entries and not _rollups and not _unconfirmed_rollups:
+            return
+        db = get_database()
+        entries = _entries[:]
+        del _entries[:len(entries)]
+        batch_id = str(ObjectId())
+        if _rollups:
+            # Moved in the same step they leave _rollups, so budget checks never miss them
+            _flushing_rollups[batch_id] = dict(_rollups)
+        _rollups.clear()
+        started = time.monotonic()
+        try:
+            if entries:
+                await _insert_entries(db, entries)
+            for unconfirmed_id in list(_unconfirmed_rollups):
+                _flushing_rollups[unconfirmed_id] = _unconfirmed_rollups.pop(unconfirmed_id)
+                await _apply_rollups(db, unconfirmed_id)
+            if batch_id in _flushing_rollups:
+                await _apply_rollups(db, batch_id)
+        finally:
+            # A batch the flush never got to (it was cancelled) is retried under its ID
+            _unconfirmed_rollups.update(_flushing_rollups)
+            _flushing_rollups.clear()
+            elapsed = time.monotonic() - started
+            _stats["flushes"] += 1
+            _stats["total_flush_seconds"] += elapsed
+
+
+async def _insert_entries(db, entries: List[Dict[str, Any]]) -> None:
+    try:
+        # insert_many assigns each entry its _id, so a retried batch cannot double-insert
+        await db.llm_usage.insert_many(entries, ordered=False)
+        _stats["written"] += len(entries)
+    except BulkWriteError as e:
+        failed = [
+            error["index"] for error in e.details.get("writeErrors", [])
+            if error.get("code") != DUPLICATE_KEY_ERROR
+        ]
+        _stats["written"] += len(entries) - len(failed)
+        if failed:
+            _stats["errors"] += 1
+            logger.error(f"Failed to write {len(failed)} LLM usage ledger entries, will retry")
+            _entries[:0] = [entries[index] for index in failed]
+    except Exception as e:
+        _stats["errors"] += 1
+        logger.error(f"Failed to write {len(entries)} LLM usage ledger entries, will retry: {e}")
+        _entries[:0] = entries
+
+
+async def _apply_rollups(db, batch_id: str) -> None:
+    rollups = _flushing_rollups[batch_id]
+    rollup_ids = list(rollups)
+    now = datetime.utcnow()
+    operations = []
+    for rollup_id in rollup_ids:
+        scope, rest = rollup_id.split(":", 1)
+        key, day = rest.rsplit(":", 1)
+        operations.append(UpdateOne(
+            # Matches nothing once this batch was applied, so the upsert fails with a duplicate key
+            {"_id": rollup_id, "batches": {"$ne": batch_id}},
+            {
+                "$inc": rollups[rollup_id],
+                "$set": {"updated_at": now},
+                "$setOnInsert": {"scope": scope, "key": key, "day": day},
+                "$push": {"batches": {"$each": [batch_id], "$slice": -ROLLUP_BATCHES_KEPT}},
+            },
+            upsert=True
+        ))
+
+    failed = set(rollup_ids)
+    try:
+        await db.llm_usage_daily.bulk_write(operations, ordered=False)
+        failed = set()
+    except BulkWriteError as e:
+        failed = set()
+        for error in e.details.get("writeErrors", []):
+            rollup_id = rollup_ids[error["index"]]
+            if error.get("code") == DUPLICATE_KEY_ERROR and await _batch_applied(db, rollup_id, batch_id):
+                continue
+            failed.add(rollup_id)
+        if e.details.get("writeConcernErrors"):
+            failed = set(rollup_ids)
+    except Exception as e:
+        logger.error(f"Failed to update {len(rollup_ids)} LLM usage rollups, will retry: {e}")
+    finally:
+        _flushing_rollups.pop(batch_id, None)
+        for rollup_id in rollup_ids:
+            if rollup_id not in failed:
+                # The cached total no longer includes what was just written
+                _persisted_totals.invalidate(rollup_id)
+        _stats["rollup_updates"] += len(rollup_ids) - len(failed)
+        if failed:
+            _stats["errors"] += 1
+            # They may have been applied; only the same batch ID can be retried safely
+            _unconfirmed_rollups[batch_id] = {rollup_id: rollups[rollup_id] for rollup_id in failed}
+
+
+async def _batch_applied(db, rollup_id: str, batch_id: str) -> bool:
+    """Whether a rollup upsert that hit a duplicate key was applied by an earlier attempt"""
+    try:
+        return await db.llm_usage_daily.count_documents({"_id": rollup_id, "batches": batch_id}, limit=1) > 0
+    except Exception:
+        return False
+
+
+async def _flush_loop() -> None:
+    global _wakeup
+    _wakeup = asyncio.Event()
+    while True:
+        try:
+            await asyncio.wait_for(_wakeup.wait(), settings.LLM_USAGE_LEDGER_FLUSH_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+        try:
+            await flush_usage()
+        except Exception as e:
+            logger.error(f"LLM usage ledger flush failed: {e}")
+
+
+async def start_usage_ledger() -> None:
+    """
+    Start the ledger flush task
+    """
+    global _flush_task
+    if settings.LLM_USAGE_LEDGER_ENABLED and _flush_task is None:
+        _flush_task = asyncio.create_task(_flush_loop())
+
+
+async def stop_usage_ledger() -> None:
+    """
+    Stop the flush task and write what is still queued
+    """
+    global _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        try:
+            await _flush_task
+        except asyncio.CancelledError:
+            pass
+        _flush_task = None
+    if _entries or _rollups or _unconfirmed_rollups:
+        logger.info(f"Flushing {len(_entries)} queued LLM usage ledger entries...")
+        await flush_usage()
+        if _entries or _rollups or _unconfirmed_rollups:
+            logger.error(f"{len(_entries)} LLM usage ledger entries could not be written at shutdown")
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return 0.0
+    rank = max(1, int(-(-percentile * len(values) // 100)))
+    return values[rank - 1]
+
+
+async def tokens_per_turn(hours: float) -> Dict[str, Any]:
+    """
+    Token and latency percentiles per route from the ledger
+
+    Args:
+        hours: Look-back window
+
+    Returns:
+        dict: Per route, the number of calls and p50/p95 of input, output
+            and total tokens and latency, plus the day's heaviest users and
+            conversations
+    """
+    db = get_database()
+    since = datetime.utcnow() - timedelta(hours=hours)
+    samples: Dict[str, Dict[str, List[float]]] = {}
+    fields = ("input_tokens", "output_tokens", "total_tokens", "latency_ms")
+    cursor = db.llm_usage.find(
+        {"ts": {"$gte": since}},
+        {"_id": 0, "route": 1, **{field: 1 for field in fields}}
+    ).sort("ts", -1).limit(settings.LLM_USAGE_REPORT_MAX_ENTRIES)
+    async for entry in cursor:
+        route = samples.setdefault(entry["route"], {field: [] for field in fields})
+        for field in fields:
+            route[field].append(entry.get(field, 0))
+
+    routes = {}
+    for route, values in sorted(samples.items()):
+        summary: Dict[str, Any] = {"calls": len(values["total_tokens"])}
+        for field in fields:
+            ordered = sorted(values[field])
+            summary[field] = {"p50": _percentile(ordered, 50), "p95": _percentile(ordered, 95)}
+        routes[route] = summary
+
+    day = _today()
+    top = {}
+    for scope in ("user", "conversation"):
+        top[scope] = [
+            {"id": doc["key"], "calls": doc.get("calls", 0), "total_tokens": doc.get("total_tokens", 0)}
+            async for doc in db.llm_usage_daily.find(
+                {"scope": scope, "day": day}, {"key": 1, "calls": 1, "total_tokens": 1}
+            ).sort("total_tokens", -1).limit(10)
+        ]
+
+    return {
+        "window_hours": hours,
+        "routes": routes,
+        "day": day,
+        "top_users": top["user"],
+        "top_conversations": top["conversation"],
+        "budgets": {
+            "per_user": settings.LLM_DAILY_TOKEN_BUDGET_PER_USER,
+            "per_conversation": settings.LLM_DAILY_TOKEN_BUDGET_PER_CONVERSATION,
+        },
+        "ledger": usage_ledger_stats(),
+    }
+
+
+def usage_ledger_stats() -> Dict[str, Any]:
+    """
+    Snapshot of ledger queue and budget counters
+
+    Returns:
+        dict: Queued entries, writes, flush latency, errors and budget
+            rejections
+    """
+    flushes = _stats["flushes"]
+    return {
+        "enabled": settings.LLM_USAGE_LEDGER_ENABLED,
+        "queued_entries": len(_entries),
+        "queued_rollups": len(_rollups),
+        "unconfirmed_rollups": sum(len(rollups) for rollups in _unconfirmed_rollups.values()),
+        "recorded": _stats["recorded"],
+        "written": _stats["written"],
+        "rollup_updates": _stats["rollup_updates"],
+        "flushes": flushes,
+        "avg_flush_ms": round(_stats["total_flush_seconds"] / flushes * 1000, 2) if flushes else 0.0,
+        "errors": _stats["errors"],
+        "dropped": _stats["dropped"],
+        "budget_checks": _stats["budget_checks"],
+        "budget_rejections": _stats["budget_rejections"],
+    }
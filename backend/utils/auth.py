@@ -1,8 +1,11 @@
 """
 Authentication utilities for password hashing and JWT token management
 """
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
@@ -12,9 +15,26 @@ from bson import ObjectId
 from config import settings
 from database import get_users_collection
 from models.user import TokenData, UserResponse
+from utils.cache import TTLCache
+from utils.metrics import PASSWORD_HASH_SECONDS
+from utils.tracing import span
 
-# Password hashing context using bcrypt
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing context using bcrypt. Hashes with any other cost factor
+# than BCRYPT_ROUNDS are flagged for rehash on the next successful login.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
+
+# bcrypt is ~100-300ms of CPU per call, so it runs in a small dedicated pool.
+# The semaphore caps concurrent hashes at the pool size; callers beyond that
+# wait on it, which is the queue depth reported in password_hash_stats().
+_hash_executor: Optional[ThreadPoolExecutor] = None
+_hash_slots: Optional[asyncio.Semaphore] = None
+_hash_stats = {"in_flight": 0, "queued": 0, "peak_queued": 0, "total": 0, "total_seconds": 0.0}
 
 # HTTP Bearer token scheme
 security = HTTPBearer()
@@ -22,11 +42,20 @@ security = HTTPBearer()
 # JWT Configuration
 ALGORITHM = "HS256"
 
+# Authenticated users by ID, so most requests skip the users lookup
+principal_cache = TTLCache(
+    "principal",
+    maxsize=settings.PRINCIPAL_CACHE_MAX_ENTRIES,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS
+)
+
 
 def hash_password(password: str) -> str:
     """
     Hash a password using bcrypt
     
+    Blocks the calling thread; request handlers use hash_password_async.
+    
     Args:
         password: Plain text password
         
@@ -40,6 +69,8 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     Verify a password against its hash
     
+    Blocks the calling thread; request handlers use verify_and_update_password.
+    
     Args:
         plain_password: Plain text password to verify
         hashed_password: Hashed password to compare against
@@ -50,6 +81,100 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+async def _run_hasher(operation: str, func, *args: Any) -> Any:
+    """Run a passlib call in the password hashing pool"""
+    global _hash_executor, _hash_slots
+    
+    # Created lazily so the semaphore binds to the running event loop
+    if _hash_executor is None:
+        _hash_executor = ThreadPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            thread_name_prefix="password-hash"
+        )
+        _hash_slots = asyncio.Semaphore(settings.PASSWORD_HASH_WORKERS)
+    
+    _hash_stats["queued"] += 1
+    _hash_stats["peak_queued"] = max(_hash_stats["peak_queued"], _hash_stats["queued"])
+    try:
+        with span("auth.bcrypt_queue"):
+            await _hash_slots.acquire()
+    finally:
+        _hash_stats["queued"] -= 1
+    
+    _hash_stats["in_flight"] += 1
+    started = time.perf_counter()
+    try:
+        loop = asyncio.get_running_loop()
+        with span(f"auth.bcrypt_{operation}"):
+            return await loop.run_in_executor(_hash_executor, func, *args)
+    finally:
+        elapsed = time.perf_counter() - started
+        _hash_stats["in_flight"] -= 1
+        _hash_stats["total"] += 1
+        _hash_stats["total_seconds"] += elapsed
+        PASSWORD_HASH_SECONDS.observe(elapsed, operation)
+        _hash_slots.release()
+
+
+async def hash_password_async(password: str) -> str:
+    """
+    Hash a password without blocking the event loop
+    
+    Args:
+        password: Plain text password
+        
+    Returns:
+        str: Hashed password
+    """
+    return await _run_hasher("hash", pwd_context.hash, password)
+
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password without blocking the event loop
+    
+    Args:
+        plain_password: Plain text password to verify
+        hashed_password: Stored hash
+        
+    Returns:
+        tuple: Whether the password matches, and a replacement hash if the
+            stored one uses an outdated cost factor (otherwise None)
+    """
+    return await _run_hasher("verify", pwd_context.verify_and_update, plain_password, hashed_password)
+
+
+def password_hash_stats() -> Dict[str, Any]:
+    """
+    Snapshot of password hashing pool counters
+    
+    Returns:
+        dict: Pool size, in-flight and queued hashes, and average duration
+    """
+    total = _hash_stats["total"]
+    return {
+        "workers": settings.PASSWORD_HASH_WORKERS,
+        "bcrypt_rounds": settings.BCRYPT_ROUNDS,
+        "in_flight": _hash_stats["in_flight"],
+        "queue_depth": _hash_stats["queued"],
+        "peak_queue_depth": _hash_stats["peak_queued"],
+        "total_hashes": total,
+        "avg_hash_ms": round(_hash_stats["total_seconds"] / total * 1000, 2) if total else 0.0,
+    }
+
+
+def shutdown_password_hasher() -> None:
+    """
+    Stop the password hashing pool
+    """
+    global _hash_executor, _hash_slots
+    
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False)
+        _hash_executor = None
+        _hash_slots = None
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
     Create a JWT access token
@@ -124,26 +249,47 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    token = credentials.credentials
-    token_data = decode_access_token(token)
-    
-    if token_data is None or token_data.user_id is None:
-        raise credentials_exception
-    
-    # Get user from database
-    users_collection = get_users_collection()
-    try:
-        user = await users_collection.find_one({"_id": ObjectId(token_data.user_id)})
-    except Exception:
-        raise credentials_exception
-    
-    if user is None:
-        raise credentials_exception
+    with span("auth.authenticate") as auth_span:
+        token = credentials.credentials
+        token_data = decode_access_token(token)
+        
+        if token_data is None or token_data.user_id is None:
+            raise credentials_exception
+        
+        cached_user = principal_cache.get(token_data.user_id)
+        auth_span.set(principal_cache="hit" if cached_user is not None else "miss")
+        if cached_user is not None:
+            return cached_user.copy()
+        
+        # Get user from database
+        users_collection = get_users_collection()
+        try:
+            user = await users_collection.find_one({"_id": ObjectId(token_data.user_id)})
+        except Exception:
+            raise credentials_exception
+        
+        if user is None:
+            raise credentials_exception
+        
+        # Convert ObjectId to string for response
+        user["_id"] = str(user["_id"])
+        
+        current_user = UserResponse(**user)
+        principal_cache.set(token_data.user_id, current_user)
+        return current_user.copy()
+
+
+def invalidate_principal(user_id: str) -> None:
+    """
+    Drop a cached user after their document changes
     
-    # Convert ObjectId to string for response
-    user["_id"] = str(user["_id"])
+    Must be called wherever the users collection is updated so this
+    worker stops serving the old principal.
     
-    return UserResponse(**user)
+    Args:
+        user_id: ID of the updated user
+    """
+    principal_cache.invalidate(user_id)
 
 
 async def authenticate_user(email: str, password: str) -> Optional[dict]:
@@ -160,10 +306,19 @@ async def authenticate_user(email: str, password: str) -> Optional[dict]:
     users_collection = get_users_collection()
     user = await users_collection.find_one({"email": email})
     
-    if not user:
+    if not user or not user.get("hashed_password"):
         return None
     
-    if not verify_password(password, user["hashed_password"]):
+    verified, new_hash = await verify_and_update_password(password, user["hashed_password"])
+    if not verified:
         return None
     
+    # Transparently upgrade hashes made with a different cost factor
+    if new_hash:
+        await users_collection.update_one(
+            {"_id": user["_id"]},
+            {"$set": {"hashed_password": new_hash}}
+        )
+        user["hashed_password"] = new_hash
+    
     return user
\ No newline at end of file
@@ -0,0 +1,122 @@
+"""
+In-process TTL + LRU cache
+
+Each cache is bounded by entry count (least recently used entries are
+evicted first) and expires entries after a default or per-entry TTL. Caches
+register themselves by name so their hit rates can be reported from
+/diagnostics/caches. Entries are local to the worker process.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+# All caches created in this process, by name
+_caches: Dict[str, "TTLCache"] = {}
+
+
+class TTLCache:
+    """Bounded mapping whose entries expire after a time-to-live"""
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        """
+        Args:
+            name: Name reported in cache statistics
+            maxsize: Maximum number of entries before LRU eviction
+            ttl: Default time-to-live in seconds
+        """
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        _caches[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Look up a live entry and mark it most recently used
+
+        Args:
+            key: Cache key
+            default: Returned when the key is missing or expired
+
+        Returns:
+            Any: Cached value or default
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Store a value, evicting the least recently used entry if full
+
+        Args:
+            key: Cache key
+            value: Value to store
+            ttl: Time-to-live in seconds for this entry (defaults to the cache TTL)
+        """
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        """
+        Drop an entry if present
+
+        Args:
+            key: Cache key
+        """
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop all entries"""
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Snapshot of cache counters
+
+        Returns:
+            dict: Size, hit/miss/eviction counts and hit rate
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def get_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Get statistics for every cache in this process
+
+    Returns:
+        dict: Cache counters keyed by cache name
+    """
+    return {name: cache.stats() for name, cache in _caches.items()}
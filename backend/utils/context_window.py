@@ -0,0 +1,186 @@
+"""
+Bounded context window for the extraction chat
+
+Only the last EXTRACTION_HISTORY_TURNS turns are sent verbatim. Older turns
+are folded into a rolling summary stored on the conversation document, and
+the current extraction state is always included so unsaved items survive
+compaction. Summaries are refreshed in a background task after the response
+has been sent.
+"""
+import json
+import logging
+from typing import Any, Dict, List, Set, Tuple
+
+from bson import ObjectId
+
+from config import settings
+from database import get_database
+from llm_gateway import get_llm_gateway
+from llm_scheduler import Priority
+from models.conversation import Conversation, ExtractionStatus, Message, MessageStorage
+from usage_ledger import UsageAttribution
+from utils.conversation_store import read_messages
+from utils.prompt_registry import SUMMARY_PROMPT, record_usage
+from write_behind import flush_conversation
+
+logger = logging.getLogger(__name__)
+
+# Conversations with a summary refresh currently running in this worker
+_refreshing: Set[str] = set()
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (~4 characters per token plus message overhead)
+
+    Args:
+        text: Text to estimate
+
+    Returns:
+        int: Approximate token count
+    """
+    return len(text) // 4 + 4
+
+
+def _extraction_state(conversation: Conversation) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": item.id,
+            "item_type": item.item_type.value if item.item_type else None,
+            "status": item.status.value,
+            "extracted_data": item.extracted_data,
+            "missing_fields": item.missing_fields,
+        }
+        for item in conversation.extracted_items
+        if item.status != ExtractionStatus.SAVED
+    ]
+
+
+def _build_state_text(conversation: Conversation) -> str:
+    sections = []
+    if conversation.summary:
+        sections.append(f"## Earlier conversation summary:\n{conversation.summary}")
+
+    state = _extraction_state(conversation)
+    if state:
+        sections.append(
+            "## Current extraction state (unsaved items, keep building on these):\n"
+            + json.dumps(state, default=str)
+        )
+    return "\n\n".join(sections)
+
+
+def build_context(conversation: Conversation) -> Tuple[str, List[Dict[str, str]], bool]:
+    """
+    Select the messages and state text to send to Claude for this turn
+
+    Args:
+        conversation: Conversation including the latest user message
+
+    Returns:
+        tuple: Dynamic system text, Claude messages, and whether older
+            unsummarized messages fell outside the window
+    """
+    state_text = _build_state_text(conversation)
+    budget = settings.EXTRACTION_CONTEXT_TOKEN_BUDGET - estimate_tokens(state_text)
+
+    # The last N complete turns plus the new user message. With bucketed
+    # storage only the tail is loaded, so index relative to messages_offset.
+    first_unsummarized = max(conversation.summarized_count - conversation.messages_offset, 0)
+    unsummarized = conversation.messages[first_unsummarized:]
+    window = unsummarized[-(settings.EXTRACTION_HISTORY_TURNS * 2 + 1):]
+
+    # Walk back from the newest message until the token budget is spent,
+    # always keeping the latest user message
+    selected: List[Message] = []
+    for msg in reversed(window):
+        cost = estimate_tokens(msg.content)
+        if selected and cost > budget:
+            break
+        budget -= cost
+        selected.append(msg)
+    selected.reverse()
+
+    # Claude requires the first message to come from the user
+    while len(selected) > 1 and selected[0].role != "user":
+        selected.pop(0)
+
+    needs_summary = conversation.message_count - len(selected) > conversation.summarized_count
+    claude_messages = [{"role": msg.role, "content": msg.content} for msg in selected]
+    return state_text, claude_messages, needs_summary
+
+
+def _format_transcript(messages: List[Dict[str, Any]]) -> str:
+    lines = []
+    for msg in messages:
+        speaker = "User" if msg["role"] == "user" else "Assistant"
+        lines.append(f"{speaker}: {msg['content']}")
+    return "\n".join(lines)
+
+
+async def refresh_summary(conversation_id: str) -> None:
+    """
+    Fold messages older than the verbatim window into the rolling summary
+
+    Runs as a background task after the chat response has been sent. The
+    update is conditional on `summarized_count` so a concurrent refresh
+    cannot overwrite a newer summary.
+
+    Args:
+        conversation_id: Conversation to compact
+    """
+    if conversation_id in _refreshing:
+        return
+    _refreshing.add(conversation_id)
+
+    try:
+        db = get_database()
+        await flush_conversation(conversation_id)
+        conversation_doc = await db.conversations.find_one(
+            {"_id": ObjectId(conversation_id)},
+            {"user_id": 1, "messages": 1, "message_count": 1, "storage": 1, "summary": 1, "summarized_count": 1}
+        )
+        if not conversation_doc:
+            return
+
+        if conversation_doc.get("storage") == MessageStorage.BUCKETED.value:
+            message_count = conversation_doc.get("message_count", 0)
+        else:
+            message_count = len(conversation_doc.get("messages", []))
+        summarized_count = conversation_doc.get("summarized_count", 0)
+        fold_until = message_count - settings.EXTRACTION_HISTORY_TURNS * 2
+        if fold_until <= summarized_count:
+            return
+
+        to_fold = await read_messages(db, conversation_doc, summarized_count, fold_until)
+        previous_summary = conversation_doc.get("summary") or "(none)"
+
+        gateway = get_llm_gateway()
+        response = await gateway.create_message(
+            priority=Priority.BACKGROUND,
+            attribution=UsageAttribution("extraction.summary", conversation_doc.get("user_id"), conversation_id),
+            model=settings.EXTRACTION_SUMMARY_MODEL,
+            max_tokens=settings.EXTRACTION_SUMMARY_MAX_TOKENS,
+            system=SUMMARY_PROMPT.blocks,
+            messages=[{
+                "role": "user",
+                "content": (
+                    f"Existing summary:\n{previous_summary}\n\n"
+                    f"Older messages to fold in:\n{_format_transcript(to_fold)}"
+                )
+            }]
+        )
+        record_usage(SUMMARY_PROMPT, response.usage)
+
+        # Documents written before summaries existed have no summarized_count
+        expected_count = summarized_count if summarized_count else {"$in": [0, None]}
+        await db.conversations.update_one(
+            {"_id": ObjectId(conversation_id), "summarized_count": expected_count},
+            {"$set": {"summary": response.content[0].text, "summarized_count": fold_until}}
+        )
+        logger.info(f"Summarized {len(to_fold)} messages for conversation {conversation_id}")
+
+    except Exception as e:
+        logger.error(f"Failed to refresh summary for conversation {conversation_id}: {e}")
+    finally:
+        _refreshing.discard(conversation_id)
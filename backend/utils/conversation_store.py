@@ -0,0 +1,816 @@
+"""
+Append-only persistence for extraction conversations
+
+A chat turn only ever appends messages and creates or updates a single
+extracted item, so instead of rewriting the whole conversation document
+each turn is recorded as a ConversationUpdate and written with `$push`
+for new messages/items and array-filtered `$set` for the changed item.
+
+Every write to an existing conversation is conditional on the `version`
+it was computed from and increments it, so concurrent writers in other
+workers cannot silently overwrite each other. A write that loses the race
+reloads the conversation, replays its turn on top and retries a bounded
+number of times before raising ConversationConflictError.
+
+Messages are either embedded in the conversation document or, in bucketed
+storage mode, kept in `conversation_messages` documents of
+MESSAGE_BUCKET_SIZE messages keyed by (conversation_id, bucket) so the
+conversation document stays small and the tail is one indexed query.
+Bucketed messages carry the `index` their conversation write reserved,
+and reads order and de-duplicate by it, so bucket pushes from concurrent
+workers may land in any order and can be retried.
+"""
+import asyncio
+import base64
+import logging
+import random
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from config import settings
+from models.conversation import Conversation, ExtractedItem, ExtractionStatus, Message, MessageStorage
+from utils.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Fields of an extracted item that a chat turn can change
+ITEM_MUTABLE_FIELDS = ("status", "extracted_data", "missing_fields", "updated_at")
+
+# Listing fields maintained on every write so GET /conversations never reads messages
+SUMMARY_FIELDS = (
+    "user_id", "message_count", "last_message_preview",
+    "pending_item_count", "complete_item_count", "created_at", "updated_at"
+)
+PREVIEW_LENGTH = 120
+
+# Write IDs kept on the conversation so a retried write can tell it was already applied
+APPLIED_WRITES_KEPT = 16
+
+_write_stats = {"writes": 0, "conflicts": 0, "merged": 0, "exhausted": 0}
+
+
+class ConversationConflictError(Exception):
+    """Raised when a conversation write keeps losing to concurrent writers"""
+
+
+def version_filter(conversation_id: str, version: int) -> Dict[str, Any]:
+    """
+    Filter matching a conversation only while it is still at `version`
+
+    Args:
+        conversation_id: Conversation ID
+        version: Expected version (documents predating versioning count as 0)
+
+    Returns:
+        dict: Query filter
+    """
+    return {
+        "_id": ObjectId(conversation_id),
+        "version": {"$in": [0, None]} if version == 0 else version
+    }
+
+
+async def _conflict_backoff(attempt: int) -> None:
+    _write_stats["conflicts"] += 1
+    await asyncio.sleep(random.uniform(0, 0.01 * 2 ** attempt))
+
+
+def message_preview(content: str) -> str:
+    """
+    Truncate message content for conversation listings
+
+    Args:
+        content: Full message content
+
+    Returns:
+        str: At most PREVIEW_LENGTH characters
+    """
+    if len(content) <= PREVIEW_LENGTH:
+        return content
+    return content[:PREVIEW_LENGTH - 1].rstrip() + "…"
+
+
+def item_counts(items: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Count unsaved and ready-to-save extracted items
+
+    Args:
+        items: Extracted item documents or models dumped to dicts
+
+    Returns:
+        dict: pending_item_count and complete_item_count
+    """
+    pending = [item for item in items if item.get("status") != ExtractionStatus.SAVED.value]
+    return {
+        "pending_item_count": len(pending),
+        "complete_item_count": sum(1 for item in pending if item.get("status") == ExtractionStatus.COMPLETE.value)
+    }
+
+
+def new_item_id() -> str:
+    """
+    Generate a collision-safe extracted item ID
+
+    Returns:
+        str: Hex ObjectId string
+    """
+    return str(ObjectId())
+
+
+class ConversationUpdate:
+    """Changes made to a conversation during one chat turn"""
+
+    def __init__(self):
+        self.new_messages: List[Message] = []
+        self.new_items: List[ExtractedItem] = []
+        self.changed_items: Dict[str, ExtractedItem] = {}
+        self.set_fields: Dict[str, Any] = {}
+        # record_extraction arguments, kept so the turn can be replayed after a conflict
+        self.extractions: List[Dict[str, Any]] = []
+        # Recorded in the conversation's applied_writes by the write that persists this update
+        self.write_id = new_item_id()
+
+    def add_message(self, conversation: Conversation, message: Message) -> None:
+        """Append a message to the conversation and record it for persistence"""
+        conversation.messages.append(message)
+        conversation.message_count += 1
+        conversation.last_message_preview = message_preview(message.content)
+        self.new_messages.append(message)
+        self.set_fields["message_count"] = conversation.message_count
+        self.set_fields["last_message_preview"] = conversation.last_message_preview
+
+    def record_extraction(
+        self,
+        conversation: Conversation,
+        item_type: Optional[str],
+        status: ExtractionStatus,
+        extracted_data: Dict[str, Any],
+        missing_fields: List[str]
+    ) -> ExtractedItem:
+        """
+        Create or update the open item for an item type
+
+        Args:
+            conversation: Conversation to update in place
+            item_type: Extracted item type
+            status: Extraction status reported by Claude
+            extracted_data: Fields extracted so far
+            missing_fields: Required fields still missing
+
+        Returns:
+            ExtractedItem: The created or updated item
+        """
+        self.extractions.append({
+            "item_type": item_type,
+            "status": status,
+            "extracted_data": extracted_data,
+            "missing_fields": missing_fields
+        })
+        now = datetime.utcnow()
+        item = conversation.open_item(item_type)
+
+        if item is not None:
+            item.status = status
+            item.extracted_data = extracted_data
+            item.missing_fields = missing_fields
+            item.updated_at = now
+            if item.id not in {new_item.id for new_item in self.new_items}:
+                self.changed_items[item.id] = item
+            self._refresh_item_counts(conversation)
+            return item
+
+        item = ExtractedItem(
+            id=new_item_id(),
+            item_type=item_type,
+            status=status,
+            extracted_data=extracted_data,
+            missing_fields=missing_fields,
+            created_at=now,
+            updated_at=now
+        )
+        conversation.add_item(item)
+        self.new_items.append(item)
+        if item.item_type is not None:
+            conversation.active_items[item.item_type.value] = item.id
+            self.set_fields[f"active_items.{item.item_type.value}"] = item.id
+        self._refresh_item_counts(conversation)
+        return item
+
+    def _refresh_item_counts(self, conversation: Conversation) -> None:
+        counts = item_counts([
+            {"status": item.status.value} for item in conversation.extracted_items
+        ])
+        conversation.pending_item_count = counts["pending_item_count"]
+        conversation.complete_item_count = counts["complete_item_count"]
+        self.set_fields.update(counts)
+
+    def rebase(self, conversation: Conversation) -> "ConversationUpdate":
+        """
+        Replay this turn on a freshly loaded conversation
+
+        Messages are appended after whatever concurrent turns added, and
+        extractions update the item that is now open for their type.
+
+        Args:
+            conversation: Latest state of the conversation, updated in place
+
+        Returns:
+            ConversationUpdate: The turn's changes relative to that state
+        """
+        replayed = ConversationUpdate()
+        replayed.write_id = self.write_id
+        for message in self.new_messages:
+            replayed.add_message(conversation, message)
+        for extraction in self.extractions:
+            replayed.record_extraction(conversation, **extraction)
+        return replayed
+
+    def merge(self, later: "ConversationUpdate") -> None:
+        """
+        Fold a later turn's changes into this not yet persisted update
+
+        Args:
+            later: Update built on the conversation state this update produces
+        """
+        new_item_positions = {item.id: n for n, item in enumerate(self.new_items)}
+        self.new_messages.extend(later.new_messages)
+        for item_id, item in later.changed_items.items():
+            # Items this update creates are pushed whole, so replace them instead
+            if item_id in new_item_positions:
+                self.new_items[new_item_positions[item_id]] = item
+            else:
+                self.changed_items[item_id] = item
+        self.new_items.extend(later.new_items)
+        self.set_fields.update(later.set_fields)
+        self.extractions.extend(later.extractions)
+
+    def to_mongo(self, updated_at: datetime, embed_messages: bool = True) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        Build the conversation update document and array filters for this turn
+
+        Args:
+            updated_at: New conversation updated_at timestamp
+            embed_messages: Push new messages into the conversation document
+
+        Returns:
+            tuple: Update document and array filters
+        """
+        set_fields: Dict[str, Any] = {"updated_at": updated_at, **self.set_fields}
+        array_filters: List[Dict[str, Any]] = []
+
+        for n, (item_id, item) in enumerate(self.changed_items.items()):
+            for field in ITEM_MUTABLE_FIELDS:
+                set_fields[f"extracted_items.$[i{n}].{field}"] = getattr(item, field)
+            array_filters.append({f"i{n}.id": item_id})
+
+        update: Dict[str, Any] = {"$set": set_fields, "$inc": {"version": 1}}
+        push: Dict[str, Any] = {
+            "applied_writes": {"$each": [self.write_id], "$slice": -APPLIED_WRITES_KEPT}
+        }
+        if self.new_messages and embed_messages:
+            push["messages"] = {"$each": [message.dict() for message in self.new_messages]}
+        if self.new_items:
+            push["extracted_items"] = {"$each": [item.dict() for item in self.new_items]}
+        update["$push"] = push
+
+        return update, array_filters
+
+
+def _use_buckets(conversation: Conversation) -> bool:
+    return conversation.storage == MessageStorage.BUCKETED
+
+
+def _bucket_documents(start_index: int, messages: List[Dict[str, Any]]) -> Dict[int, List[Dict[str, Any]]]:
+    """Group messages starting at `start_index` by bucket number, tagged with their index"""
+    buckets: Dict[int, List[Dict[str, Any]]] = {}
+    for offset, message in enumerate(messages):
+        index = start_index + offset
+        buckets.setdefault(index // settings.MESSAGE_BUCKET_SIZE, []).append({**message, "index": index})
+    return buckets
+
+
+def bucket_operations(conversation_id: ObjectId, start_index: int, messages: List[Dict[str, Any]]) -> List[UpdateOne]:
+    """
+    Bulk write operations appending messages to their bucket documents
+
+    Args:
+        conversation_id: Conversation ID
+        start_index: Index of the first message within the conversation
+        messages: Message documents
+
+    Returns:
+        list: One upsert per touched bucket
+    """
+    return [
+        UpdateOne(
+            {"conversation_id": conversation_id, "bucket": bucket},
+            {
+                "$push": {"messages": {"$each": bucket_messages, "$sort": {"index": 1}}},
+                "$inc": {"count": len(bucket_messages)}
+            },
+            upsert=True
+        )
+        for bucket, bucket_messages in _bucket_documents(start_index, messages).items()
+    ]
+
+
+def new_messages_operations(conversation: Conversation, conversation_id: ObjectId, update: ConversationUpdate) -> List[UpdateOne]:
+    """
+    Bucket writes for the messages a persisted update appended (none in embedded storage)
+
+    Args:
+        conversation: Conversation after the update
+        conversation_id: Conversation ID
+        update: The update that was written
+
+    Returns:
+        list: Bucket operations
+    """
+    if not _use_buckets(conversation) or not update.new_messages:
+        return []
+    start_index = conversation.message_count - len(update.new_messages)
+    return bucket_operations(conversation_id, start_index, [message.dict() for message in update.new_messages])
+
+
+async def _append_to_buckets(db, conversation_id: ObjectId, start_index: int, messages: List[Dict[str, Any]]) -> None:
+    operations = bucket_operations(conversation_id, start_index, messages)
+    if operations:
+        await db.conversation_messages.bulk_write(operations)
+
+
+async def read_messages(db, conversation_doc: Dict[str, Any], start: int, end: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Read messages [start, end) of a conversation in either storage mode
+
+    Args:
+        db: Database instance
+        conversation_doc: Conversation document (needs _id, storage, message_count)
+        start: Index of the first message
+        end: Index after the last message, or None for the end
+
+    Returns:
+        list: Message documents
+    """
+    if conversation_doc.get("storage") != MessageStorage.BUCKETED.value:
+        messages = conversation_doc.get("messages")
+        if messages is None:
+            projected = await db.conversations.find_one(
+                {"_id": conversation_doc["_id"]},
+                {"messages": 1}
+            )
+            messages = projected.get("messages", []) if projected else []
+        return messages[start:end]
+
+    first_bucket = start // settings.MESSAGE_BUCKET_SIZE
+    bucket_filter: Dict[str, Any] = {"$gte": first_bucket}
+    if end is not None:
+        bucket_filter["$lte"] = max(end - 1, 0) // settings.MESSAGE_BUCKET_SIZE
+
+    cursor = db.conversation_messages.find(
+        {"conversation_id": conversation_doc["_id"], "bucket": bucket_filter}
+    ).sort("bucket", 1)
+
+    messages: Dict[int, Dict[str, Any]] = {}
+    async for bucket_doc in cursor:
+        bucket_start = bucket_doc["bucket"] * settings.MESSAGE_BUCKET_SIZE
+        for position, message in enumerate(bucket_doc.get("messages", [])):
+            # Buckets written before messages carried an index are in position order
+            index = message.get("index", bucket_start + position)
+            if index >= start and (end is None or index < end):
+                # A retried bucket push repeats the same message at the same index
+                messages.setdefault(index, message)
+    return [messages[index] for index in sorted(messages)]
+
+
+async def migrate_to_buckets(db, conversation_doc: Dict[str, Any]) -> bool:
+    """
+    Move a conversation's embedded messages into bucket documents
+
+    Bucket writes are idempotent replaces, and the conversation is only
+    switched to bucketed storage if its embedded messages are unchanged,
+    so an interrupted or concurrent migration can simply be re-run.
+
+    Args:
+        db: Database instance
+        conversation_doc: Full conversation document with embedded messages
+
+    Returns:
+        bool: True if the conversation was migrated
+    """
+    if conversation_doc.get("storage") == MessageStorage.BUCKETED.value:
+        return False
+
+    conversation_id = conversation_doc["_id"]
+    messages = conversation_doc.get("messages", [])
+
+    for bucket, bucket_messages in _bucket_documents(0, messages).items():
+        await db.conversation_messages.replace_one(
+            {"conversation_id": conversation_id, "bucket": bucket},
+            {
+                "conversation_id": conversation_id,
+                "bucket": bucket,
+                "messages": bucket_messages,
+                "count": len(bucket_messages)
+            },
+            upsert=True
+        )
+
+    result = await db.conversations.update_one(
+        {
+            "_id": conversation_id,
+            "storage": {"$ne": MessageStorage.BUCKETED.value},
+            "messages": {"$size": len(messages)}
+        },
+        {
+            "$set": {"storage": MessageStorage.BUCKETED.value, "message_count": len(messages)},
+            "$unset": {"messages": ""},
+            # Writers that read the embedded layout must reload
+            "$inc": {"version": 1}
+        }
+    )
+    if result.modified_count:
+        logger.info(f"Migrated {len(messages)} messages of conversation {conversation_id} to buckets")
+    return bool(result.modified_count)
+
+
+async def load_conversation(db, conversation_id: str, tail: Optional[int] = None) -> Optional[Conversation]:
+    """
+    Load a conversation by ID
+
+    Args:
+        db: Database instance
+        conversation_id: Conversation ID
+        tail: Load only the last `tail` messages (bucketed storage), or None for all
+
+    Returns:
+        Conversation: The conversation, or None if it does not exist
+    """
+    conversation_doc = await db.conversations.find_one({"_id": ObjectId(conversation_id)})
+    if not conversation_doc:
+        return None
+
+    if settings.CONVERSATION_STORAGE_MODE == MessageStorage.BUCKETED.value:
+        if await migrate_to_buckets(db, conversation_doc):
+            conversation_doc = await db.conversations.find_one({"_id": ObjectId(conversation_id)})
+
+    if conversation_doc.get("storage") == MessageStorage.BUCKETED.value:
+        message_count = conversation_doc.get("message_count", 0)
+        start = 0 if tail is None else max(message_count - tail, 0)
+        conversation_doc["messages"] = await read_messages(db, conversation_doc, start)
+
+    with span("pydantic.Conversation", messages=len(conversation_doc.get("messages", []))):
+        return Conversation(**conversation_doc)
+
+
+def new_conversation_document(conversation: Conversation) -> Dict[str, Any]:
+    """
+    Build the document inserted for a new conversation
+
+    Applies the configured storage mode; in bucketed mode messages are
+    written to bucket documents separately.
+
+    Args:
+        conversation: New conversation
+
+    Returns:
+        dict: Conversation document
+    """
+    if settings.CONVERSATION_STORAGE_MODE == MessageStorage.BUCKETED.value:
+        conversation.storage = MessageStorage.BUCKETED
+    return conversation.dict(exclude={"messages"} if _use_buckets(conversation) else None)
+
+
+async def save_conversation(
+    db,
+    conversation: Conversation,
+    conversation_id: Optional[str],
+    update: ConversationUpdate
+) -> str:
+    """
+    Persist a chat turn
+
+    New conversations are inserted whole; existing ones receive only the
+    turn's appended messages, the affected item and a new updated_at, as a
+    write conditional on the version the turn was built from. On conflict
+    the turn is replayed on the latest version and retried.
+
+    Args:
+        db: Database instance
+        conversation: Conversation after the turn was applied
+        conversation_id: Existing conversation ID, or None to insert
+        update: Changes made during the turn
+
+    Returns:
+        str: Conversation ID
+
+    Raises:
+        ConversationConflictError: If the write still conflicts after
+            CONVERSATION_WRITE_MAX_RETRIES replays
+    """
+    conversation.updated_at = datetime.utcnow()
+    _write_stats["writes"] += 1
+
+    if not conversation_id:
+        result = await db.conversations.insert_one(new_conversation_document(conversation))
+        if _use_buckets(conversation):
+            await _append_to_buckets(db, result.inserted_id, 0, [m.dict() for m in conversation.messages])
+        return str(result.inserted_id)
+
+    for attempt in range(settings.CONVERSATION_WRITE_MAX_RETRIES + 1):
+        if attempt:
+            await _conflict_backoff(attempt)
+            latest = await load_conversation(db, conversation_id, tail=0)
+            if latest is None:
+                raise ConversationConflictError("Conversation was deleted")
+            conversation = latest
+            update = update.rebase(conversation)
+            conversation.updated_at = datetime.utcnow()
+
+        update_doc, array_filters = update.to_mongo(
+            conversation.updated_at,
+            embed_messages=not _use_buckets(conversation)
+        )
+        result = await db.conversations.update_one(
+            version_filter(conversation_id, conversation.version),
+            update_doc,
+            array_filters=array_filters or None
+        )
+        if result.matched_count:
+            conversation.version += 1
+            if attempt:
+                _write_stats["merged"] += 1
+            # The conditional write reserved these message positions
+            operations = new_messages_operations(conversation, ObjectId(conversation_id), update)
+            if operations:
+                try:
+                    await db.conversation_messages.bulk_write(operations)
+                except Exception as e:
+                    # message_count already covers these messages; fail the save rather than leave a silent gap
+                    logger.error(f"Message bucket write for conversation {conversation_id} failed: {e}")
+                    raise
+            return conversation_id
+
+    _write_stats["exhausted"] += 1
+    raise ConversationConflictError("Conversation is being modified concurrently")
+
+
+async def find_extracted_item(
+    db,
+    conversation_id: str,
+    item_id: str
+) -> Tuple[Optional[Dict[str, Any]], Dict[str, str], int]:
+    """
+    Fetch a single extracted item by ID without loading the conversation
+
+    Args:
+        db: Database instance
+        conversation_id: Conversation ID
+        item_id: Extracted item ID
+
+    Returns:
+        tuple: The item document (or None), the conversation's active_items
+            and its version
+    """
+    conversation_doc = await db.conversations.find_one(
+        {"_id": ObjectId(conversation_id), "extracted_items.id": item_id},
+        {"extracted_items.$": 1, "active_items": 1, "version": 1}
+    )
+    if not conversation_doc:
+        return None, {}, 0
+    return (
+        conversation_doc["extracted_items"][0],
+        conversation_doc.get("active_items", {}),
+        conversation_doc.get("version") or 0
+    )
+
+
+async def find_extracted_items(
+    db,
+    conversation_id: str,
+    session=None
+) -> Tuple[Optional[List[Dict[str, Any]]], Dict[str, str], int]:
+    """
+    Fetch a conversation's extracted items without its messages
+
+    Args:
+        db: Database instance
+        conversation_id: Conversation ID
+        session: Optional client session (for transactions)
+
+    Returns:
+        tuple: Item documents (None if the conversation does not exist),
+            the conversation's active_items and its version
+    """
+    conversation_doc = await db.conversations.find_one(
+        {"_id": ObjectId(conversation_id)},
+        {"extracted_items": 1, "active_items": 1, "version": 1},
+        session=session
+    )
+    if not conversation_doc:
+        return None, {}, 0
+    return (
+        conversation_doc.get("extracted_items", []),
+        conversation_doc.get("active_items", {}),
+        conversation_doc.get("version") or 0
+    )
+
+
+async def mark_item_saved(
+    db,
+    conversation_id: str,
+    item: Dict[str, Any],
+    active_items: Dict[str, str],
+    version: int
+) -> bool:
+    """
+    Flag an extracted item as saved and release its item-type slot
+
+    Args:
+        db: Database instance
+        conversation_id: Conversation ID
+        item: Extracted item document
+        active_items: The conversation's active_items mapping
+        version: Conversation version the item was read at
+
+    Returns:
+        bool: False if the item was saved (or removed) concurrently
+
+    Raises:
+        ConversationConflictError: If the write still conflicts after
+            CONVERSATION_WRITE_MAX_RETRIES retries
+    """
+    return bool(await mark_items_saved(db, conversation_id, [item], active_items, version))
+
+
+async def mark_items_saved(
+    db,
+    conversation_id: str,
+    items: List[Dict[str, Any]],
+    active_items: Dict[str, str],
+    version: int,
+    session=None
+) -> List[str]:
+    """
+    Flag extracted items as saved and release their item-type slots in one update
+
+    The write is conditional on `version`; on conflict the items are re-read
+    and the write retried for those no other request has saved meanwhile.
+
+    Args:
+        db: Database instance
+        conversation_id: Conversation ID
+        items: Extracted item documents
+        active_items: The conversation's active_items mapping
+        version: Conversation version the items were read at
+        session: Optional client session (for transactions)
+
+    Returns:
+        list: IDs of the items this call marked saved; the others were
+            saved (or removed) concurrently
+
+    Raises:
+        ConversationConflictError: If the write still conflicts after
+            CONVERSATION_WRITE_MAX_RETRIES retries
+    """
+    _write_stats["writes"] += 1
+    for attempt in range(settings.CONVERSATION_WRITE_MAX_RETRIES + 1):
+        if attempt:
+            await _conflict_backoff(attempt)
+            current, active_items, version = await find_extracted_items(db, conversation_id, session=session)
+            by_id = {item["id"]: item for item in current or []}
+            items = [by_id[item["id"]] for item in items if item["id"] in by_id]
+        items = [item for item in items if item.get("status") != ExtractionStatus.SAVED.value]
+        if not items:
+            return []
+
+        now = datetime.utcnow()
+        item_ids = [item["id"] for item in items]
+        released = [
+            item["item_type"] for item in items
+            if item.get("item_type") and active_items.get(item["item_type"]) == item["id"]
+        ]
+        update: Dict[str, Any] = {
+            "$set": {
+                "extracted_items.$[item].status": ExtractionStatus.SAVED.value,
+                "extracted_items.$[item].saved_at": now,
+                "updated_at": now
+            },
+            "$inc": {
+                "version": 1,
+                "pending_item_count": -len(items),
+                "complete_item_count": -sum(
+                    1 for item in items if item.get("status") == ExtractionStatus.COMPLETE.value
+                )
+            }
+        }
+        if released:
+            update["$unset"] = {f"active_items.{item_type}": "" for item_type in released}
+
+        result = await db.conversations.update_one(
+            version_filter(conversation_id, version),
+            update,
+            array_filters=[{"item.id": {"$in": item_ids}}],
+            session=session
+        )
+        if result.matched_count:
+            if attempt:
+                _write_stats["merged"] += 1
+            return item_ids
+
+    _write_stats["exhausted"] += 1
+    raise ConversationConflictError("Conversation is being modified concurrently")
+
+
+def conversation_write_stats() -> Dict[str, Any]:
+    """
+    Snapshot of optimistic-concurrency counters for conversation writes
+
+    Returns:
+        dict: Writes, version conflicts, writes that succeeded after a
+            merge, and writes that gave up
+    """
+    return dict(_write_stats)
+
+
+def _encode_cursor(updated_at: datetime, conversation_id: ObjectId) -> str:
+    raw = f"{updated_at.isoformat()}|{conversation_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    updated_at, conversation_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|", 1)
+    return datetime.fromisoformat(updated_at), ObjectId(conversation_id)
+
+
+async def list_conversation_summaries(
+    db,
+    limit: int,
+    cursor: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Page through conversation summaries, newest first
+
+    Uses keyset pagination on (updated_at, _id) so each page is a bounded
+    index range scan regardless of how deep the client has paged.
+
+    Args:
+        db: Database instance
+        limit: Page size
+        cursor: Opaque cursor returned with the previous page
+
+    Returns:
+        tuple: Summary documents and the cursor for the next page (or None)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    query: Dict[str, Any] = {}
+    if cursor:
+        try:
+            updated_at, conversation_id = _decode_cursor(cursor)
+        except Exception:
+            raise ValueError("Invalid cursor")
+        query = {
+            "$or": [
+                {"updated_at": {"$lt": updated_at}},
+                {"updated_at": updated_at, "_id": {"$lt": conversation_id}}
+            ]
+        }
+
+    projection = {field: 1 for field in SUMMARY_FIELDS}
+    docs = await db.conversations.find(query, projection).sort(
+        [("updated_at", -1), ("_id", -1)]
+    ).limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = _encode_cursor(docs[-1]["updated_at"], docs[-1]["_id"])
+    return docs, next_cursor
+
+
+async def backfill_summary_fields(db, conversation_doc: Dict[str, Any]) -> None:
+    """
+    Populate listing fields for a conversation written before they existed
+
+    Args:
+        db: Database instance
+        conversation_doc: Full conversation document
+    """
+    if conversation_doc.get("storage") == MessageStorage.BUCKETED.value:
+        message_count = conversation_doc.get("message_count", 0)
+        last_messages = await read_messages(db, conversation_doc, max(message_count - 1, 0))
+    else:
+        last_messages = conversation_doc.get("messages", [])
+        message_count = len(last_messages)
+
+    fields: Dict[str, Any] = {
+        "message_count": message_count,
+        "last_message_preview": message_preview(last_messages[-1]["content"]) if last_messages else None,
+        **item_counts(conversation_doc.get("extracted_items", []))
+    }
+    await db.conversations.update_one({"_id": conversation_doc["_id"]}, {"$set": fields})
@@ -0,0 +1,165 @@
+"""
+Per-conversation serialisation and single-flight for extraction chat turns
+
+Turns on the same conversation run one at a time in this worker, so each
+turn loads the conversation only after the previous one has saved. A turn
+whose (conversation, message) is identical to one already queued or running
+does not call Claude again: it waits for the first turn and returns the same
+response. Both are in-process only; other workers are not coordinated.
+"""
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class _ConversationLock:
+    """Lock plus the number of turns holding or waiting for it"""
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+_locks: Dict[str, _ConversationLock] = {}
+_inflight: Dict[Tuple[str, str], "asyncio.Future"] = {}
+_stats = {"turns": 0, "waited": 0, "coalesced": 0, "timeouts": 0}
+
+
+def _message_key(message: str) -> str:
+    return " ".join(message.split())
+
+
+async def join_inflight(conversation_id: str, message: str) -> Optional[Any]:
+    """
+    Wait for an identical turn that is already queued or running
+
+    Args:
+        conversation_id: Conversation ID
+        message: The user's message
+
+    Returns:
+        Any: The first turn's response, or None if there is no identical turn
+
+    Raises:
+        HTTPException: 409 if the first turn takes longer than
+            CONVERSATION_TURN_TIMEOUT_SECONDS
+        Exception: Whatever the first turn raised
+    """
+    future = _inflight.get((conversation_id, _message_key(message)))
+    if future is None:
+        return None
+    _stats["coalesced"] += 1
+    try:
+        # The shield keeps a timed-out duplicate from cancelling the first turn's future
+        return await asyncio.wait_for(asyncio.shield(future), settings.CONVERSATION_TURN_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        _stats["timeouts"] += 1
+        raise _busy_error()
+
+
+def _busy_error() -> HTTPException:
+    return HTTPException(
+        status_code=409,
+        detail="Another message in this conversation is still being processed. Please try again."
+    )
+
+
+class ConversationTurn:
+    """
+    One chat turn holding its conversation's lock
+
+    Call `acquire()` before loading the conversation and `finish()` exactly
+    once with the turn's response or error; `finish()` is idempotent so it
+    can also be used as a safety net in `finally` blocks.
+    """
+
+    def __init__(self, conversation_id: str, message: str):
+        self.conversation_id = conversation_id
+        self.key = (conversation_id, _message_key(message))
+        self._entry: Optional[_ConversationLock] = None
+        self._future: Optional["asyncio.Future"] = None
+        self._locked = False
+        self._finished = False
+
+    async def acquire(self) -> None:
+        """
+        Register the turn for single-flight and wait for the conversation lock
+
+        Raises:
+            HTTPException: 409 if earlier turns keep the conversation busy
+                for longer than CONVERSATION_TURN_TIMEOUT_SECONDS
+            asyncio.CancelledError: If the caller is cancelled while waiting;
+                the turn is finished before it propagates
+        """
+        _stats["turns"] += 1
+        self._future = asyncio.get_running_loop().create_future()
+        _inflight.setdefault(self.key, self._future)
+
+        self._entry = _locks.setdefault(self.conversation_id, _ConversationLock())
+        if self._entry.users:
+            _stats["waited"] += 1
+        self._entry.users += 1
+
+        try:
+            await asyncio.wait_for(self._entry.lock.acquire(), settings.CONVERSATION_TURN_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            _stats["timeouts"] += 1
+            error = _busy_error()
+            self.finish(error=error)
+            raise error
+        except BaseException:
+            # Cancelled (client disconnect, shutdown): release the single-flight
+            # entry and our place in the queue so retries don't wait on it
+            self.finish(error=HTTPException(
+                status_code=409,
+                detail="The original request for this message did not complete. Please try again."
+            ))
+            raise
+        self._locked = True
+
+    def finish(self, result: Any = None, error: Optional[BaseException] = None) -> None:
+        """
+        Release the conversation and hand the outcome to any coalesced duplicates
+
+        Args:
+            result: The turn's response
+            error: The exception the turn failed with, if any
+        """
+        if self._finished:
+            return
+        self._finished = True
+
+        if self._future is not None and not self._future.done():
+            if error is not None:
+                self._future.set_exception(error)
+                # Duplicates re-raise it themselves; don't log it as unretrieved
+                self._future.exception()
+            else:
+                self._future.set_result(result)
+        if _inflight.get(self.key) is self._future:
+            del _inflight[self.key]
+
+        if self._entry is not None:
+            if self._locked:
+                self._entry.lock.release()
+            self._entry.users -= 1
+            if self._entry.users == 0 and _locks.get(self.conversation_id) is self._entry:
+                del _locks[self.conversation_id]
+
+
+def conversation_turn_stats() -> Dict[str, Any]:
+    """
+    Snapshot of turn coordination counters
+
+    Returns:
+        dict: Turns, turns that waited for an earlier one, duplicates that
+            shared a result instead of calling Claude, and lock timeouts
+    """
+    return {**_stats, "active_conversations": len(_locks)}
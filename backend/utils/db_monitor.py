@@ -0,0 +1,243 @@
+"""
+MongoDB command monitoring
+
+A pymongo CommandListener, registered on the Motor client, sees every
+command the driver sends. Each command is:
+
+- timed into the Prometheus histograms in utils.metrics
+- attributed to the HTTP request that issued it. DBOpsMiddleware keeps a
+  per-request tally in a context variable, which Motor carries onto its
+  executor threads. Per-route averages and the commands behind them are
+  reported at /diagnostics/db-ops, so N+1 patterns stand out. In
+  development every response also carries X-DB-Ops and X-DB-Time headers.
+- logged when it takes at least DB_SLOW_OP_THRESHOLD_MS, with the shape of
+  its filter (values replaced by "?") so unindexed queries can be matched
+  to an index.
+
+Headers are sent with the response start, so they count the commands issued
+before it; streamed bodies and background tasks are only included in the
+per-route figures.
+"""
+import json
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Tuple
+
+from pymongo import monitoring
+
+from config import settings
+from utils.metrics import DB_COMMAND_FAILURES, DB_COMMAND_SECONDS, HTTP_REQUEST_DB_OPERATIONS, route_label
+from utils.tracing import KIND_CLIENT, current_context, record_span
+
+logger = logging.getLogger(__name__)
+
+# Command field holding the query filter, for commands that have one
+FILTER_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+}
+
+
+class RequestDBStats:
+    """Commands issued on behalf of one request"""
+    __slots__ = ("method", "path", "ops", "seconds", "commands", "_lock")
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.ops = 0
+        self.seconds = 0.0
+        self.commands: Dict[str, int] = {}
+        # Concurrent queries of one request complete on different driver threads
+        self._lock = threading.Lock()
+
+    def record(self, command: str, seconds: float) -> None:
+        with self._lock:
+            self.ops += 1
+            self.seconds += seconds
+            self.commands[command] = self.commands.get(command, 0) + 1
+
+
+_current_request: ContextVar[Optional[RequestDBStats]] = ContextVar("db_request_stats", default=None)
+
+_route_stats: Dict[str, Dict[str, Any]] = {}
+_slow_ops = {"count": 0}
+
+
+def command_collection(command_name: str, command: Dict[str, Any]) -> str:
+    """
+    Collection a command operates on
+
+    Args:
+        command_name: Command name
+        command: Command document
+
+    Returns:
+        str: Collection name, or "-" for database and admin commands
+    """
+    target = command.get("collection") if command_name == "getMore" else command.get(command_name)
+    return target if isinstance(target, str) else "-"
+
+
+def command_filter(command_name: str, command: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Query filter of a command (the first statement's, for writes)
+
+    Args:
+        command_name: Command name
+        command: Command document
+
+    Returns:
+        dict: Filter, or None if the command has none
+    """
+    if command_name in ("update", "delete"):
+        statements = command.get("updates" if command_name == "update" else "deletes") or []
+        return statements[0].get("q") if statements else None
+    if command_name == "aggregate":
+        pipeline = command.get("pipeline") or []
+        return pipeline[0].get("$match") if pipeline else None
+    field = FILTER_FIELDS.get(command_name)
+    return command.get(field) if field else None
+
+
+def filter_shape(value: Any) -> Any:
+    """
+    Replace the values in a filter with "?", keeping fields and operators
+
+    Args:
+        value: Filter or part of one
+
+    Returns:
+        Any: Shape of the filter
+    """
+    if isinstance(value, dict):
+        return {key: filter_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        # $and/$or clauses keep their shapes; value lists ($in) collapse
+        if value and all(isinstance(item, dict) for item in value):
+            return [filter_shape(item) for item in value]
+        return ["?"]
+    return "?"
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Driver event listener timing, attributing and slow-logging Mongo commands"""
+
+    def __init__(self):
+        # (connection, request id) -> (request tally, trace context, command) from started to succeeded/failed
+        self._started: Dict[Tuple[Any, int], Tuple[Optional[RequestDBStats], Optional[tuple], Dict[str, Any]]] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        self._started[(event.connection_id, event.request_id)] = (
+            _current_request.get(), current_context(), event.command
+        )
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finished(event, failed=False)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finished(event, failed=True)
+
+    def _finished(self, event: Any, failed: bool) -> None:
+        request, trace_context, command = self._started.pop((event.connection_id, event.request_id), (None, None, {}))
+        collection = command_collection(event.command_name, command)
+        seconds = event.duration_micros / 1e6
+        if trace_context is not None:
+            end = time.perf_counter()
+            record_span(
+                trace_context, f"mongodb.{event.command_name} {collection}", end - seconds, end, KIND_CLIENT,
+                **{"db.system": "mongodb", "db.operation": event.command_name, "db.mongodb.collection": collection,
+                   "failed": failed}
+            )
+
+        DB_COMMAND_SECONDS.observe(seconds, collection, event.command_name)
+        if failed:
+            DB_COMMAND_FAILURES.inc(collection, event.command_name)
+        if request is not None:
+            request.record(f"{collection}.{event.command_name}", seconds)
+        if seconds * 1000 >= settings.DB_SLOW_OP_THRESHOLD_MS:
+            self._log_slow(event.command_name, collection, command, seconds, request)
+
+    def _log_slow(self, command_name: str, collection: str, command: Dict[str, Any], seconds: float, request: Optional[RequestDBStats]) -> None:
+        _slow_ops["count"] += 1
+        query = command_filter(command_name, command)
+        shape = json.dumps(filter_shape(query), default=str) if query is not None else "-"
+        origin = f"{request.method} {request.path}" if request is not None else "background"
+        logger.warning(
+            f"Slow MongoDB {command_name} on {collection}: {seconds * 1000:.1f}ms ({origin}), filter {shape}"
+        )
+
+
+class DBOpsMiddleware:
+    """ASGI middleware tallying the Mongo commands of each request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request = RequestDBStats(scope["method"], scope["path"])
+        token = _current_request.set(request)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start" and settings.is_development:
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-db-ops", str(request.ops).encode()),
+                    (b"x-db-time", f"{request.seconds * 1000:.1f}ms".encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current_request.reset(token)
+            _record_route(route_label(scope), request)
+
+
+def _record_route(route: str, request: RequestDBStats) -> None:
+    HTTP_REQUEST_DB_OPERATIONS.observe(request.ops, route)
+    stats = _route_stats.get(route)
+    if stats is None:
+        stats = _route_stats[route] = {"requests": 0, "ops": 0, "seconds": 0.0, "max_ops": 0, "commands": {}}
+    stats["requests"] += 1
+    stats["ops"] += request.ops
+    stats["seconds"] += request.seconds
+    stats["max_ops"] = max(stats["max_ops"], request.ops)
+    for command, count in request.commands.items():
+        stats["commands"][command] = stats["commands"].get(command, 0) + count
+
+
+def db_ops_stats() -> Dict[str, Any]:
+    """
+    Snapshot of Mongo commands per route
+
+    Returns:
+        dict: Slow-op threshold and count, and per route (most commands per
+            request first) the request count, average and maximum commands,
+            average DB time and each command's average count per request
+    """
+    routes = {}
+    for route, stats in sorted(_route_stats.items(), key=lambda item: -item[1]["ops"] / item[1]["requests"]):
+        requests = stats["requests"]
+        routes[route] = {
+            "requests": requests,
+            "avg_ops": round(stats["ops"] / requests, 2),
+            "max_ops": stats["max_ops"],
+            "avg_db_ms": round(stats["seconds"] / requests * 1000, 2),
+            "commands_per_request": {
+                command: round(count / requests, 2)
+                for command, count in sorted(stats["commands"].items(), key=lambda item: -item[1])
+            },
+        }
+    return {
+        "slow_op_threshold_ms": settings.DB_SLOW_OP_THRESHOLD_MS,
+        "slow_ops": _slow_ops["count"],
+        "routes": routes,
+    }
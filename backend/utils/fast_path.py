@@ -0,0 +1,330 @@
+"""
+Rule-based slot filler for trivial extraction follow-ups
+
+Many extraction turns only answer the assistant's last question: an enum
+value ("utilities", "urgent", "monthly"), a year or AM/PM confirmation for a
+date/time the assistant just proposed ("yes 2025, afternoon"), or an amount.
+Before calling Claude, the user's message is split into comma/"and"
+separated parts and each part is matched against the open item's missing
+fields using the same enums and date/time rules as the extraction prompt.
+The fast path only answers when every missing field is filled and nothing
+in the message is left unexplained; anything else goes to the model.
+"""
+import re
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from models.conversation import Conversation, ExtractedItem, ExtractionStatus
+
+# Enum fields per item type, mirroring the extraction prompt
+ENUM_FIELDS: Dict[str, Dict[str, List[str]]] = {
+    "task": {
+        "type": ["home-maintenance", "cleaning", "gardening", "groceries", "delivery", "pharmacy", "others"],
+        "priority": ["urgent", "normal"],
+    },
+    "bill": {
+        "category": ["utilities", "telco-internet", "insurance", "subscriptions", "credit-loans", "general"],
+        "recurrence": ["one-time", "monthly", "yearly"],
+    },
+    "schedule": {
+        "type": ["personal", "family", "medical"],
+    },
+    "payment": {
+        "type": ["card", "paynow", "bank"],
+    },
+}
+
+# Common wordings that map unambiguously to an enum value
+ENUM_SYNONYMS = {
+    "utility": "utilities",
+    "telco": "telco-internet",
+    "internet": "telco-internet",
+    "subscription": "subscriptions",
+    "credit": "credit-loans",
+    "loan": "credit-loans",
+    "loans": "credit-loans",
+    "once": "one-time",
+    "one-off": "one-time",
+    "annual": "yearly",
+    "annually": "yearly",
+    "every-month": "monthly",
+    "every-year": "yearly",
+    "other": "others",
+    "grocery": "groceries",
+    "pay-now": "paynow",
+}
+
+DATE_FIELDS = {"task": ["preferredDate"], "reminder": ["reminderDate"], "bill": ["dueDate"], "schedule": ["date"]}
+TIME_FIELDS = {"reminder": ["reminderTime"], "schedule": ["time"]}
+AMOUNT_FIELDS = {"bill": ["amount"]}
+
+# Words that carry no value in a slot-filling answer
+FILLER_WORDS = {
+    "yes", "yeah", "yep", "yup", "correct", "right", "ok", "okay", "sure", "confirmed",
+    "it", "it's", "its", "is", "that", "that's", "thats", "in", "the", "at", "for", "a",
+    "an", "please", "thanks", "thank", "you", "one", "category", "priority", "type",
+}
+
+MONTHS = {
+    name: index + 1
+    for index, names in enumerate([
+        ("january", "jan"), ("february", "feb"), ("march", "mar"), ("april", "apr"),
+        ("may",), ("june", "jun"), ("july", "jul"), ("august", "aug"),
+        ("september", "sep", "sept"), ("october", "oct"), ("november", "nov"), ("december", "dec"),
+    ])
+    for name in names
+}
+MONTH_NAMES = ["January", "February", "March", "April", "May", "June", "July",
+               "August", "September", "October", "November", "December"]
+
+MAX_MESSAGE_LENGTH = 80
+
+_SEGMENT_SPLIT = re.compile(r"\s*(?:,(?!\d{3}\b)|;|&|\band\b)\s*")  # keep thousands separators
+_ISO_DATE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+_YEAR = re.compile(r"\b(20\d{2})\b")
+_MONTH_DAY = re.compile(r"\b(" + "|".join(sorted(MONTHS, key=len, reverse=True)) + r")\.?\s+(\d{1,2})(?:st|nd|rd|th)?\b")
+_TIME_WITH_MERIDIEM = re.compile(r"\b(\d{1,2})(?::(\d{2}))?\s*(am|pm|a\.m\.|p\.m\.)")
+_TIME_24H = re.compile(r"\b(\d{1,2}):(\d{2})\b")
+_PROPOSED_TIME = re.compile(r"\b(?:at\s+\d{1,2}|\d{1,2}:\d{2}|\d{1,2}\s+o'clock)\b")
+# Every hour or clock time ("3", "3pm", "4:30"); a proposal must contain exactly one
+_TIME_CANDIDATE = re.compile(r"\b(\d{1,2})(?::(\d{2}))?(?!\d)")
+_AMOUNT = re.compile(r"^(?:s?\$|usd|sgd)?\s*(\d{1,3}(?:,\d{3})+|\d+)(?:\.(\d{1,2}))?\s*(?:dollars?|bucks|usd|sgd)?$")
+_CURRENCY = re.compile(r"\$|usd|sgd|dollar|buck")
+_MERIDIEM_WORDS = {"am": "am", "a.m.": "am", "morning": "am", "pm": "pm", "p.m.": "pm",
+                   "afternoon": "pm", "evening": "pm", "night": "pm", "tonight": "pm"}
+
+_stats = {"turns": 0, "eligible": 0, "hits": 0}
+
+
+def _open_item(conversation: Conversation) -> Optional[ExtractedItem]:
+    candidates = [
+        item for item in conversation.extracted_items
+        if item.status in (ExtractionStatus.INCOMPLETE, ExtractionStatus.EXTRACTING)
+        and item.missing_fields and item.item_type is not None
+    ]
+    return max(candidates, key=lambda item: item.updated_at) if candidates else None
+
+
+def _last_assistant_text(conversation: Conversation) -> str:
+    for message in reversed(conversation.messages[:-1]):
+        if message.role == "assistant":
+            return message.content
+    return ""
+
+
+def _proposed_month_day(assistant_text: str) -> Optional[Tuple[int, int]]:
+    found = {(MONTHS[month], int(day)) for month, day in _MONTH_DAY.findall(assistant_text.lower())}
+    return found.pop() if len(found) == 1 else None
+
+
+def _proposed_time(assistant_text: str) -> Optional[Tuple[int, int]]:
+    # Dates are not time candidates; any other number ("at 3 or 4?", "3pm or 4:30") makes it ambiguous
+    text = _MONTH_DAY.sub(" ", _ISO_DATE.sub(" ", assistant_text.lower()))
+    candidates = _TIME_CANDIDATE.findall(text)
+    if len(candidates) != 1 or not _PROPOSED_TIME.search(text):
+        return None
+    hour, minute = candidates[0]
+    return int(hour), int(minute or 0)
+
+
+def _to_24h(hour: int, minute: int, meridiem: str) -> Optional[str]:
+    if not 1 <= hour <= 12 or not 0 <= minute <= 59:
+        return None
+    if meridiem == "am":
+        hour = 0 if hour == 12 else hour
+    else:
+        hour = hour if hour == 12 else hour + 12
+    return f"{hour:02d}:{minute:02d}"
+
+
+def _valid_date(year: int, month: int, day: int) -> Optional[str]:
+    try:
+        return date(year, month, day).isoformat()
+    except ValueError:
+        return None
+
+
+def _leftover(segment: str, consumed: str) -> bool:
+    """Whether anything other than filler words remains after removing the value"""
+    rest = segment.replace(consumed, " ", 1) if consumed else segment
+    return any(word not in FILLER_WORDS for word in re.findall(r"[a-z0-9'.$]+", rest))
+
+
+class _Segment:
+    """One comma/'and' separated part of the user's answer"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.words = re.findall(r"(?:[a-z0-9'.$-]|(?<=\d),(?=\d{3}))+", text)
+
+
+def _match_enum(segment: _Segment, fields: Dict[str, List[str]]) -> Optional[Tuple[str, str]]:
+    content = [word for word in segment.words if word not in FILLER_WORDS]
+    if not content:
+        return None
+    value = "-".join(content)
+    value = ENUM_SYNONYMS.get(value, value)
+    matches = [(field, value) for field, allowed in fields.items() if value in allowed]
+    return matches[0] if len(matches) == 1 else None
+
+
+def _match_date(segment: _Segment, assistant_text: str) -> Optional[str]:
+    iso = _ISO_DATE.search(segment.text)
+    if iso:
+        value = _valid_date(int(iso.group(1)), int(iso.group(2)), int(iso.group(3)))
+        return value if value and not _leftover(segment.text, iso.group(0)) else None
+
+    # Year confirmation for a month/day the assistant just proposed
+    year = _YEAR.search(segment.text)
+    if year and not _leftover(segment.text, year.group(0)):
+        month_day = _proposed_month_day(assistant_text)
+        if month_day:
+            return _valid_date(int(year.group(1)), *month_day)
+    return None
+
+
+def _match_time(segment: _Segment, assistant_text: str) -> Optional[str]:
+    explicit = _TIME_WITH_MERIDIEM.search(segment.text)
+    if explicit:
+        meridiem = "am" if explicit.group(3).startswith("a") else "pm"
+        value = _to_24h(int(explicit.group(1)), int(explicit.group(2) or 0), meridiem)
+        return value if value and not _leftover(segment.text, explicit.group(0)) else None
+
+    # Unambiguous 24-hour times only; "9:00" still needs AM/PM per the prompt rules
+    clock = _TIME_24H.search(segment.text)
+    if clock:
+        hour, minute = int(clock.group(1)), int(clock.group(2))
+        if 13 <= hour <= 23 and 0 <= minute <= 59 and not _leftover(segment.text, clock.group(0)):
+            return f"{hour:02d}:{minute:02d}"
+        return None
+
+    # AM/PM confirmation for a time the assistant just proposed
+    meridiems = {_MERIDIEM_WORDS[word] for word in segment.words if word in _MERIDIEM_WORDS}
+    content = [word for word in segment.words if word not in FILLER_WORDS and word not in _MERIDIEM_WORDS]
+    if len(meridiems) == 1 and not content:
+        proposed = _proposed_time(assistant_text)
+        if proposed:
+            return _to_24h(proposed[0], proposed[1], meridiems.pop())
+    return None
+
+
+def _match_amount(segment: _Segment, allow_bare_number: bool) -> Optional[float]:
+    content = " ".join(word for word in segment.words if word not in FILLER_WORDS)
+    match = _AMOUNT.match(content)
+    if not match or not (allow_bare_number or _CURRENCY.search(content)):
+        return None
+    amount = float(match.group(1).replace(",", "") + "." + (match.group(2) or "0"))
+    return int(amount) if amount.is_integer() else amount
+
+
+def _describe(field: str, value: Any) -> str:
+    if field in ("amount",):
+        return f"${value:,}" if isinstance(value, int) else f"${value:,.2f}"
+    if re.fullmatch(r"\d{4}-\d{2}-\d{2}", str(value)):
+        year, month, day = (int(part) for part in str(value).split("-"))
+        return f"{MONTH_NAMES[month - 1]} {day}, {year}"
+    if re.fullmatch(r"\d{2}:\d{2}", str(value)):
+        hour, minute = (int(part) for part in str(value).split(":"))
+        return f"{hour % 12 or 12}:{minute:02d} {'AM' if hour < 12 else 'PM'}"
+    return str(value)
+
+
+def try_fast_path(conversation: Conversation, message: str) -> Optional[Dict[str, Any]]:
+    """
+    Answer a slot-filling turn without calling Claude, if it is unambiguous
+
+    Args:
+        conversation: Conversation including the latest user message
+        message: The user's message
+
+    Returns:
+        dict: Response envelope in the extraction prompt's format, or None
+            if the turn needs the model
+    """
+    _stats["turns"] += 1
+    item = _open_item(conversation)
+    text = message.strip().lower().rstrip(".!")
+    if item is None or not text or len(text) > MAX_MESSAGE_LENGTH or "?" in text:
+        return None
+
+    _stats["eligible"] += 1
+
+    item_type = item.item_type.value
+    missing = list(item.missing_fields)
+    enum_fields = {field: values for field, values in ENUM_FIELDS.get(item_type, {}).items() if field in missing}
+    date_fields = [field for field in DATE_FIELDS.get(item_type, []) if field in missing]
+    time_fields = [field for field in TIME_FIELDS.get(item_type, []) if field in missing]
+    amount_fields = [field for field in AMOUNT_FIELDS.get(item_type, []) if field in missing]
+
+    # Every missing field must be one the rules can fill
+    if len(enum_fields) + len(date_fields[:1]) + len(time_fields[:1]) + len(amount_fields) != len(missing):
+        return None
+    if len(date_fields) > 1 or len(time_fields) > 1:
+        return None
+
+    assistant_text = _last_assistant_text(conversation)
+    filled: Dict[str, Any] = {}
+    for part in _SEGMENT_SPLIT.split(text):
+        if not part:
+            continue
+        segment = _Segment(part)
+        if not any(word not in FILLER_WORDS for word in segment.words):
+            continue
+
+        value: Any = None
+        if date_fields and date_fields[0] not in filled:
+            value = _match_date(segment, assistant_text)
+            if value:
+                filled[date_fields[0]] = value
+                continue
+        if time_fields and time_fields[0] not in filled:
+            value = _match_time(segment, assistant_text)
+            if value:
+                filled[time_fields[0]] = value
+                continue
+        if amount_fields and amount_fields[0] not in filled:
+            value = _match_amount(segment, allow_bare_number=not (date_fields or time_fields))
+            if value is not None:
+                filled[amount_fields[0]] = value
+                continue
+        enum_match = _match_enum(segment, {f: v for f, v in enum_fields.items() if f not in filled})
+        if enum_match:
+            filled[enum_match[0]] = enum_match[1]
+            continue
+
+        # Part of the message could not be interpreted; let the model handle it
+        return None
+
+    if set(filled) != set(missing):
+        return None
+
+    _stats["hits"] += 1
+    extracted_data = {**item.extracted_data, **filled}
+    label = extracted_data.get("name") or extracted_data.get("title") or extracted_data.get("description") or item_type
+    details = ", ".join(f"{field}: {_describe(field, value)}" for field, value in filled.items())
+    return {
+        "message": f"Perfect! I've noted {details}. Your {item_type} \"{label}\" has everything it needs and is ready to save.",
+        "extraction": {
+            "detected": True,
+            "item_type": item_type,
+            "extracted_data": extracted_data,
+            "missing_fields": [],
+            "status": ExtractionStatus.COMPLETE.value,
+            "confidence": 1.0,
+        },
+    }
+
+
+def fast_path_stats() -> Dict[str, Any]:
+    """
+    Snapshot of fast-path counters
+
+    Returns:
+        dict: Extraction turns seen, turns with an open item and a short
+            answer, turns answered locally, and the share answered locally
+    """
+    turns = _stats["turns"]
+    return {
+        **_stats,
+        "hit_rate": round(_stats["hits"] / turns, 4) if turns else 0.0,
+    }
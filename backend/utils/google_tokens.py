@@ -0,0 +1,142 @@
+"""
+Local verification of Google ID tokens
+
+Tokens are checked against Google's published signing keys (JWKS) instead of
+calling the tokeninfo endpoint per login. The key set is cached in-process
+for as long as the JWKS response's Cache-Control max-age allows. A token
+signed with an unknown `kid` (Google rotates keys) triggers one refetch
+shared by all concurrent callers, and such refetches are rate limited so
+forged kids cannot be used to hammer Google.
+"""
+import asyncio
+import logging
+import re
+import time
+from typing import Any, Dict, Optional
+
+from jose import JWTError, jwt
+
+from config import settings
+from http_client import get_http_client
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+# Used when the JWKS response carries no max-age
+DEFAULT_KEYS_MAX_AGE_SECONDS = 3600
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+class GoogleTokenError(Exception):
+    """Raised when a Google ID token cannot be verified"""
+
+
+class GoogleKeySet:
+    """Cached Google signing keys with Cache-Control driven refresh"""
+
+    def __init__(self, jwks_url: str):
+        self.jwks_url = jwks_url
+        self._keys: Dict[str, Dict[str, Any]] = {}
+        self._expires_at = 0.0
+        self._last_fetch = 0.0
+        self._refresh_task: Optional["asyncio.Task"] = None
+        self.fetches = 0
+
+    async def _fetch(self) -> None:
+        response = await get_http_client().get(self.jwks_url)
+        response.raise_for_status()
+
+        match = _MAX_AGE.search(response.headers.get("cache-control", ""))
+        max_age = int(match.group(1)) if match else DEFAULT_KEYS_MAX_AGE_SECONDS
+
+        self._keys = {key["kid"]: key for key in response.json()["keys"]}
+        self._last_fetch = time.monotonic()
+        self._expires_at = self._last_fetch + max_age
+        self.fetches += 1
+        logger.info(f"Fetched {len(self._keys)} Google signing keys (max-age {max_age}s)")
+
+    async def _refresh(self) -> None:
+        # Single flight: concurrent callers await the same fetch
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.ensure_future(self._fetch())
+        try:
+            await asyncio.shield(self._refresh_task)
+        except Exception as e:
+            if not self._keys:
+                raise
+            # Keep verifying with the previous keys and retry a little later
+            logger.warning(f"Failed to refresh Google signing keys, using cached set: {e}")
+            self._last_fetch = time.monotonic()
+            self._expires_at = self._last_fetch + settings.GOOGLE_JWKS_MIN_REFRESH_SECONDS
+
+    async def get_key(self, kid: str) -> Dict[str, Any]:
+        """
+        Get the signing key for a key ID, refreshing the set if needed
+
+        Args:
+            kid: Key ID from the token header
+
+        Returns:
+            dict: JWK for the key
+
+        Raises:
+            GoogleTokenError: If no key with this ID is published
+        """
+        if time.monotonic() >= self._expires_at:
+            await self._refresh()
+        elif kid not in self._keys:
+            if time.monotonic() - self._last_fetch >= settings.GOOGLE_JWKS_MIN_REFRESH_SECONDS:
+                await self._refresh()
+
+        key = self._keys.get(kid)
+        if key is None:
+            raise GoogleTokenError("Unknown signing key")
+        return key
+
+
+google_keys = GoogleKeySet(settings.GOOGLE_JWKS_URL)
+
+
+async def verify_google_id_token(id_token: str) -> Dict[str, Any]:
+    """
+    Verify a Google ID token's signature and claims locally
+
+    Args:
+        id_token: ID token issued by Google Sign-In
+
+    Returns:
+        dict: Verified token claims (sub, email, name, picture, ...)
+
+    Raises:
+        GoogleTokenError: If the token is malformed, expired, not signed by
+            Google, not issued for this app, or has no verified email
+    """
+    try:
+        header = jwt.get_unverified_header(id_token)
+    except JWTError:
+        raise GoogleTokenError("Malformed token")
+
+    kid = header.get("kid")
+    if not kid or header.get("alg") != "RS256":
+        raise GoogleTokenError("Unsupported token header")
+
+    key = await google_keys.get_key(kid)
+
+    try:
+        claims = jwt.decode(
+            id_token,
+            key,
+            algorithms=["RS256"],
+            audience=settings.GOOGLE_CLIENT_ID,
+            issuer=GOOGLE_ISSUERS,
+            options={"verify_at_hash": False}
+        )
+    except JWTError as e:
+        raise GoogleTokenError(str(e))
+
+    # Accounts are linked by email, so only trust verified addresses
+    if not claims.get("email") or claims.get("email_verified") not in (True, "true"):
+        raise GoogleTokenError("Google account email is not verified")
+    return claims
@@ -0,0 +1,293 @@
+"""
+Resolve a free-text item reference ("the electric bill") to a saved item
+
+Saved items carry normalised `search_keys` computed on insert. To resolve a
+reference, the user's items in one collection are loaded once through the
+user_id index (search keys only) into an in-process trigram/token index,
+cached per (user, collection), and every candidate sharing a trigram with
+the query is scored. The best candidate wins only if it is clearly ahead of
+the runner-up; otherwise the result is ambiguous and the candidates are
+returned so the user can pick one. A cached index only answers on its own
+when it yields a single exact match that is confirmed to still exist;
+anything else is re-ranked against a freshly loaded index.
+"""
+import logging
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set
+
+from bson import ObjectId
+
+from config import settings
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Item type -> collection the saved item lives in
+ITEM_COLLECTIONS = {
+    "task": "errands",
+    "reminder": "reminders",
+    "bill": "bills",
+    "schedule": "appointments",
+    "payment": "payment_methods"
+}
+
+# Fields a user may refer to an item by, in label preference order
+SEARCH_FIELDS = ("name", "title", "nickname", "description")
+
+# Minimum score for a candidate to be considered at all
+MIN_SCORE = 0.35
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+_index_cache = TTLCache(
+    "item_index",
+    maxsize=settings.ITEM_INDEX_CACHE_MAX_ENTRIES,
+    ttl=settings.ITEM_INDEX_CACHE_TTL_SECONDS
+)
+
+
+def normalize(text: str) -> str:
+    """
+    Lowercase, strip accents and collapse punctuation to single spaces
+
+    Args:
+        text: Raw text
+
+    Returns:
+        str: Normalised text
+    """
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return _NON_ALNUM.sub(" ", text.lower()).strip()
+
+
+def _trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def build_search_keys(item_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Compute the normalised search keys stored with a saved item
+
+    Args:
+        item_data: Item document fields
+
+    Returns:
+        dict: Normalised text, its tokens and a display label
+    """
+    values = [str(item_data[field]) for field in SEARCH_FIELDS if item_data.get(field)]
+    text = normalize(" ".join(values))
+    return {
+        "text": text,
+        "tokens": sorted(set(text.split())),
+        "label": values[0] if values else ""
+    }
+
+
+class UserItemIndex:
+    """Trigram and token inverted index over one user's items in one collection"""
+
+    def __init__(self, items: List[Dict[str, Any]]):
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.trigram_postings: Dict[str, Set[str]] = defaultdict(set)
+
+        for item in items:
+            keys = item.get("search_keys") or build_search_keys(item)
+            item_id = str(item["_id"])
+            trigrams = _trigrams(keys["text"])
+            self.entries[item_id] = {
+                "label": keys["label"],
+                "text": keys["text"],
+                "tokens": set(keys["tokens"]),
+                "trigrams": trigrams
+            }
+            for trigram in trigrams:
+                self.trigram_postings[trigram].add(item_id)
+
+    def rank(self, query: str) -> List[Dict[str, Any]]:
+        """
+        Score every item that shares a trigram with the query
+
+        Args:
+            query: Free-text item reference
+
+        Returns:
+            list: Candidates with id, label and score, best first
+        """
+        text = normalize(query)
+        if not text:
+            return []
+
+        query_tokens = set(text.split())
+        query_trigrams = _trigrams(text)
+
+        candidate_ids: Set[str] = set()
+        for trigram in query_trigrams:
+            candidate_ids |= self.trigram_postings.get(trigram, set())
+
+        ranked = []
+        for item_id in candidate_ids:
+            entry = self.entries[item_id]
+            if entry["text"] == text:
+                score = 1.0
+            else:
+                # How much of the query the item contains (fuzzy and whole-word),
+                # with overall similarity as a tie-breaker favouring closer lengths
+                shared = len(query_trigrams & entry["trigrams"])
+                containment = shared / len(query_trigrams)
+                coverage = len(query_tokens & entry["tokens"]) / len(query_tokens)
+                dice = 2 * shared / (len(query_trigrams) + len(entry["trigrams"]))
+                score = 0.4 * containment + 0.4 * coverage + 0.2 * dice
+                if f" {text} " in f" {entry['text']} ":
+                    score += 0.1
+                score = min(score, 0.99)
+            if score >= MIN_SCORE:
+                ranked.append({"id": item_id, "label": entry["label"], "score": round(score, 3)})
+
+        ranked.sort(key=lambda candidate: (-candidate["score"], candidate["label"]))
+        return ranked
+
+
+class ResolveResult:
+    """Outcome of resolving an item reference"""
+
+    def __init__(self, status: str, candidates: List[Dict[str, Any]]):
+        self.status = status  # match, ambiguous, not_found
+        self.candidates = candidates
+
+    @property
+    def item_id(self) -> Optional[str]:
+        return self.candidates[0]["id"] if self.status == "match" else None
+
+
+async def _load_index(db, collection_name: str, user_id: str) -> UserItemIndex:
+    projection = {"search_keys": 1, **{field: 1 for field in SEARCH_FIELDS}}
+    items = await db[collection_name].find({"user_id": user_id}, projection).to_list(None)
+    return UserItemIndex(items)
+
+
+async def _confirmed_exact_match(db, collection_name: str, user_id: str, ranked: List[Dict[str, Any]]) -> bool:
+    if not ranked or ranked[0]["score"] < 1.0 or (len(ranked) > 1 and ranked[1]["score"] == 1.0):
+        return False
+    found = await db[collection_name].find_one(
+        {"_id": ObjectId(ranked[0]["id"]), "user_id": user_id},
+        {"_id": 1}
+    )
+    return found is not None
+
+
+def invalidate_user_index(collection_name: str, user_id: str) -> None:
+    """
+    Drop the cached index after the user's items in a collection change
+
+    Args:
+        collection_name: Item collection
+        user_id: Owner of the items
+    """
+    _index_cache.invalidate((collection_name, user_id))
+
+
+async def resolve_item(db, collection_name: str, user_id: str, identifier: str) -> ResolveResult:
+    """
+    Resolve a free-text reference to one of the user's items
+
+    Args:
+        db: Database instance
+        collection_name: Item collection to search
+        user_id: Owner of the items
+        identifier: Free-text item reference
+
+    Returns:
+        ResolveResult: match with the winning item, ambiguous with the
+            close candidates, or not_found
+    """
+    cache_key = (collection_name, user_id)
+    index = _index_cache.get(cache_key)
+    from_cache = index is not None
+    if index is None:
+        index = await _load_index(db, collection_name, user_id)
+        _index_cache.set(cache_key, index)
+
+    ranked = index.rank(identifier)
+    if from_cache and not await _confirmed_exact_match(db, collection_name, user_id, ranked):
+        # Another worker may have added or deleted items since the index was
+        # cached; only a single exact match that still exists is trusted
+        invalidate_user_index(collection_name, user_id)
+        return await resolve_item(db, collection_name, user_id, identifier)
+
+    if not ranked:
+        return ResolveResult("not_found", [])
+
+    best = ranked[0]["score"]
+    if best == 1.0 and (len(ranked) == 1 or ranked[1]["score"] < 1.0):
+        # A single exact match wins outright
+        return ResolveResult("match", ranked[:1])
+    close = [
+        candidate for candidate in ranked
+        if best - candidate["score"] <= settings.ITEM_RESOLVER_AMBIGUITY_MARGIN
+    ]
+    if len(close) > 1:
+        return ResolveResult("ambiguous", close[:settings.ITEM_RESOLVER_MAX_CANDIDATES])
+    return ResolveResult("match", ranked[:1])
+
+
+async def insert_item(db, collection_name: str, item_data: Dict[str, Any]) -> ObjectId:
+    """
+    Insert a saved item with its search keys
+
+    Args:
+        db: Database instance
+        collection_name: Item collection
+        item_data: Item document including user_id
+
+    Returns:
+        ObjectId: ID of the inserted item
+    """
+    item_data["search_keys"] = build_search_keys(item_data)
+    result = await db[collection_name].insert_one(item_data)
+    invalidate_user_index(collection_name, item_data["user_id"])
+    return result.inserted_id
+
+
+async def insert_items(db, collection_name: str, items: List[Dict[str, Any]], session=None) -> List[ObjectId]:
+    """
+    Insert several saved items with their search keys in one round trip
+
+    Args:
+        db: Database instance
+        collection_name: Item collection
+        items: Item documents including user_id
+        session: Optional client session (for transactions)
+
+    Returns:
+        list: IDs of the inserted items, in order
+    """
+    for item_data in items:
+        item_data["search_keys"] = build_search_keys(item_data)
+    result = await db[collection_name].insert_many(items, session=session)
+    for user_id in {item_data["user_id"] for item_data in items}:
+        invalidate_user_index(collection_name, user_id)
+    return result.inserted_ids
+
+
+async def delete_user_item(db, collection_name: str, user_id: str, item_id: str) -> bool:
+    """
+    Delete one of the user's items
+
+    Args:
+        db: Database instance
+        collection_name: Item collection
+        user_id: Owner of the item
+        item_id: Item ID
+
+    Returns:
+        bool: True if the item existed and was deleted
+    """
+    if not ObjectId.is_valid(item_id):
+        return False
+    result = await db[collection_name].delete_one({"_id": ObjectId(item_id), "user_id": user_id})
+    invalidate_user_index(collection_name, user_id)
+    return result.deleted_count > 0
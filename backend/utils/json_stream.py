@@ -0,0 +1,269 @@
+"""
+Incremental parser for Claude's extraction response envelope
+
+The extraction persona answers with a JSON object of the form
+{"message": ..., "extraction": {...}, "deletion": {...}}. This parser is fed
+text chunks as they arrive from the streaming API and emits events without
+waiting for the envelope to close:
+
+- ("message_delta", str): decoded text of the top-level "message" string
+- ("extracted_field", {"key": str, "value": Any}): one member of
+  extraction.extracted_data, emitted as soon as its value closes
+
+Every character is examined exactly once and only the value currently being
+captured is buffered, so cost is linear in the response length.
+"""
+import json
+from typing import Any, List, Optional, Tuple
+
+MESSAGE_PATH = ("message",)
+EXTRACTED_DATA_PATH = ("extraction", "extracted_data")
+
+_WHITESPACE = " \t\r\n"
+_LITERAL_END = ",}]" + _WHITESPACE
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+ParserEvent = Tuple[str, Any]
+
+
+class _Frame:
+    """Open JSON container on the parser stack"""
+    __slots__ = ("is_object", "key", "expect")
+
+    def __init__(self, is_object: bool):
+        self.is_object = is_object
+        self.key: Optional[str] = None
+        # object: "key", "colon", "value", "comma" / array: "value", "comma"
+        self.expect = "key" if is_object else "value"
+
+
+class EnvelopeStreamParser:
+    """
+    Streaming parser for the {"message", "extraction", "deletion"} envelope
+
+    Text before the first "{" (such as a ```json fence) is skipped. If the
+    response does not start with JSON at all it is treated as plain text and
+    forwarded as message deltas unchanged.
+    """
+
+    def __init__(self):
+        self._mode = "seek"  # seek, fence, json, plain, done
+        self._stack: List[_Frame] = []
+        self._string: Optional[List[str]] = None
+        self._string_is_key = False
+        self._escape = False
+        self._unicode: Optional[str] = None
+        self._high_surrogate: Optional[int] = None
+        self._literal: Optional[List[str]] = None
+        self._streaming_message = False
+        self._capture: Optional[List[str]] = None
+        self._capture_depth = 0
+        self._capture_key: Optional[str] = None
+        self._events: List[ParserEvent] = []
+        self._message_chunk: List[str] = []
+
+    @property
+    def is_json(self) -> bool:
+        """Whether the response was recognised as a JSON envelope"""
+        return self._mode in ("json", "done")
+
+    def feed(self, chunk: str) -> List[ParserEvent]:
+        """
+        Consume the next chunk of model output
+
+        Args:
+            chunk: Newly generated text
+
+        Returns:
+            list: Events completed by this chunk, in order
+        """
+        i = 0
+        length = len(chunk)
+        while i < length:
+            char = chunk[i]
+            mode = self._mode
+
+            if mode == "json":
+                if self._string is not None:
+                    self._string_char(char)
+                elif self._literal is not None:
+                    if char in _LITERAL_END:
+                        self._end_literal()
+                        continue  # re-process the delimiter structurally
+                    self._literal.append(char)
+                    self._capture_char(char)
+                else:
+                    self._structural_char(char)
+            elif mode == "seek":
+                if char == "{":
+                    self._mode = "json"
+                    self._open_container(True, char)
+                elif char not in _WHITESPACE and char != "`":
+                    self._mode = "plain"
+                    continue
+                elif char == "`":
+                    # Code fence: skip everything up to the opening brace
+                    self._mode = "fence"
+            elif mode == "fence":
+                if char == "{":
+                    self._mode = "json"
+                    self._open_container(True, char)
+            elif mode == "plain":
+                self._message_chunk.append(chunk[i:])
+                break
+            i += 1
+
+        return self._drain()
+
+    def _flush_message(self) -> None:
+        if self._message_chunk:
+            self._events.append(("message_delta", "".join(self._message_chunk)))
+            self._message_chunk = []
+
+    def _drain(self) -> List[ParserEvent]:
+        self._flush_message()
+        events, self._events = self._events, []
+        return events
+
+    def _path(self) -> Tuple[str, ...]:
+        return tuple(frame.key for frame in self._stack if frame.is_object)
+
+    def _capture_char(self, char: str) -> None:
+        if self._capture is not None:
+            self._capture.append(char)
+
+    def _begin_value(self, char: str) -> None:
+        """Called with the first character of any value"""
+        if self._capture is not None:
+            return
+        frame = self._stack[-1]
+        if (
+            frame.is_object
+            and len(self._stack) == len(EXTRACTED_DATA_PATH) + 1
+            and self._path()[:-1] == EXTRACTED_DATA_PATH
+        ):
+            self._capture = [char]
+            self._capture_depth = len(self._stack)
+            self._capture_key = frame.key
+
+    def _end_value(self) -> None:
+        """Called when any value (scalar or container) has closed"""
+        if self._stack:
+            self._stack[-1].expect = "comma"
+        if self._capture is not None and len(self._stack) == self._capture_depth:
+            raw = "".join(self._capture)
+            self._capture = None
+            try:
+                value = json.loads(raw)
+            except ValueError:
+                return
+            self._flush_message()
+            self._events.append(("extracted_field", {"key": self._capture_key, "value": value}))
+
+    def _open_container(self, is_object: bool, char: str) -> None:
+        if self._stack:
+            self._begin_value(char)
+        self._stack.append(_Frame(is_object))
+
+    def _structural_char(self, char: str) -> None:
+        self._capture_char(char)
+        if char in _WHITESPACE:
+            return
+
+        frame = self._stack[-1]
+        expect = frame.expect
+
+        if expect == "key":
+            if char == '"':
+                self._start_string(is_key=True)
+            elif char == "}":
+                self._close_container()
+        elif expect == "colon":
+            if char == ":":
+                frame.expect = "value"
+        elif expect == "comma":
+            if char == ",":
+                frame.expect = "key" if frame.is_object else "value"
+            elif char in "}]":
+                self._close_container()
+        elif expect == "value":
+            if char == '"':
+                self._begin_value(char)
+                self._start_string(is_key=False)
+            elif char == "{":
+                self._open_container(True, char)
+            elif char == "[":
+                self._open_container(False, char)
+            elif char == "]" and not frame.is_object:
+                self._close_container()
+            else:
+                self._begin_value(char)
+                self._literal = [char]
+
+    def _close_container(self) -> None:
+        self._stack.pop()
+        if not self._stack:
+            self._mode = "done"
+            return
+        self._end_value()
+
+    def _start_string(self, is_key: bool) -> None:
+        self._string = []
+        self._string_is_key = is_key
+        self._streaming_message = (
+            not is_key and len(self._stack) == 1 and self._stack[0].key == MESSAGE_PATH[0]
+        )
+
+    def _end_literal(self) -> None:
+        self._literal = None
+        self._end_value()
+
+    def _emit_string_char(self, decoded: str) -> None:
+        if self._string_is_key:
+            self._string.append(decoded)
+        elif self._streaming_message:
+            self._message_chunk.append(decoded)
+
+    def _string_char(self, char: str) -> None:
+        self._capture_char(char)
+
+        if self._unicode is not None:
+            self._unicode += char
+            if len(self._unicode) == 4:
+                self._emit_code_unit(int(self._unicode, 16))
+                self._unicode = None
+            return
+
+        if self._escape:
+            self._escape = False
+            if char == "u":
+                self._unicode = ""
+            else:
+                self._emit_string_char(_ESCAPES.get(char, char))
+            return
+
+        if char == "\\":
+            self._escape = True
+        elif char == '"':
+            self._end_string()
+        else:
+            self._emit_string_char(char)
+
+    def _emit_code_unit(self, code: int) -> None:
+        if 0xD800 <= code <= 0xDBFF:
+            self._high_surrogate = code
+            return
+        if 0xDC00 <= code <= 0xDFFF and self._high_surrogate is not None:
+            code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+        self._high_surrogate = None
+        self._emit_string_char(chr(code))
+
+    def _end_string(self) -> None:
+        frame = self._stack[-1]
+        if self._string_is_key:
+            frame.key = "".join(self._string)
+            frame.expect = "colon"
+        else:
+            self._end_value()
+        self._string = None
+        self._streaming_message = False
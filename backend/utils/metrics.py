@@ -0,0 +1,408 @@
+"""
+In-process metrics collectors exported in Prometheus text format
+
+Counters, gauges and histograms live in plain dictionaries keyed by label
+values, so recording a sample is a bisect and two additions (a few hundred
+nanoseconds); /metrics renders them on demand. Every collector is declared
+here and imported by the code it instruments:
+
+- HTTP request latency by route template and status, and in-flight requests
+  (MetricsMiddleware)
+- Claude call latency, time to first streamed token and tokens by model
+  (LLMGateway)
+- Mongo command latency by collection and command, and commands per
+  request by route (utils.db_monitor)
+- bcrypt hashing time (utils.auth)
+
+With several worker processes each worker only sees its own traffic. Set
+METRICS_MULTIPROC_DIR to a directory shared by the workers: each one then
+writes a snapshot there every METRICS_MULTIPROC_WRITE_SECONDS and whichever
+worker serves /metrics adds up all snapshots. Counters of exited workers are
+kept so totals never go backwards; their gauges are dropped. Empty the
+directory when the service is (re)deployed.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; request and Mongo buckets resolve the sub-millisecond range, LLM buckets the multi-second one
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+LLM_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+HASH_BUCKETS = (0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.0)
+
+REGISTRY: List["Metric"] = []
+
+
+class Metric:
+    """
+    A named family of time series distinguished by label values
+
+    Args:
+        name: Metric name
+        documentation: HELP text
+        labelnames: Label names, in the order values are passed
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._series: Dict[Tuple[str, ...], Any] = {}
+        # Mongo events arrive on driver threads, everything else on the event loop
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Copy of the metric's state, as written to the multiprocess directory
+
+        Returns:
+            dict: Kind, HELP text, label names and series
+        """
+        with self._lock:
+            series = [[list(labels), value[:] if isinstance(value, list) else value]
+                      for labels, value in self._series.items()]
+        return {
+            "kind": self.kind,
+            "help": self.documentation,
+            "labels": list(self.labelnames),
+            "series": series,
+        }
+
+
+class Counter(Metric):
+    """Monotonically increasing total"""
+
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0.0) + amount
+
+
+class Gauge(Metric):
+    """Value that goes up and down"""
+
+    kind = "gauge"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values over fixed buckets
+
+    Args:
+        name: Metric name
+        documentation: HELP text
+        labelnames: Label names, in the order values are passed
+        buckets: Upper bounds, ascending (+Inf is implied)
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per-bucket (not cumulative) counts including +Inf, then the sum
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        snapshot = super().snapshot()
+        snapshot["buckets"] = list(self.buckets)
+        return snapshot
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency until the response body is sent",
+    ("method", "route", "status")
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being handled")
+LLM_REQUEST_SECONDS = Histogram(
+    "llm_request_duration_seconds", "Claude API call latency per attempt, excluding scheduler queueing",
+    ("model", "call", "outcome"), buckets=LLM_BUCKETS
+)
+LLM_TIME_TO_FIRST_TOKEN_SECONDS = Histogram(
+    "llm_time_to_first_token_seconds", "Time from sending a streaming Claude call to its first text delta",
+    ("model",), buckets=LLM_BUCKETS
+)
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens reported by the Claude API", ("model", "type"))
+DB_COMMAND_SECONDS = Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command round trip time reported by the driver",
+    ("collection", "command"), buckets=DB_BUCKETS
+)
+HTTP_REQUEST_DB_OPERATIONS = Histogram(
+    "http_request_db_operations", "MongoDB commands issued while handling one request",
+    ("route",), buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34)
+)
+DB_COMMAND_FAILURES = Counter("mongodb_command_failures_total", "MongoDB commands that returned an error", ("collection", "command"))
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_duration_seconds", "bcrypt hash or verify time in the hashing pool, excluding queueing",
+    ("operation",), buckets=HASH_BUCKETS
+)
+
+
+def record_llm_usage(model: str, usage: Any) -> None:
+    """
+    Count the tokens of one Claude response
+
+    Args:
+        model: Requested model
+        usage: Response usage (None is ignored)
+    """
+    if usage is None:
+        return
+    for token_type in ("input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens"):
+        count = getattr(usage, token_type, 0) or 0
+        if count:
+            LLM_TOKENS.inc(model, token_type[:-len("_tokens")], amount=count)
+
+
+def route_label(scope: Dict[str, Any]) -> str:
+    """
+    Route template of a handled request, for use as a label
+
+    Args:
+        scope: ASGI scope, after routing
+
+    Returns:
+        str: Path template (path parameters are not expanded, keeping
+            label cardinality bounded), or "unmatched"
+    """
+    # Set by the router when a route matches
+    return getattr(scope.get("route"), "path_format", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request by route template and status"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, scope["method"], route_label(scope), str(status))
+
+
+def collect() -> Dict[str, Dict[str, Any]]:
+    """
+    Snapshot every metric of this process
+
+    Returns:
+        dict: Metric snapshots by name
+    """
+    return {metric.name: metric.snapshot() for metric in REGISTRY}
+
+
+def _snapshot_path(pid: int) -> str:
+    return os.path.join(settings.METRICS_MULTIPROC_DIR, f"metrics-{pid}.json")
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def write_snapshot() -> None:
+    """
+    Write this worker's metrics to the multiprocess directory
+
+    Written to a temporary file and renamed, so readers never see a partial
+    snapshot.
+    """
+    path = _snapshot_path(os.getpid())
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(collect(), f)
+    os.replace(temp_path, path)
+
+
+def _merge(into: Dict[str, Dict[str, Any]], snapshot: Dict[str, Dict[str, Any]], include_gauges: bool) -> None:
+    for name, metric in snapshot.items():
+        if metric["kind"] == "gauge" and not include_gauges:
+            continue
+        target = into.get(name)
+        if target is None:
+            into[name] = metric
+            continue
+        if target.get("buckets") != metric.get("buckets"):
+            # Buckets changed between deploys; sums across them would be meaningless
+            continue
+        series = {tuple(labels): value for labels, value in target["series"]}
+        for labels, value in metric["series"]:
+            key = tuple(labels)
+            current = series.get(key)
+            if current is None:
+                series[key] = value
+            elif isinstance(value, list):
+                series[key] = [a + b for a, b in zip(current, value)]
+            else:
+                series[key] = current + value
+        target["series"] = [[list(labels), value] for labels, value in series.items()]
+
+
+def collect_all() -> Dict[str, Dict[str, Any]]:
+    """
+    Snapshot every metric, summed across workers in multiprocess mode
+
+    Returns:
+        dict: Metric snapshots by name
+    """
+    metrics = collect()
+    directory = settings.METRICS_MULTIPROC_DIR
+    if not directory:
+        return metrics
+
+    own_pid = os.getpid()
+    for filename in os.listdir(directory):
+        if not (filename.startswith("metrics-") and filename.endswith(".json")):
+            continue
+        try:
+            pid = int(filename[len("metrics-"):-len(".json")])
+        except ValueError:
+            continue
+        if pid == own_pid:
+            continue
+        try:
+            with open(os.path.join(directory, filename)) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping unreadable metrics snapshot {filename}: {e}")
+            continue
+        _merge(metrics, snapshot, include_gauges=_pid_alive(pid))
+    return metrics
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: List[str], values: List[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render(metrics: Dict[str, Dict[str, Any]]) -> str:
+    """
+    Format metric snapshots in the Prometheus text exposition format
+
+    Args:
+        metrics: Snapshots from `collect` or `collect_all`
+
+    Returns:
+        str: Exposition text
+    """
+    lines: List[str] = []
+    for name, metric in metrics.items():
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        names = metric["labels"]
+        for values, value in sorted(metric["series"], key=lambda series: series[0]):
+            if metric["kind"] != "histogram":
+                lines.append(f"{name}{_labels(names, values)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric["buckets"] + ["+Inf"], value[:-1]):
+                cumulative += count
+                le = bound if bound == "+Inf" else _number(bound)
+                lines.append(f"{name}_bucket{_labels(names, values, ('le', le))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(names, values)} {_number(value[-1])}")
+            lines.append(f"{name}_count{_labels(names, values)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+_writer_task: Optional["asyncio.Task"] = None
+
+
+async def _write_loop() -> None:
+    while True:
+        await asyncio.sleep(settings.METRICS_MULTIPROC_WRITE_SECONDS)
+        try:
+            await asyncio.to_thread(write_snapshot)
+        except Exception as e:
+            logger.warning(f"Failed to write metrics snapshot: {e}")
+
+
+async def start_metrics_writer() -> None:
+    """
+    Start writing snapshots to METRICS_MULTIPROC_DIR, if configured
+    """
+    global _writer_task
+    if settings.METRICS_ENABLED and settings.METRICS_MULTIPROC_DIR and _writer_task is None:
+        os.makedirs(settings.METRICS_MULTIPROC_DIR, exist_ok=True)
+        _writer_task = asyncio.create_task(_write_loop())
+        logger.info(f"Writing metrics snapshots to {settings.METRICS_MULTIPROC_DIR}")
+
+
+async def stop_metrics_writer() -> None:
+    """
+    Stop the snapshot writer and write a final snapshot
+    """
+    global _writer_task
+    if _writer_task is None:
+        return
+    _writer_task.cancel()
+    try:
+        await _writer_task
+    except asyncio.CancelledError:
+        pass
+    _writer_task = None
+    try:
+        write_snapshot()
+    except Exception as e:
+        logger.warning(f"Failed to write final metrics snapshot: {e}")
@@ -0,0 +1,338 @@
+"""
+Per-identity request rate limiting middleware
+
+Requests are grouped into route classes (login/registration, LLM chat, the
+rest of the AI API). Each class has per-minute quotas per client IP, per
+authenticated user and for the class as a whole, enforced as token buckets
+with the GCRA algorithm: one timestamp per key, bursts up to the quota,
+then a steady refill. The check runs as raw ASGI middleware before routing,
+so a rejected request costs a dictionary lookup (or one Mongo round trip)
+and never reaches bcrypt, the database or Claude.
+
+State is in-process by default. With RATE_LIMIT_BACKEND=mongo buckets live
+in the `rate_limits` collection so quotas hold across workers; the local
+buckets still run first, so clients already over quota in this worker are
+rejected without a round trip. Other shared stores can be plugged in with
+set_rate_limit_backend().
+"""
+import json
+import logging
+import math
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from config import settings
+from database import get_database
+from utils.auth import decode_access_token
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "rate_limits"
+
+# (route class, HTTP method or None for any, path prefixes), first match wins
+ROUTE_CLASSES: List[Tuple[str, Optional[str], Tuple[str, ...]]] = [
+    ("auth", "POST", ("/auth/login", "/auth/register", "/auth/google/token")),
+    ("llm", "POST", ("/api/ai/chat", "/api/ai/extract/chat")),
+    ("ai", None, ("/api/ai/",)),
+]
+
+# Identity scopes checked for each request, in order
+SCOPES = ("ip", "user", "total")
+
+_stats: Dict[str, Any] = {"allowed": 0, "rejected": {}, "backend_errors": 0}
+
+
+class RateLimitDecision:
+    """Outcome of taking one request from a bucket"""
+    __slots__ = ("allowed", "retry_after", "remaining")
+
+    def __init__(self, allowed: bool, retry_after: float = 0.0, remaining: int = 0):
+        self.allowed = allowed
+        self.retry_after = retry_after
+        self.remaining = remaining
+
+
+def _gcra(tat: float, now: float, limit: int, window: float) -> Tuple[bool, float, float]:
+    """
+    Apply the generic cell rate algorithm to one bucket
+
+    Args:
+        tat: Theoretical arrival time stored for the key (<= now if idle)
+        now: Current time
+        limit: Requests allowed per window
+        window: Window length in seconds
+
+    Returns:
+        tuple: Whether the request is allowed, the new TAT, and seconds
+            until it would be allowed if it is not
+    """
+    interval = window / limit
+    tat = max(tat, now)
+    if tat - now > window - interval:
+        return False, tat, tat - now - (window - interval)
+    return True, tat + interval, 0.0
+
+
+def _remaining(tat: float, now: float, limit: int, window: float) -> int:
+    return max(int((now + window - tat) / (window / limit)), 0)
+
+
+class RateLimitBackend:
+    """Storage for bucket state; subclasses implement `hit`"""
+
+    name = "base"
+
+    async def hit(self, key: str, limit: int, window: float) -> RateLimitDecision:
+        """
+        Take one request from a bucket
+
+        Args:
+            key: Bucket key (route class, scope and identity)
+            limit: Requests allowed per window
+            window: Window length in seconds
+
+        Returns:
+            RateLimitDecision: Whether the request may proceed
+        """
+        raise NotImplementedError
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """Buckets in a dict local to this worker process"""
+
+    name = "memory"
+
+    def __init__(self):
+        self._tats: Dict[str, float] = {}
+        self._next_sweep = 0.0
+
+    def _sweep(self, now: float) -> None:
+        # Idle buckets are full again and can be forgotten
+        if now >= self._next_sweep:
+            self._tats = {key: tat for key, tat in self._tats.items() if tat > now}
+            self._next_sweep = now + settings.RATE_LIMIT_WINDOW_SECONDS
+
+    async def hit(self, key: str, limit: int, window: float) -> RateLimitDecision:
+        now = time.monotonic()
+        self._sweep(now)
+        allowed, tat, retry_after = _gcra(self._tats.get(key, now), now, limit, window)
+        if not allowed:
+            return RateLimitDecision(False, retry_after)
+        self._tats[key] = tat
+        return RateLimitDecision(True, remaining=_remaining(tat, now, limit, window))
+
+    def block(self, key: str, seconds: float, limit: int, window: float) -> None:
+        """Mark a bucket as empty for `seconds`, mirroring a rejection from a shared backend"""
+        now = time.monotonic()
+        self._tats[key] = max(self._tats.get(key, now), now + seconds + window - window / limit)
+
+    def __len__(self) -> int:
+        return len(self._tats)
+
+
+class MongoRateLimitBackend(RateLimitBackend):
+    """
+    Buckets shared by all workers in the `rate_limits` collection
+
+    Each check is one atomic upsert that only matches while the bucket has
+    room. When it is full the upsert's insert collides with the existing
+    document, which is the rejection. A TTL index removes idle buckets.
+    """
+
+    name = "mongo"
+
+    def __init__(self):
+        self.local = MemoryRateLimitBackend()
+
+    async def hit(self, key: str, limit: int, window: float) -> RateLimitDecision:
+        # A local rejection implies a shared one, so skip the round trip
+        local = await self.local.hit(key, limit, window)
+        if not local.allowed:
+            return local
+
+        now = time.time()
+        interval = window / limit
+        try:
+            doc = await get_database()[COLLECTION].find_one_and_update(
+                {"_id": key, "tat": {"$lte": now + window - interval}},
+                [{"$set": {
+                    "tat": {"$add": [{"$max": [{"$ifNull": ["$tat", now]}, now]}, interval]},
+                    "expires_at": datetime.utcnow() + timedelta(seconds=2 * window),
+                }}],
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            doc = await get_database()[COLLECTION].find_one({"_id": key}, {"tat": 1})
+            retry_after = max(doc["tat"] - now - (window - interval), 0.0) if doc else interval
+            self.local.block(key, retry_after, limit, window)
+            return RateLimitDecision(False, retry_after)
+        return RateLimitDecision(True, remaining=_remaining(doc["tat"], now, limit, window))
+
+
+_backend: Optional[RateLimitBackend] = None
+
+
+def get_rate_limit_backend() -> RateLimitBackend:
+    """
+    Get the configured rate limit backend, creating it on first use
+
+    Returns:
+        RateLimitBackend: Memory or Mongo backend per RATE_LIMIT_BACKEND
+    """
+    global _backend
+    if _backend is None:
+        _backend = MongoRateLimitBackend() if settings.RATE_LIMIT_BACKEND == "mongo" else MemoryRateLimitBackend()
+    return _backend
+
+
+def set_rate_limit_backend(backend: RateLimitBackend) -> None:
+    """
+    Replace the rate limit backend (e.g. with a Redis implementation)
+
+    Args:
+        backend: Backend to use for subsequent requests
+    """
+    global _backend
+    _backend = backend
+
+
+def route_class(method: str, path: str) -> Optional[str]:
+    """
+    Classify a request for rate limiting
+
+    Args:
+        method: HTTP method
+        path: Request path
+
+    Returns:
+        str: Route class name, or None if the route is not limited
+    """
+    for name, class_method, prefixes in ROUTE_CLASSES:
+        if (class_method is None or class_method == method) and path.startswith(prefixes):
+            return name
+    return None
+
+
+def quota(name: str, scope: str) -> int:
+    """
+    Per-window quota for a route class and identity scope (0 means unlimited)
+
+    Args:
+        name: Route class
+        scope: "ip", "user" or "total"
+
+    Returns:
+        int: Requests allowed per RATE_LIMIT_WINDOW_SECONDS
+    """
+    suffix = "TOTAL" if scope == "total" else f"PER_{scope.upper()}"
+    return getattr(settings, f"RATE_LIMIT_{name.upper()}_{suffix}", 0)
+
+
+def _client_ip(scope: Dict[str, Any], headers: Dict[bytes, bytes]) -> str:
+    if settings.RATE_LIMIT_TRUST_FORWARDED_FOR:
+        forwarded = headers.get(b"x-forwarded-for")
+        if forwarded:
+            return forwarded.split(b",")[0].strip().decode("latin-1")
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def _user_id(headers: Dict[bytes, bytes]) -> Optional[str]:
+    authorization = headers.get(b"authorization", b"")
+    if not authorization.lower().startswith(b"bearer "):
+        return None
+    token_data = decode_access_token(authorization[7:].decode("latin-1"))
+    return token_data.user_id if token_data else None
+
+
+class RateLimitMiddleware:
+    """ASGI middleware rejecting requests over quota with 429 and Retry-After"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.RATE_LIMIT_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        name = route_class(scope["method"], scope["path"])
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        decision = await self._check(name, scope)
+        if decision is not None:
+            await self._reject(send, decision)
+            return
+        await self.app(scope, receive, send)
+
+    async def _check(self, name: str, scope: Dict[str, Any]) -> Optional[RateLimitDecision]:
+        """Return the rejecting decision, or None if every bucket has room"""
+        headers = dict(scope["headers"])
+        window = settings.RATE_LIMIT_WINDOW_SECONDS
+        backend = get_rate_limit_backend()
+
+        for identity_scope in SCOPES:
+            limit = quota(name, identity_scope)
+            if limit <= 0:
+                continue
+            if identity_scope == "ip":
+                identity = _client_ip(scope, headers)
+            elif identity_scope == "user":
+                identity = _user_id(headers)
+                if identity is None:
+                    continue
+            else:
+                identity = "*"
+
+            try:
+                decision = await backend.hit(f"{name}:{identity_scope}:{identity}", limit, window)
+            except Exception as e:
+                # Never fail requests because the limiter's store is unavailable
+                _stats["backend_errors"] += 1
+                logger.warning(f"Rate limit check failed, allowing request: {e}")
+                continue
+            if not decision.allowed:
+                key = f"{name}:{identity_scope}"
+                _stats["rejected"][key] = _stats["rejected"].get(key, 0) + 1
+                return decision
+
+        _stats["allowed"] += 1
+        return None
+
+    async def _reject(self, send, decision: RateLimitDecision) -> None:
+        body = json.dumps({"detail": "Too many requests. Please slow down and try again shortly."}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(decision.retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def rate_limit_stats() -> Dict[str, Any]:
+    """
+    Snapshot of rate limiting counters and quotas
+
+    Returns:
+        dict: Backend, allowed and rejected counts, backend errors and the
+            configured quota per route class and scope
+    """
+    backend = get_rate_limit_backend()
+    return {
+        "enabled": settings.RATE_LIMIT_ENABLED,
+        "backend": backend.name,
+        "window_seconds": settings.RATE_LIMIT_WINDOW_SECONDS,
+        "quotas": {name: {scope: quota(name, scope) for scope in SCOPES} for name, _, _ in ROUTE_CLASSES},
+        **_stats,
+    }
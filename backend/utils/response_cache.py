@@ -0,0 +1,143 @@
+"""
+Exact-match response cache for stateless Claude chat requests
+
+Responses are keyed by a SHA-256 of the canonical request: model, max
+tokens, system prompt version, normalised messages and the caller's
+context. Lookups try an in-process LRU first and then the
+`chat_response_cache` collection, whose TTL index expires entries at their
+own `expires_at`. A Mongo hit is promoted to memory for the time it has
+left. Cache failures never fail the request; they count as misses.
+"""
+import hashlib
+import json
+import logging
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from config import settings
+from database import get_database
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "chat_response_cache"
+
+_memory = TTLCache(
+    "chat_response",
+    maxsize=settings.CHAT_RESPONSE_CACHE_MAX_ENTRIES,
+    ttl=settings.CHAT_RESPONSE_CACHE_TTL_SECONDS
+)
+_stats = {"memory_hits": 0, "mongo_hits": 0, "misses": 0, "stores": 0, "bypassed": 0, "errors": 0}
+
+
+def _normalize_text(text: str) -> str:
+    return unicodedata.normalize("NFC", text).strip()
+
+
+def cache_key(claude_request: Dict[str, Any], prompt_key: Optional[str], context: Optional[Dict[str, Any]]) -> str:
+    """
+    Canonical hash of everything that determines the model's answer
+
+    Args:
+        claude_request: Messages API arguments
+        prompt_key: "name@version" of the system prompt, or None if unused
+        context: Caller-supplied context
+
+    Returns:
+        str: Hex digest
+    """
+    canonical = {
+        "model": claude_request["model"],
+        "max_tokens": claude_request["max_tokens"],
+        "system": prompt_key,
+        "messages": [
+            {"role": msg["role"], "content": _normalize_text(msg["content"])}
+            for msg in claude_request["messages"]
+        ],
+        "context": context,
+    }
+    payload = json.dumps(canonical, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def get_cached_response(key: str) -> Optional[str]:
+    """
+    Look up a cached response in memory, then in Mongo
+
+    Args:
+        key: Cache key from cache_key()
+
+    Returns:
+        str: Cached response text, or None on a miss
+    """
+    text = _memory.get(key)
+    if text is not None:
+        _stats["memory_hits"] += 1
+        return text
+
+    try:
+        now = datetime.utcnow()
+        doc = await get_database()[COLLECTION].find_one(
+            {"_id": key, "expires_at": {"$gt": now}},
+            {"response": 1, "expires_at": 1}
+        )
+    except Exception as e:
+        _stats["errors"] += 1
+        logger.warning(f"Response cache lookup failed: {e}")
+        doc = None
+
+    if doc is None:
+        _stats["misses"] += 1
+        return None
+
+    _stats["mongo_hits"] += 1
+    _memory.set(key, doc["response"], ttl=(doc["expires_at"] - now).total_seconds())
+    return doc["response"]
+
+
+async def store_response(key: str, text: str, ttl: Optional[float] = None) -> None:
+    """
+    Store a response in both tiers
+
+    Args:
+        key: Cache key from cache_key()
+        text: Response text
+        ttl: Seconds to keep this entry (defaults to CHAT_RESPONSE_CACHE_TTL_SECONDS)
+    """
+    ttl = settings.CHAT_RESPONSE_CACHE_TTL_SECONDS if ttl is None else ttl
+    _memory.set(key, text, ttl=ttl)
+    _stats["stores"] += 1
+
+    now = datetime.utcnow()
+    try:
+        await get_database()[COLLECTION].replace_one(
+            {"_id": key},
+            {"response": text, "created_at": now, "expires_at": now + timedelta(seconds=ttl)},
+            upsert=True
+        )
+    except Exception as e:
+        _stats["errors"] += 1
+        logger.warning(f"Response cache store failed: {e}")
+
+
+def record_bypass() -> None:
+    """Count a request that skipped the cache lookup"""
+    _stats["bypassed"] += 1
+
+
+def response_cache_stats() -> Dict[str, Any]:
+    """
+    Snapshot of response cache counters
+
+    Returns:
+        dict: Enabled flag, per-tier hits, misses, stores and hit rate
+    """
+    hits = _stats["memory_hits"] + _stats["mongo_hits"]
+    lookups = hits + _stats["misses"]
+    return {
+        "enabled": settings.CHAT_RESPONSE_CACHE_ENABLED,
+        **_stats,
+        "memory_entries": len(_memory),
+        "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+    }
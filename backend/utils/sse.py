@@ -0,0 +1,40 @@
+"""
+Server-Sent Events helpers for streaming responses
+"""
+import json
+from typing import Any, AsyncIterator
+
+from fastapi.responses import StreamingResponse
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
+
+
+def format_sse(event: str, data: Any) -> str:
+    """
+    Format a single Server-Sent Event
+
+    Args:
+        event: Event name
+        data: JSON-serializable payload
+
+    Returns:
+        str: Encoded event frame
+    """
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    """
+    Wrap an async iterator of encoded events in a streaming response
+
+    Args:
+        events: Async iterator yielding `format_sse` frames
+
+    Returns:
+        StreamingResponse: text/event-stream response
+    """
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
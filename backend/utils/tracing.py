@@ -0,0 +1,393 @@
+"""
+In-process request tracing
+
+TracingMiddleware opens a trace per HTTP request. Code on the request path
+adds spans with `span("name")` (or the `traced` decorator). Spans nest by
+context variable, so they follow the request into tasks it spawns and onto
+Motor's executor threads. The Mongo command listener, the LLM gateway, auth,
+Pydantic model construction of conversations and JSON parsing of model
+responses all record spans; routers use TracedRoute to time each endpoint
+separately from response serialisation.
+
+Every request is recorded, and retention is decided when it ends (tail
+sampling): requests slower than TRACE_SLOW_THRESHOLD_MS or failing with a
+5xx go to one ring buffer, and a TRACE_SAMPLE_RATE fraction of the rest go to
+another, so fast traffic never evicts the slow traces worth looking at.
+Retained traces are rendered as waterfalls at /debug/traces (development
+only) and, with TRACE_EXPORT_PATH set, appended to that file as OTLP/JSON
+lines for offline analysis in any OpenTelemetry tooling.
+"""
+import asyncio
+import functools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+from fastapi.routing import APIRoute
+
+from config import settings
+from utils.metrics import route_label
+
+logger = logging.getLogger(__name__)
+
+# Paths never traced: the trace viewer itself and scrapes
+UNTRACED_PREFIXES = ("/debug/", "/metrics")
+
+# OTLP span kinds
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+
+class Span:
+    """One timed operation within a trace"""
+    __slots__ = ("name", "span_id", "parent_id", "start", "end", "kind", "attributes")
+
+    def __init__(self, name: str, parent_id: Optional[str], start: float, kind: int = KIND_INTERNAL):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start = start
+        self.end: Optional[float] = None
+        self.kind = kind
+        self.attributes: Dict[str, Any] = {}
+
+    def set(self, **attributes: Any) -> None:
+        """Attach attributes to the span"""
+        self.attributes.update(attributes)
+
+
+class _NoopSpan:
+    """Stands in for a span outside a traced request so callers need not check"""
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """Spans recorded for one request"""
+    __slots__ = ("trace_id", "name", "start_unix_ns", "start", "spans", "status", "dropped_spans", "_lock")
+
+    def __init__(self, name: str):
+        self.trace_id = os.urandom(16).hex()
+        self.name = name
+        self.start_unix_ns = time.time_ns()
+        self.start = time.perf_counter()
+        self.spans: List[Span] = []
+        self.status = 0
+        self.dropped_spans = 0
+        # Mongo spans are added from driver threads
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> bool:
+        with self._lock:
+            if len(self.spans) >= settings.TRACE_MAX_SPANS:
+                self.dropped_spans += 1
+                return False
+            self.spans.append(span)
+            return True
+
+    @property
+    def root(self) -> Span:
+        return self.spans[0]
+
+    @property
+    def duration(self) -> float:
+        root = self.root
+        return (root.end or time.perf_counter()) - root.start
+
+    def unix_ns(self, perf_time: float) -> int:
+        """Convert a perf_counter timestamp of this trace to Unix nanoseconds"""
+        return self.start_unix_ns + int((perf_time - self.start) * 1e9)
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("trace_span", default=None)
+
+_slow_traces: Optional[Deque[Trace]] = None
+_sampled_traces: Optional[Deque[Trace]] = None
+_stats = {"recorded": 0, "retained_slow": 0, "retained_sampled": 0, "exported": 0, "export_errors": 0}
+
+
+def _buffers() -> Deque[Trace]:
+    global _slow_traces, _sampled_traces
+    if _slow_traces is None:
+        _slow_traces = deque(maxlen=settings.TRACE_BUFFER_SIZE)
+        _sampled_traces = deque(maxlen=settings.TRACE_BUFFER_SIZE)
+    return _slow_traces
+
+
+@contextmanager
+def span(name: str, kind: int = KIND_INTERNAL, **attributes: Any) -> Iterator[Any]:
+    """
+    Time a block as a child of the current span
+
+    Args:
+        name: Span name, e.g. "llm.create" or "pydantic.Conversation"
+        kind: OTLP span kind
+        **attributes: Initial span attributes
+
+    Yields:
+        Span: The span (a no-op stand-in outside traced requests), for
+            attaching attributes known only at the end
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield NOOP_SPAN
+        return
+
+    parent = _current_span.get()
+    current = Span(name, parent.span_id if parent else None, time.perf_counter(), kind)
+    if attributes:
+        current.attributes.update(attributes)
+    if not trace.add(current):
+        yield NOOP_SPAN
+        return
+
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.attributes["error"] = type(e).__name__
+        raise
+    finally:
+        current.end = time.perf_counter()
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # Generator finalised in another context; the context is gone anyway
+            pass
+
+
+def traced(name: str) -> Callable:
+    """
+    Decorator recording each call of a sync or async function as a span
+
+    Args:
+        name: Span name
+    """
+    def decorator(func: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_context() -> Optional[tuple]:
+    """
+    Trace and span active in this context, for recording spans later
+
+    Returns:
+        tuple: (trace, parent span), or None outside traced requests
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    return trace, _current_span.get()
+
+
+def record_span(context: Optional[tuple], name: str, start: float, end: float, kind: int = KIND_INTERNAL, **attributes: Any) -> None:
+    """
+    Add an already finished span, e.g. from a driver event listener
+
+    Args:
+        context: Result of `current_context` when the operation started
+        name: Span name
+        start: perf_counter time the operation started
+        end: perf_counter time it finished
+        kind: OTLP span kind
+        **attributes: Span attributes
+    """
+    if context is None:
+        return
+    trace, parent = context
+    finished = Span(name, parent.span_id if parent else None, start, kind)
+    finished.end = end
+    finished.attributes.update(attributes)
+    trace.add(finished)
+
+
+class TracedRoute(APIRoute):
+    """APIRoute recording the endpoint function as its own span"""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs: Any):
+        # include_router re-creates routes from already wrapped endpoints
+        if not getattr(endpoint, "_traced_endpoint", False):
+            # Wrapping keeps the signature (via __wrapped__), so dependencies resolve as before
+            endpoint = traced(f"endpoint {endpoint.__name__}")(endpoint)
+            endpoint._traced_endpoint = True
+        super().__init__(path, endpoint, **kwargs)
+
+
+class TracingMiddleware:
+    """ASGI middleware opening a trace for each HTTP request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.TRACING_ENABLED or scope["path"].startswith(UNTRACED_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(f"{scope['method']} {scope['path']}")
+        root = Span(trace.name, None, trace.start, KIND_SERVER)
+        root.set(**{"http.method": scope["method"], "http.target": scope["path"]})
+        trace.add(root)
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(root)
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                trace.status = message["status"]
+                root.attributes["http.status_code"] = message["status"]
+                root.attributes["response_started_ms"] = round((time.perf_counter() - root.start) * 1000, 2)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        except BaseException:
+            trace.status = trace.status or 500
+            raise
+        finally:
+            root.end = time.perf_counter()
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            route = route_label(scope)
+            trace.name = root.name = f"{scope['method']} {route}"
+            root.attributes["http.route"] = route
+            _finish(trace)
+
+
+def _finish(trace: Trace) -> None:
+    """Keep the trace if it is slow, failed or sampled"""
+    _stats["recorded"] += 1
+    slow = _buffers()
+    if trace.duration * 1000 >= settings.TRACE_SLOW_THRESHOLD_MS or trace.status >= 500:
+        slow.append(trace)
+        _stats["retained_slow"] += 1
+    elif random.random() < settings.TRACE_SAMPLE_RATE:
+        _sampled_traces.append(trace)
+        _stats["retained_sampled"] += 1
+    else:
+        return
+
+    if settings.TRACE_EXPORT_PATH:
+        line = json.dumps(to_otlp([trace]), default=str)
+        asyncio.get_running_loop().run_in_executor(None, _export, line)
+
+
+def _export(line: str) -> None:
+    try:
+        with open(settings.TRACE_EXPORT_PATH, "a") as f:
+            f.write(line + "\n")
+        _stats["exported"] += 1
+    except OSError as e:
+        _stats["export_errors"] += 1
+        logger.warning(f"Failed to export trace to {settings.TRACE_EXPORT_PATH}: {e}")
+
+
+def recent_traces() -> List[Trace]:
+    """
+    Retained traces, newest first
+
+    Returns:
+        list: Slow and sampled traces
+    """
+    _buffers()
+    return sorted([*_slow_traces, *_sampled_traces], key=lambda trace: trace.start_unix_ns, reverse=True)
+
+
+def find_trace(trace_id: str) -> Optional[Trace]:
+    """
+    Look up a retained trace
+
+    Args:
+        trace_id: Trace ID
+
+    Returns:
+        Trace: The trace, or None if it was not retained or has been evicted
+    """
+    return next((trace for trace in recent_traces() if trace.trace_id == trace_id), None)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(traces: List[Trace]) -> Dict[str, Any]:
+    """
+    Convert traces to an OTLP/JSON ExportTraceServiceRequest
+
+    Args:
+        traces: Traces to convert
+
+    Returns:
+        dict: OTLP/JSON document
+    """
+    spans = []
+    for trace in traces:
+        for recorded in list(trace.spans):
+            otlp_span = {
+                "traceId": trace.trace_id,
+                "spanId": recorded.span_id,
+                "name": recorded.name,
+                "kind": recorded.kind,
+                "startTimeUnixNano": str(trace.unix_ns(recorded.start)),
+                "endTimeUnixNano": str(trace.unix_ns(recorded.end or recorded.start)),
+                "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in recorded.attributes.items()],
+            }
+            if recorded.parent_id:
+                otlp_span["parentSpanId"] = recorded.parent_id
+            if "error" in recorded.attributes or (recorded.parent_id is None and trace.status >= 500):
+                otlp_span["status"] = {"code": 2}
+            spans.append(otlp_span)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": settings.TRACE_SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+        }]
+    }
+
+
+def tracing_stats() -> Dict[str, Any]:
+    """
+    Snapshot of tracing counters
+
+    Returns:
+        dict: Recorded, retained and exported trace counts and buffer sizes
+    """
+    _buffers()
+    return {
+        "enabled": settings.TRACING_ENABLED,
+        "slow_threshold_ms": settings.TRACE_SLOW_THRESHOLD_MS,
+        "sample_rate": settings.TRACE_SAMPLE_RATE,
+        "buffered_slow": len(_slow_traces),
+        "buffered_sampled": len(_sampled_traces),
+        **_stats,
+    }
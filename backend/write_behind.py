@@ -0,0 +1,409 @@
+"""
+Write-behind persistence for extraction chat turns
+
+With CONVERSATION_WRITE_BEHIND_ENABLED, a chat turn's conversation write is
+queued and the response is returned without waiting for Mongo. A flush task
+writes everything pending every CONVERSATION_WRITE_BEHIND_INTERVAL_SECONDS
+as one unordered `bulk_write`, so a burst of turns costs one round trip.
+
+- Writes to the same conversation are coalesced into a single update while
+  they wait; the next turn on a conversation continues from the queued
+  in-memory state instead of reading Mongo.
+- New conversations get a pre-allocated ObjectId so their ID can be
+  returned immediately and inserted later.
+- Updates stay conditional on the conversation version. They are sent as
+  upserts so a version conflict surfaces as a duplicate key error instead
+  of a silent no-match; those conversations are written again with the
+  regular merge-and-retry path. (Conversations are never deleted, so the
+  upsert cannot resurrect one.)
+- A batch that fails without a per-operation result (network or write
+  concern error) may have been applied. It is retried as-is before anything
+  queued since, and a duplicate key on retry is matched against the
+  conversation's `applied_writes` (or, for inserts, the pre-allocated ID)
+  so an applied write only gets its message buckets written, not replayed.
+- A write Mongo rejects for another reason, or whose replay keeps losing to
+  concurrent writers, is retried on the next flushes, up to
+  CONVERSATION_WRITE_BEHIND_MAX_ATTEMPTS times. Only then is the turn
+  dropped, logged with its conversation and counted in `dropped`.
+- Every other read of a conversation must call `flush_conversation` first.
+- The queue is drained on shutdown. A crash loses at most one interval of
+  acknowledged turns, which is the trade-off this mode opts into.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from bson import ObjectId
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from config import settings
+from database import get_database
+from models.conversation import Conversation, MessageStorage
+from utils.conversation_store import (
+    ConversationConflictError, ConversationUpdate, new_conversation_document, new_messages_operations,
+    save_conversation, version_filter
+)
+
+logger = logging.getLogger(__name__)
+
+# Version conflict on an update, or a retried insert that was already applied
+DUPLICATE_KEY_ERROR = 11000
+
+
+class _PendingWrite:
+    """Queued write for one conversation"""
+    __slots__ = ("conversation", "update", "base_version", "insert", "queued_at", "attempts")
+
+    def __init__(self, conversation: Conversation, update: ConversationUpdate, insert: bool):
+        self.conversation = conversation
+        self.update = update
+        self.insert = insert
+        # Version the update is conditional on; the in-memory copy already reflects the write
+        self.base_version = conversation.version
+        if not insert:
+            conversation.version += 1
+        self.queued_at = time.monotonic()
+        # Flushes that rejected this write outright
+        self.attempts = 0
+
+    def coalesce(self, conversation: Conversation, update: ConversationUpdate) -> None:
+        """Fold a later turn into this write"""
+        if not self.insert:
+            self.update.merge(update)
+        conversation.version = self.conversation.version
+        conversation.storage = self.conversation.storage
+        self.conversation = conversation
+
+
+_pending: Dict[str, _PendingWrite] = {}
+_flushing: Dict[str, _PendingWrite] = {}
+# Writes from a failed flush whose outcome is unknown; written before _pending
+_retrying: Dict[str, _PendingWrite] = {}
+# Bucket writes of applied conversation writes that failed (bucket pushes are safe to repeat)
+_unwritten_buckets: List[UpdateOne] = []
+_flush_lock: Optional[asyncio.Lock] = None
+_flush_task: Optional["asyncio.Task"] = None
+_wakeup: Optional[asyncio.Event] = None
+
+_stats: Dict[str, Any] = {
+    "queued": 0,
+    "coalesced": 0,
+    "flushes": 0,
+    "written": 0,
+    "conflicts": 0,
+    "errors": 0,
+    "dropped": 0,
+    "total_flush_seconds": 0.0,
+    "max_flush_seconds": 0.0,
+    "max_queue_seconds": 0.0,
+}
+
+
+def _lock() -> asyncio.Lock:
+    global _flush_lock
+    if _flush_lock is None:
+        _flush_lock = asyncio.Lock()
+    return _flush_lock
+
+
+def pending_conversation(conversation_id: str) -> Optional[Conversation]:
+    """
+    Latest in-memory state of a conversation with an unflushed write
+
+    Args:
+        conversation_id: Conversation ID
+
+    Returns:
+        Conversation: A copy to continue the conversation from, or None if
+            Mongo is up to date
+    """
+    entry = _pending.get(conversation_id) or _flushing.get(conversation_id) or _retrying.get(conversation_id)
+    if entry is None:
+        return None
+    conversation = entry.conversation.copy(deep=True)
+    conversation._items_by_id = None
+    return conversation
+
+
+async def persist_turn(db, conversation: Conversation, conversation_id: Optional[str], update: ConversationUpdate) -> str:
+    """
+    Persist a chat turn, queued when write-behind is enabled
+
+    Args:
+        db: Database instance
+        conversation: Conversation after the turn was applied
+        conversation_id: Existing conversation ID, or None for a new one
+        update: Changes made during the turn
+
+    Returns:
+        str: Conversation ID (pre-allocated for new conversations)
+    """
+    if not settings.CONVERSATION_WRITE_BEHIND_ENABLED or _flush_task is None:
+        return await save_conversation(db, conversation, conversation_id, update)
+
+    conversation.updated_at = datetime.utcnow()
+    if not conversation_id:
+        conversation_id = str(ObjectId())
+        # Decide storage now so turns continuing from the queued copy agree with the insert
+        new_conversation_document(conversation)
+        _pending[conversation_id] = _PendingWrite(conversation, update, insert=True)
+    elif conversation_id in _pending:
+        _pending[conversation_id].coalesce(conversation, update)
+        _stats["coalesced"] += 1
+    else:
+        _pending[conversation_id] = _PendingWrite(conversation, update, insert=False)
+    _stats["queued"] += 1
+
+    if len(_pending) >= settings.CONVERSATION_WRITE_BEHIND_MAX_BATCH and _wakeup is not None:
+        _wakeup.set()
+    return conversation_id
+
+
+async def flush_conversation(conversation_id: str) -> None:
+    """
+    Make sure a conversation's queued writes are in Mongo before reading it
+
+    Args:
+        conversation_id: Conversation ID
+    """
+    if conversation_id in _pending or conversation_id in _flushing or conversation_id in _retrying:
+        await flush_pending()
+
+
+async def flush_pending() -> None:
+    """Write every queued conversation now; a failed batch is retried first on the next flush"""
+    async with _lock():
+        if not (_pending or _retrying or _unwritten_buckets):
+            return
+        started = time.monotonic()
+        try:
+            # Later turns were built on top of the retried writes, so they wait for them
+            if _retrying and not await _flush_batch(_retrying):
+                return
+            if _unwritten_buckets:
+                operations = list(_unwritten_buckets)
+                _unwritten_buckets.clear()
+                await _write_buckets(get_database(), operations)
+            if _pending:
+                # A conversation with a write still to retry keeps its later turns queued behind it
+                await _flush_batch(_pending, held_back=set(_retrying))
+        finally:
+            elapsed = time.monotonic() - started
+            _stats["flushes"] += 1
+            _stats["total_flush_seconds"] += elapsed
+            _stats["max_flush_seconds"] = max(_stats["max_flush_seconds"], elapsed)
+
+
+async def _flush_batch(queue: Dict[str, _PendingWrite], held_back: Set[str] = frozenset()) -> bool:
+    batch = {conversation_id: entry for conversation_id, entry in queue.items() if conversation_id not in held_back}
+    for conversation_id in batch:
+        del queue[conversation_id]
+    if not batch:
+        return True
+    _flushing.update(batch)
+    try:
+        await _write_batch(batch)
+        return True
+    except Exception as e:
+        _stats["errors"] += 1
+        logger.error(f"Write-behind flush of {len(batch)} conversations failed, will retry: {e}")
+        # The server may have applied any of these; retry them unchanged rather than merged with later turns
+        _retrying.update(batch)
+        return False
+    finally:
+        for conversation_id in batch:
+            _flushing.pop(conversation_id, None)
+
+
+def _retry_later(conversation_id: str, entry: _PendingWrite, reason: str) -> None:
+    """Keep a rejected write for the next flush, or drop it once it has used its attempts"""
+    _stats["errors"] += 1
+    entry.attempts += 1
+    if entry.attempts >= settings.CONVERSATION_WRITE_BEHIND_MAX_ATTEMPTS:
+        _stats["dropped"] += 1
+        logger.error(
+            f"Write-behind dropped a write to conversation {conversation_id} after "
+            f"{entry.attempts} attempts; its acknowledged turns are lost: {reason}"
+        )
+        return
+    logger.error(f"Write-behind write of conversation {conversation_id} failed, will retry: {reason}")
+    if not entry.insert:
+        # A failed replay may have left the in-memory copy at the base version
+        entry.conversation.version = entry.base_version + 1
+    _retrying[conversation_id] = entry
+
+
+async def _write_buckets(db, operations: List[UpdateOne]) -> None:
+    try:
+        await db.conversation_messages.bulk_write(operations, ordered=False)
+    except Exception as e:
+        _stats["errors"] += 1
+        logger.error(f"Write-behind message bucket write failed, will retry: {e}")
+        _unwritten_buckets.extend(operations)
+
+
+async def _already_applied(db, conversation_id: str, entry: _PendingWrite) -> bool:
+    """Whether a write that hit a duplicate key was applied by an earlier attempt"""
+    if entry.insert:
+        # The ID was allocated for this insert, so only it can have created the document
+        return True
+    return await db.conversations.count_documents(
+        {"_id": ObjectId(conversation_id), "applied_writes": entry.update.write_id},
+        limit=1
+    ) > 0
+
+
+async def _write_batch(batch: Dict[str, _PendingWrite]) -> None:
+    db = get_database()
+    conversation_ids = list(batch)
+    operations: List[Any] = []
+    for conversation_id in conversation_ids:
+        entry = batch[conversation_id]
+        if entry.insert:
+            operations.append(InsertOne({"_id": ObjectId(conversation_id), **new_conversation_document(entry.conversation)}))
+            continue
+        update_doc, array_filters = entry.update.to_mongo(
+            entry.conversation.updated_at,
+            embed_messages=entry.conversation.storage != MessageStorage.BUCKETED
+        )
+        operations.append(UpdateOne(
+            version_filter(conversation_id, entry.base_version),
+            update_doc,
+            upsert=True,
+            array_filters=array_filters or None
+        ))
+
+    failed: Dict[int, Any] = {}
+    try:
+        await db.conversations.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        if e.details.get("writeConcernErrors"):
+            raise
+        failed = {error["index"]: error for error in e.details.get("writeErrors", [])}
+
+    conflicts: List[str] = []
+    for index, error in list(failed.items()):
+        conversation_id = conversation_ids[index]
+        entry = batch[conversation_id]
+        if error.get("code") != DUPLICATE_KEY_ERROR:
+            _retry_later(conversation_id, entry, str(error.get("errmsg")))
+        elif await _already_applied(db, conversation_id, entry):
+            # Applied by an attempt whose acknowledgement was lost: finish it below
+            del failed[index]
+            continue
+        else:
+            conflicts.append(conversation_id)
+
+    bucket_operations: List[UpdateOne] = []
+    for index, conversation_id in enumerate(conversation_ids):
+        entry = batch[conversation_id]
+        if index in failed:
+            continue
+        _stats["written"] += 1
+        _stats["max_queue_seconds"] = max(_stats["max_queue_seconds"], time.monotonic() - entry.queued_at)
+        if entry.insert:
+            update = ConversationUpdate()
+            update.new_messages = list(entry.conversation.messages)
+        else:
+            update = entry.update
+        bucket_operations.extend(new_messages_operations(entry.conversation, ObjectId(conversation_id), update))
+    if bucket_operations:
+        # The conversation writes are done; only the buckets are retried
+        await _write_buckets(db, bucket_operations)
+
+    for conversation_id in conflicts:
+        entry = batch[conversation_id]
+        # Another worker wrote this conversation first: replay on its latest version
+        _stats["conflicts"] += 1
+        entry.conversation.version = entry.base_version
+        try:
+            await save_conversation(db, entry.conversation, conversation_id, entry.update)
+            _stats["written"] += 1
+        except ConversationConflictError as e:
+            # Nothing was written; try again on a later flush
+            _retry_later(conversation_id, entry, str(e))
+        except Exception as e:
+            # The replay may have been applied under a rebased update, so it cannot be retried blindly
+            _stats["errors"] += 1
+            _stats["dropped"] += 1
+            logger.error(
+                f"Write-behind replay of conversation {conversation_id} failed and may be partially "
+                f"persisted; its acknowledged turns are not retried: {e}"
+            )
+
+
+async def _flush_loop() -> None:
+    global _wakeup
+    _wakeup = asyncio.Event()
+    while True:
+        try:
+            await asyncio.wait_for(_wakeup.wait(), settings.CONVERSATION_WRITE_BEHIND_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+        await flush_pending()
+
+
+async def start_write_behind() -> None:
+    """
+    Start the flush task if write-behind is enabled
+    """
+    global _flush_task
+    if settings.CONVERSATION_WRITE_BEHIND_ENABLED and _flush_task is None:
+        _flush_task = asyncio.create_task(_flush_loop())
+        logger.info("Conversation write-behind enabled")
+
+
+async def stop_write_behind() -> None:
+    """
+    Stop the flush task and drain queued writes
+    """
+    global _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        try:
+            await _flush_task
+        except asyncio.CancelledError:
+            pass
+        _flush_task = None
+    if _pending or _retrying or _unwritten_buckets:
+        logger.info(f"Draining {len(_pending) + len(_retrying)} queued conversation writes...")
+        await flush_pending()
+        if _pending or _retrying:
+            logger.error(f"{len(_pending) + len(_retrying)} conversation writes could not be persisted at shutdown")
+        if _unwritten_buckets:
+            logger.error(f"{len(_unwritten_buckets)} message bucket writes could not be persisted at shutdown")
+
+
+def write_behind_stats() -> Dict[str, Any]:
+    """
+    Snapshot of write-behind queue state
+
+    Returns:
+        dict: Queue depth, coalesced turns, flush counts and latency,
+            conflicts and errors
+    """
+    flushes = _stats["flushes"]
+    return {
+        "enabled": settings.CONVERSATION_WRITE_BEHIND_ENABLED,
+        "queue_depth": len(_pending),
+        "flushing": len(_flushing),
+        "retrying": len(_retrying),
+        "unwritten_buckets": len(_unwritten_buckets),
+        "oldest_pending_seconds": round(
+            time.monotonic() - min(entry.queued_at for entry in _pending.values()), 3
+        ) if _pending else 0.0,
+        "queued": _stats["queued"],
+        "coalesced": _stats["coalesced"],
+        "flushes": flushes,
+        "written": _stats["written"],
+        "conflicts": _stats["conflicts"],
+        "errors": _stats["errors"],
+        "dropped": _stats["dropped"],
+        "avg_flush_ms": round(_stats["total_flush_seconds"] / flushes * 1000, 2) if flushes else 0.0,
+        "max_flush_ms": round(_stats["max_flush_seconds"] * 1000, 2),
+        "max_queue_ms": round(_stats["max_queue_seconds"] * 1000, 2),
+    }
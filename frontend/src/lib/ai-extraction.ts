@@ -3,9 +3,12 @@ import {
   ChatRequest,
   ChatResponse,
   Conversation,
+  ConversationListResponse,
+  SaveItemsResponse,
   ExtractionResponse,
   DeletionResponse,
   DeleteItemRequest,
+  DeleteItemCandidate,
   ItemType,
   ExtractionStatus,
   DeletionStatus
@@ -40,11 +43,17 @@ export async function sendMessageWithExtraction(
 }
 
 /**
- * Get all conversations for the current user
+ * Get a page of conversation summaries, most recently updated first.
+ * Pass the previous page's next_cursor to fetch the following page.
  */
-export async function getConversations(): Promise<Conversation[]> {
+export async function getConversations(
+  cursor?: string,
+  limit?: number
+): Promise<ConversationListResponse> {
   try {
-    const response = await api.get<Conversation[]>('/api/ai/extract/conversations');
+    const response = await api.get<ConversationListResponse>('/api/ai/extract/conversations', {
+      params: { cursor, limit },
+    });
     return response.data;
   } catch (error: any) {
     console.error('Error fetching conversations:', error);
@@ -87,17 +96,43 @@ export async function saveExtractedItem(
   }
 }
 
+/**
+ * Save several extracted items at once (every complete, unsaved item if none are given)
+ */
+export async function saveExtractedItems(
+  conversationId: string,
+  itemIds?: string[]
+): Promise<SaveItemsResponse> {
+  try {
+    const response = await api.post(
+      `/api/ai/extract/conversations/${conversationId}/save-items`,
+      { item_ids: itemIds }
+    );
+    return response.data;
+  } catch (error: any) {
+    console.error('Error saving extracted items:', error);
+    
+    if (error.response?.data?.detail) {
+      throw new Error(error.response.data.detail);
+    }
+    throw new Error('Failed to save items');
+  }
+}
+
 /**
  * Delete an item from the database
+ * Pass `itemId` to pick one of the candidates returned for an ambiguous identifier
  */
 export async function deleteItem(
   itemType: ItemType,
-  itemIdentifier: string
+  itemIdentifier: string,
+  itemId?: string
 ): Promise<{ success: boolean; message: string }> {
   try {
     const request: DeleteItemRequest = {
       item_type: itemType,
-      item_identifier: itemIdentifier
+      item_identifier: itemIdentifier,
+      ...(itemId ? { item_id: itemId } : {})
     };
 
     const response = await api.post('/api/ai/extract/delete-item', request);
@@ -106,7 +141,10 @@ export async function deleteItem(
     console.error('Error deleting item:', error);
     
     if (error.response?.data?.detail) {
-      throw new Error(error.response.data.detail);
+      // A 409 lists the candidates to choose from; retry with one of their ids
+      const deleteError: Error & { candidates?: DeleteItemCandidate[] } = new Error(error.response.data.detail);
+      deleteError.candidates = error.response.data.candidates;
+      throw deleteError;
     }
     throw new Error('Failed to delete item');
   }
@@ -238,6 +238,34 @@ export interface Conversation {
   updated_at: string;
 }
 
+export interface ConversationSummary {
+  id: string;
+  user_id: string;
+  message_count: number;
+  last_message_preview?: string;
+  pending_item_count: number;
+  complete_item_count: number;
+  created_at: string;
+  updated_at: string;
+}
+
+export interface ConversationListResponse {
+  conversations: ConversationSummary[];
+  next_cursor?: string;
+}
+
+export interface SavedItem {
+  extracted_item_id: string;
+  item_id: string;
+  collection: string;
+}
+
+export interface SaveItemsResponse {
+  success: boolean;
+  saved: SavedItem[];
+  skipped: string[];
+}
+
 export interface ChatRequest {
   message: string;
   conversation_id?: string;
@@ -253,4 +281,11 @@ export interface ChatResponse {
 export interface DeleteItemRequest {
   item_type: ItemType;
   item_identifier: string;
+  item_id?: string; // set when the user picked one of several candidates
+}
+
+export interface DeleteItemCandidate {
+  id: string;
+  label: string;
+  score: number;
 }
\ No newline at end of file